@@ -0,0 +1,125 @@
+# analytics.py
+#
+# Cross-dataset analytics over aligned state x year arrays: correlation
+# matrices, lagged correlations and per-state linear trends. The arrays come
+# from state_year_panel (EPA PM2.5, PLACES prevalence, WONDER rates joined
+# on state_key/year) and are built once per data version.
+
+import numpy as np
+
+METRICS = [
+    "pm25_annual_mean",
+    "copd_prevalence",
+    "smoking_prevalence",
+    "obesity_prevalence",
+    "crude_death_rate",
+    "age_adjusted_death_rate",
+]
+
+class StateYearArrays:
+    """One (states x years) float array per metric; NaN where a dataset has no value."""
+
+    def __init__(self, rows, metrics=METRICS):
+        # rows: (state_key, state_name, year, *metrics)
+        self.metrics = list(metrics)
+        keys = sorted({(row[0], row[1]) for row in rows})
+        self.state_keys = [key for key, _ in keys]
+        self.state_names = [name for _, name in keys]
+        self.years = np.array(sorted({row[2] for row in rows}), dtype=np.int64)
+
+        state_index = {key: i for i, key in enumerate(self.state_keys)}
+        year_index = {int(year): j for j, year in enumerate(self.years)}
+        self.values = {metric: np.full((len(keys), len(self.years)), np.nan) for metric in self.metrics}
+
+        if rows:
+            i = np.array([state_index[row[0]] for row in rows])
+            j = np.array([year_index[int(row[2])] for row in rows])
+            for m, metric in enumerate(self.metrics):
+                self.values[metric][i, j] = np.array([row[3 + m] for row in rows], dtype=np.float64)
+
+    def check_metrics(self, metrics):
+        unknown = [metric for metric in metrics if metric not in self.values]
+        if unknown:
+            raise ValueError(f"Unknown metric(s): {', '.join(unknown)}; use {self.metrics}")
+
+    def year_slice(self, min_year=None, max_year=None):
+        low = 0 if min_year is None else np.searchsorted(self.years, min_year, side="left")
+        high = len(self.years) if max_year is None else np.searchsorted(self.years, max_year, side="right")
+        return slice(low, high)
+
+    def correlation(self, metrics, min_year=None, max_year=None):
+        """
+        Pairwise Pearson correlations over (state, year) cells where both metrics
+        are present. Returns (matrix, counts), both metrics x metrics.
+        """
+        self.check_metrics(metrics)
+        years = self.year_slice(min_year, max_year)
+        X = np.column_stack([self.values[metric][:, years].ravel() for metric in metrics])
+        return pairwise_correlation(X)
+
+    def lagged_correlation(self, x, y, max_lag=3, min_year=None, max_year=None):
+        """Correlation of x in year t with y in year t + lag, for lag = 0..max_lag."""
+        self.check_metrics([x, y])
+        years = self.year_slice(min_year, max_year)
+        xs, ys = self.values[x][:, years], self.values[y][:, years]
+
+        results = []
+        for lag in range(0, max_lag + 1):
+            if lag >= xs.shape[1]:
+                break
+            pair = np.column_stack([xs[:, :xs.shape[1] - lag].ravel(), ys[:, lag:].ravel()])
+            matrix, counts = pairwise_correlation(pair)
+            results.append((lag, matrix[0, 1], int(counts[0, 1])))
+        return results
+
+    def trends(self, metric, min_year=None, max_year=None):
+        """
+        Per-state least-squares trend of metric on year, all states at once.
+        Returns rows of (state, slope per year, intercept at the first year, r2, n).
+        """
+        self.check_metrics([metric])
+        years = self.year_slice(min_year, max_year)
+        Y = self.values[metric][:, years]
+        t = (self.years[years] - self.years[years][:1]).astype(np.float64) if Y.shape[1] else np.zeros(0)
+
+        M = ~np.isnan(Y)
+        Yz = np.where(M, Y, 0.0)
+        T = np.where(M, t, 0.0)
+        n = M.sum(axis=1).astype(np.float64)
+        st, sy = T.sum(axis=1), Yz.sum(axis=1)
+        stt, syy, sty = (T ** 2).sum(axis=1), (Yz ** 2).sum(axis=1), (T * Yz).sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var_t = n * stt - st ** 2
+            var_y = n * syy - sy ** 2
+            cov = n * sty - st * sy
+            slope = cov / var_t
+            intercept = (sy - slope * st) / n
+            r2 = cov ** 2 / (var_t * var_y)
+
+        return [
+            (self.state_names[i], slope[i], intercept[i], r2[i], int(n[i]))
+            for i in range(len(self.state_names))
+            if n[i] >= 2
+        ]
+
+def pairwise_correlation(X):
+    """
+    Pearson correlation between the columns of X using pairwise-complete rows.
+    Sums over each pair's shared rows come from a few matrix products instead of a loop over pairs.
+    """
+    M = ~np.isnan(X)
+    Mf = M.astype(np.float64)
+    Xz = np.where(M, X, 0.0)
+
+    n = Mf.T @ Mf                 # rows where both i and j are present
+    sx = Xz.T @ Mf                # sum of x_i over those rows
+    sxx = (Xz ** 2).T @ Mf        # sum of x_i^2 over those rows
+    sxy = Xz.T @ Xz               # sum of x_i * x_j
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx ** 2 / n
+        corr = cov / np.sqrt(var_i * var_i.T)
+    corr[n < 3] = np.nan
+    return corr, n
@@ -0,0 +1,407 @@
+# approx.py
+#
+# Approximate answers for exploratory aggregates over the large tables.
+#
+# At load time each table in SAMPLED_TABLES gets a stratified random sample
+# (approx_<table>) plus a strata table recording, per stratum, how many rows
+# the full table has (N_h) and how many were sampled (n_h). An aggregate
+# query is answered by pulling the matching sample rows and computing the
+# stratified (Horvitz-Thompson) estimate of each COUNT/SUM/AVG per group,
+# with a 95% margin of error from the stratified variance formula
+#
+#     Var(Y_hat) = sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h
+#
+# where rows outside a group or WHERE filter count as zeros in their
+# stratum. AVG is a ratio estimate with a linearized variance. Queries the
+# sampler can't express, or whose margins exceed the requested accuracy,
+# raise ApproximationUnavailable so the caller can run them exactly.
+
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+# Size band of a WONDER row's death count. Counts are heavy-tailed (most cells
+# hold a few deaths, a few hold hundreds) and the large cells dominate every
+# SUM, so stratifying on the band cuts the variance several-fold; the top bands
+# are small enough that min_rows keeps nearly all of their rows.
+DEATHS_BAND = (
+    "CASE WHEN number_of_deaths >= 100 THEN 3 WHEN number_of_deaths >= 20 THEN 2 "
+    "WHEN number_of_deaths >= 5 THEN 1 ELSE 0 END"
+)
+
+# table -> stratification columns (or expressions), sampling fraction, minimum rows per stratum
+SAMPLED_TABLES = {
+    "wonder_mortality": {"strata": ["state", "year", DEATHS_BAND], "fraction": 0.05, "min_rows": 30},
+    "nhanes_survey": {"strata": ["SDMVSTRA"], "fraction": 0.2, "min_rows": 50},
+}
+
+SAMPLE_PREFIX = "approx_"
+SAMPLE_SEED = 20240601
+
+Z_95 = 1.959964
+DEFAULT_MAX_RELATIVE_ERROR = 0.05
+
+# A group needs this many sample rows before its variance estimate is trusted
+MIN_GROUP_SAMPLE = 10
+
+AGGREGATES = ("COUNT", "SUM", "TOTAL", "AVG")
+
+class ApproximationUnavailable(Exception):
+    """The query can't be answered from the samples (or not accurately enough)."""
+
+def sample_table(table):
+    return f"{SAMPLE_PREFIX}{table}"
+
+def strata_table(table):
+    return f"{SAMPLE_PREFIX}{table}_strata"
+
+def sample_key(rowid):
+    """Deterministic pseudo-random sort key for a rowid (splitmix64 finalizer)."""
+    z = (rowid + SAMPLE_SEED * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return (z ^ (z >> 31)) >> 1
+
+def build_sample_tables(conn, tables=SAMPLED_TABLES):
+    """(Re)build approx_<table> and approx_<table>_strata for every sampled table; returns sample sizes."""
+    conn.create_function("sample_key", 1, sample_key, deterministic=True)
+    cursor = conn.cursor()
+    sizes = {}
+    for table, spec in tables.items():
+        strata = ", ".join(spec["strata"])
+        take = f"MIN(_n, MAX({int(spec['min_rows'])}, CAST(_n * {float(spec['fraction'])} + 0.999999 AS INTEGER)))"
+
+        cursor.execute("DROP TABLE IF EXISTS temp.approx_keyed")
+        cursor.execute(f"""
+            CREATE TEMP TABLE approx_keyed AS
+            SELECT rowid AS _rid,
+                   DENSE_RANK() OVER (ORDER BY {strata}) AS _stratum,
+                   COUNT(*) OVER (PARTITION BY {strata}) AS _n,
+                   ROW_NUMBER() OVER (PARTITION BY {strata} ORDER BY sample_key(rowid)) AS _rn
+            FROM {table}
+        """)
+
+        cursor.execute(f"DROP TABLE IF EXISTS {sample_table(table)}")
+        cursor.execute(f"""
+            CREATE TABLE {sample_table(table)} AS
+            SELECT t.*, k._stratum AS _stratum
+            FROM approx_keyed k
+            JOIN {table} t ON t.rowid = k._rid
+            WHERE k._rn <= {take}
+        """)
+
+        cursor.execute(f"DROP TABLE IF EXISTS {strata_table(table)}")
+        cursor.execute(f"""
+            CREATE TABLE {strata_table(table)} AS
+            SELECT _stratum, MAX(_n) AS population, {take.replace('_n', 'MAX(_n)')} AS sampled
+            FROM approx_keyed
+            GROUP BY _stratum
+        """)
+        cursor.execute("DROP TABLE temp.approx_keyed")
+
+        cursor.execute(f"SELECT COUNT(*) FROM {sample_table(table)}")
+        sizes[table] = cursor.fetchone()[0]
+    conn.commit()
+    return sizes
+
+def split_top_level(text, separator=","):
+    """Split on separators outside parentheses and quotes."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == separator and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+def balanced(text):
+    depth = 0
+    for ch in text:
+        depth += {"(": 1, ")": -1}.get(ch, 0)
+        if depth < 0:
+            return False
+    return depth == 0
+
+def normalize(expr):
+    return " ".join(expr.split()).lower()
+
+QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<table>\w+)(?:\s+(?:AS\s+)?(?P<alias>\w+))?"
+    r"(?P<rest>\s+(?:WHERE|GROUP|ORDER|LIMIT|HAVING)\b.*?)?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+CLAUSE_PATTERN = re.compile(r"\b(WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b", re.IGNORECASE)
+ALIAS_PATTERN = re.compile(
+    r"^(?P<expr>.+?[\w)\"'])\s+(?:(?P<explicit>AS)\s+)?(?P<alias>\"[^\"]+\"|[A-Za-z_]\w*)$",
+    re.IGNORECASE | re.DOTALL
+)
+AGGREGATE_PATTERN = re.compile(r"^(?P<func>\w+)\s*\(\s*(?P<arg>.*?)\s*\)$", re.IGNORECASE | re.DOTALL)
+KEYWORDS = {"where", "group", "order", "limit", "having", "join", "inner", "left", "cross", "natural"}
+
+# Trailing words that end an expression rather than name it
+NOT_ALIASES = {"END", "NULL", "ASC", "DESC", "AND", "OR", "NOT"}
+
+def split_alias(text):
+    """'SUM(x) AS total' -> ('SUM(x)', 'total'); no alias -> (text, None)."""
+    match = ALIAS_PATTERN.match(text.strip())
+    if match and balanced(match.group("expr")) and (
+        match.group("explicit") or match.group("alias").upper() not in NOT_ALIASES
+    ):
+        return match.group("expr").strip(), match.group("alias").strip('"')
+    return text.strip(), None
+
+def parse_query(sql):
+    """
+    Break a single-table aggregate query into its parts.
+    Raises ApproximationUnavailable for anything outside the supported shape.
+    """
+    match = QUERY_PATTERN.match(sql)
+    if not match or len(re.findall(r"\bSELECT\b", sql, re.IGNORECASE)) != 1:
+        raise ApproximationUnavailable("only single-table SELECT statements without subqueries can be approximated")
+    table, alias = match.group("table"), match.group("alias")
+    if table not in SAMPLED_TABLES:
+        raise ApproximationUnavailable(f"no sample is kept for table {table}")
+    if alias and alias.lower() in KEYWORDS:
+        raise ApproximationUnavailable("joins can't be approximated")
+
+    clauses = {}
+    pieces = CLAUSE_PATTERN.split(match.group("rest") or "")
+    for keyword, body in zip(pieces[1::2], pieces[2::2]):
+        name = " ".join(keyword.upper().split())
+        if name in clauses:
+            raise ApproximationUnavailable(f"unexpected second {name} clause")
+        clauses[name] = body.strip()
+    if "HAVING" in clauses:
+        raise ApproximationUnavailable("HAVING can't be approximated")
+
+    items = []
+    for text in split_top_level(match.group("select")):
+        expr, name = split_alias(text)
+        aggregate = AGGREGATE_PATTERN.match(expr)
+        if aggregate and aggregate.group("func").upper() in AGGREGATES and balanced(aggregate.group("arg")):
+            func, arg = aggregate.group("func").upper(), aggregate.group("arg")
+            if re.match(r"DISTINCT\b", arg, re.IGNORECASE):
+                raise ApproximationUnavailable("DISTINCT aggregates can't be approximated")
+            items.append({"expr": expr, "name": name or expr, "func": func, "arg": arg})
+        elif re.search(r"\b(COUNT|SUM|TOTAL|AVG|MIN|MAX|GROUP_CONCAT)\s*\(", expr, re.IGNORECASE):
+            raise ApproximationUnavailable(f"unsupported aggregate expression: {expr}")
+        else:
+            items.append({"expr": expr, "name": name or expr, "func": None, "arg": None})
+
+    if not any(item["func"] for item in items):
+        raise ApproximationUnavailable("not an aggregate query")
+
+    # GROUP BY terms may be expressions, select aliases or 1-based positions
+    group_exprs = []
+    for term in split_top_level(clauses.get("GROUP BY", "")) if "GROUP BY" in clauses else []:
+        group_exprs.append(resolve_term(term, items))
+    for item in items:
+        if item["func"] is None and normalize(item["expr"]) not in map(normalize, group_exprs):
+            raise ApproximationUnavailable(f"{item['expr']} is neither aggregated nor grouped")
+
+    return {
+        "table": table,
+        "alias": alias,
+        "items": items,
+        "where": clauses.get("WHERE"),
+        "group_exprs": group_exprs,
+        "order_by": clauses.get("ORDER BY"),
+        "limit": clauses.get("LIMIT"),
+    }
+
+def resolve_term(term, items):
+    """Expression behind a GROUP BY / ORDER BY term (position or alias)."""
+    if term.isdigit():
+        position = int(term)
+        if not 1 <= position <= len(items):
+            raise ApproximationUnavailable(f"term {term} is out of range")
+        return items[position - 1]["expr"]
+    for item in items:
+        if item["name"].lower() == term.strip('"').lower() and item["name"] != item["expr"]:
+            return item["expr"]
+    return term
+
+def stratum_frame(cursor, table):
+    cursor.execute(f"SELECT _stratum, population, sampled FROM {strata_table(table)}")
+    return pd.DataFrame(cursor.fetchall(), columns=["_stratum", "population", "sampled"]).set_index("_stratum")
+
+def fetch_sample(cursor, parsed):
+    """Pull group keys and per-aggregate y/x values for every sample row passing WHERE."""
+    columns, select = [], []
+    for i, expr in enumerate(parsed["group_exprs"]):
+        select.append(f"{expr} AS _g{i}")
+        columns.append(f"_g{i}")
+    for i, item in enumerate(parsed["items"]):
+        if not item["func"]:
+            continue
+        arg = item["arg"]
+        if arg == "*":
+            y, x = "1", "1"
+        else:
+            y, x = f"COALESCE(({arg}), 0)", f"(({arg}) IS NOT NULL)"
+        if item["func"] == "COUNT":
+            y = x
+        select += [f"{y} AS _y{i}", f"{x} AS _x{i}"]
+        columns += [f"_y{i}", f"_x{i}"]
+    select.append("_stratum")
+    columns.append("_stratum")
+
+    source = sample_table(parsed["table"]) + (f" {parsed['alias']}" if parsed["alias"] else "")
+    sql = f"SELECT {', '.join(select)} FROM {source}"
+    if parsed["where"]:
+        sql += f" WHERE {parsed['where']}"
+    cursor.execute(sql)
+
+    # Group keys stay Python objects (ints stay ints, NULL stays None); values become floats
+    sample = pd.DataFrame(cursor.fetchall(), columns=columns, dtype=object)
+    for column in columns:
+        if not column.startswith("_g"):
+            sample[column] = pd.to_numeric(sample[column]).astype(np.float64)
+    return sample
+
+def stratified_variance(z, cells, strata):
+    """
+    Var of each group's estimated total of z, where z counts as zero for the
+    stratum's sample rows outside the group: sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h.
+    """
+    sums = z.groupby(cells).sum()
+    squares = (z ** 2).groupby(cells).sum()
+    stratum = sums.index.get_level_values(1)
+    n = strata["sampled"].reindex(stratum).to_numpy(np.float64)
+    N = strata["population"].reindex(stratum).to_numpy(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s2_h = np.where(n > 1, (squares.to_numpy() - sums.to_numpy() ** 2 / n) / (n - 1), 0.0)
+        terms = N ** 2 * (1 - n / N) * np.maximum(s2_h, 0.0) / n
+    return pd.Series(terms, index=sums.index).groupby(level=0).sum()
+
+def estimate(parsed, sample, strata):
+    """Per group: key values, sample row counts, and estimates and 95% margins for every aggregate item."""
+    weights = (strata["population"] / strata["sampled"]).reindex(sample["_stratum"]).to_numpy()
+    group_columns = [f"_g{i}" for i in range(len(parsed["group_exprs"]))]
+    if group_columns:
+        group = sample.groupby(group_columns, dropna=False, sort=True).ngroup()
+        keys = sample[group_columns].groupby(group).first()
+        keys = keys.astype(object).where(keys.notna(), None)
+    else:
+        group = pd.Series(0, index=sample.index)
+        keys = pd.DataFrame(index=[0])
+
+    rows_per_group = group.value_counts().reindex(keys.index, fill_value=0)
+    cells = [group, sample["_stratum"]]
+
+    values, margins = {}, {}
+    for i, item in enumerate(parsed["items"]):
+        if not item["func"]:
+            continue
+        y, x = sample[f"_y{i}"], sample[f"_x{i}"]
+        y_total = (y * weights).groupby(group).sum().reindex(keys.index, fill_value=0.0)
+
+        if item["func"] != "AVG":
+            var = stratified_variance(y, cells, strata).reindex(keys.index, fill_value=0.0)
+            values[i], margins[i] = y_total, Z_95 * np.sqrt(var)
+            continue
+
+        # AVG = Y/X; its variance comes from the linearized residual u = y - R x
+        x_total = (x * weights).groupby(group).sum().reindex(keys.index, fill_value=0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = y_total / x_total
+            u = y - ratio.reindex(group).to_numpy() * x
+            var = stratified_variance(u, cells, strata).reindex(keys.index, fill_value=0.0)
+            values[i], margins[i] = ratio, Z_95 * np.sqrt(var) / x_total.abs()
+    return keys, rows_per_group, values, margins
+
+def order_and_limit(rows, margins, parsed):
+    items = parsed["items"]
+    if parsed["order_by"]:
+        for term in reversed(split_top_level(parsed["order_by"])):
+            match = re.match(r"^(?P<expr>.+?)(?:\s+(?P<dir>ASC|DESC))?$", term.strip(), re.IGNORECASE | re.DOTALL)
+            expr = normalize(resolve_term(match.group("expr"), items))
+            index = next((k for k, item in enumerate(items) if normalize(item["expr"]) == expr), None)
+            if index is None:
+                raise ApproximationUnavailable(f"ORDER BY {term} must refer to a selected column")
+            descending = (match.group("dir") or "").upper() == "DESC"
+            # NULLs sort first ascending, as in SQLite
+            order = sorted(
+                range(len(rows)),
+                key=lambda k: (rows[k][index] is not None, rows[k][index] if rows[k][index] is not None else 0),
+                reverse=descending
+            )
+            rows, margins = [rows[k] for k in order], [margins[k] for k in order]
+
+    if parsed["limit"]:
+        limit = re.match(r"^(\d+)(?:\s+OFFSET\s+(\d+)|\s*,\s*(\d+))?$", parsed["limit"].strip(), re.IGNORECASE)
+        if not limit:
+            raise ApproximationUnavailable("LIMIT must be a plain number")
+        if limit.group(3):
+            offset, count = int(limit.group(1)), int(limit.group(3))
+        else:
+            offset, count = int(limit.group(2) or 0), int(limit.group(1))
+        rows, margins = rows[offset:offset + count], margins[offset:offset + count]
+    return rows, margins
+
+def approximate_query(cursor, sql, max_relative_error=DEFAULT_MAX_RELATIVE_ERROR):
+    """
+    Answer an aggregate query from the stratified sample.
+    Returns columns, rows and a parallel list of 95% margins (None for group columns).
+    """
+    parsed = parse_query(sql)
+    try:
+        strata = stratum_frame(cursor, parsed["table"])
+        sample = fetch_sample(cursor, parsed)
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e) and SAMPLE_PREFIX in str(e):
+            raise ApproximationUnavailable("sample tables have not been built; rerun load_data.py")
+        raise
+
+    keys, rows_per_group, values, margins = estimate(parsed, sample, strata)
+    group_positions = {normalize(expr): g for g, expr in enumerate(parsed["group_exprs"])}
+
+    rows, row_margins = [], []
+    worst = 0.0
+    for group in keys.index:
+        if parsed["group_exprs"] and rows_per_group.loc[group] < MIN_GROUP_SAMPLE:
+            raise ApproximationUnavailable(
+                f"a group has only {int(rows_per_group.loc[group])} sample rows (need {MIN_GROUP_SAMPLE})"
+            )
+        row, row_margin = [], []
+        for i, item in enumerate(parsed["items"]):
+            if not item["func"]:
+                row.append(keys.loc[group, f"_g{group_positions[normalize(item['expr'])]}"])
+                row_margin.append(None)
+                continue
+            value, margin = float(values[i].loc[group]), float(margins[i].loc[group])
+            if not np.isfinite(value):
+                value, margin = None, None
+            elif value != 0:
+                worst = max(worst, margin / abs(value))
+            elif margin > 0:
+                worst = np.inf
+            row.append(value)
+            row_margin.append(margin)
+        rows.append(row)
+        row_margins.append(row_margin)
+
+    if worst > max_relative_error:
+        raise ApproximationUnavailable(
+            f"estimated relative error {worst:.3f} exceeds the requested {max_relative_error}"
+        )
+
+    rows, row_margins = order_and_limit(rows, row_margins, parsed)
+    return {
+        "columns": [item["name"] for item in parsed["items"]],
+        "rows": rows,
+        "margins": row_margins,
+        "max_relative_error": float(worst),
+        "sample_rows": int(len(sample)),
+    }
@@ -0,0 +1,203 @@
+# benchmarks/load_test.py
+#
+# Async load generator for mcp_server.py. Replays a QUERY_LOG recording (see
+# query_log.py) or a synthetic mix of the app's typical requests with a fixed
+# number of concurrent clients, either against the app in-process (through
+# httpx's ASGI transport, so server and clients share one event loop) or
+# against a running server. Reports throughput, latency percentiles, error
+# rate, the slowest requests, and event-loop lag: a timer that should fire
+# every LAG_INTERVAL seconds, so any delay past that is time the loop spent
+# blocked. In-process that is the server's loop; with --url it is the client's.
+#
+# Usage (from a directory holding copd_public_health.db):
+#   python benchmarks/load_test.py --concurrency 16 --duration 30
+#   python benchmarks/load_test.py --replay query_log.jsonl --concurrency 32 --requests 2000
+#   python benchmarks/load_test.py --url http://localhost:8000 --concurrency 64
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from query_log import load_workload
+from query_tables import QUERIES
+from run_benchmarks import JOIN_QUERIES, PRESET_QUERIES
+
+# How often the lag monitor wakes up
+LAG_INTERVAL = 0.01
+
+# Requests listed in the slowest-requests table
+SLOWEST_SHOWN = 10
+
+def synthetic_mix():
+    """(label, endpoint, body) for a typical session: context loads, preset questions, stats, joins, batches."""
+    mix = [("context", "/v1/context", None)] * 2
+    mix += [(name, "/v1/query", {"query": sql}) for name, sql in PRESET_QUERIES.items()] * 3
+    mix += [(f"stats_{i}", "/v1/query", {"query": sql}) for i, (_, sql) in enumerate(QUERIES)]
+    mix += [(name, "/v1/query", {"query": sql}) for name, sql in JOIN_QUERIES.items()]
+    mix.append(("stats_batch", "/v1/query/batch", {"queries": [sql for _, sql in QUERIES]}))
+    mix.append(("approx_mortality_by_year", "/v1/query", {
+        "query": "SELECT year, SUM(number_of_deaths) FROM wonder_mortality GROUP BY year",
+        "approximate": True,
+    }))
+    return mix
+
+def replay_mix(path):
+    mix = []
+    for endpoint, body in load_workload(path):
+        if endpoint == "/v1/query":
+            label = " ".join(str(body.get("query")).split())[:60]
+        else:
+            label = f"batch of {len(body.get('queries') or [])}"
+        mix.append((label, endpoint, body))
+    return mix
+
+def request_error(response):
+    """Error text for a failed request, or None."""
+    if response.status_code >= 400:
+        return f"HTTP {response.status_code}"
+    if response.status_code == 304:
+        return None
+    result = response.json()
+    if "error" in result:
+        return result["error"]
+    for item in result.get("results", []):
+        if "error" in item:
+            return item["error"]
+    return None
+
+async def monitor_lag(samples, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(time.perf_counter() - start - LAG_INTERVAL)
+
+async def run_load(client, items, concurrency, total_requests, duration):
+    """Drive the client with concurrency workers; returns (samples, lag samples, wall time)."""
+    samples, lag = [], []
+    deadline = time.perf_counter() + duration if duration else None
+    budget = itertools.count()
+
+    async def worker():
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if total_requests and next(budget) >= total_requests:
+                return
+            label, endpoint, body = next(items)
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=body)
+                error = request_error(response)
+            except httpx.HTTPError as e:
+                error = f"{type(e).__name__}: {e}"
+            samples.append((label, time.perf_counter() - start, error))
+
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lag, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    return samples, lag, elapsed
+
+def percentiles_ms(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+    return {"p50": round(p50, 2), "p95": round(p95, 2), "p99": round(p99, 2), "max": round(max(values) * 1000, 2)}
+
+def summarize(samples, lag, elapsed, concurrency):
+    latencies = [seconds for _, seconds, _ in samples]
+    errors = [(label, error) for label, _, error in samples if error]
+
+    by_label = {}
+    for label, seconds, error in samples:
+        by_label.setdefault(label, []).append(seconds)
+    slowest = sorted(
+        ({"label": label, "count": len(values), **percentiles_ms(values)} for label, values in by_label.items()),
+        key=lambda row: row["p95"], reverse=True
+    )[:SLOWEST_SHOWN]
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "error_rate": round(len(errors) / len(samples), 4) if samples else None,
+        "latency_ms": percentiles_ms(latencies),
+        "loop_lag_ms": percentiles_ms(lag),
+        "slowest": slowest,
+        "sample_errors": sorted({error for _, error in errors})[:5],
+    }
+
+def print_report(report):
+    latency, lag = report["latency_ms"], report["loop_lag_ms"]
+    print(f"Requests      {report['requests']} in {report['elapsed_s']} s at concurrency {report['concurrency']}")
+    print(f"Throughput    {report['throughput_rps']} req/s")
+    print(f"Errors        {report['error_rate']:.2%}")
+    print(f"Latency ms    p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    print(f"Loop lag ms   p50 {lag['p50']}  p95 {lag['p95']}  p99 {lag['p99']}  max {lag['max']}")
+    print(f"\n{'slowest requests (by p95)':<62} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for row in report["slowest"]:
+        print(f"{row['label'][:62]:<62} {row['count']:>6} {row['p50']:>9} {row['p95']:>9} {row['p99']:>9}")
+    for error in report["sample_errors"]:
+        print(f"error: {error}")
+
+async def main_async(args):
+    mix = replay_mix(args.replay) if args.replay else synthetic_mix()
+    if not mix:
+        print("Nothing to replay")
+        return 1
+    if args.replay and not args.shuffle:
+        items = itertools.cycle(mix)
+    else:
+        rng = random.Random(args.seed)
+        items = (rng.choice(mix) for _ in itertools.count())
+
+    if args.url:
+        transport, base_url = None, args.url
+    else:
+        import mcp_server
+        transport, base_url = httpx.ASGITransport(app=mcp_server.app), "http://mcp-server"
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        samples, lag, elapsed = await run_load(client, items, args.concurrency, args.requests, args.duration)
+
+    report = summarize(samples, lag, elapsed, args.concurrency)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded or synthetic query load against the MCP server")
+    parser.add_argument("--replay", help="QUERY_LOG file to replay (default: synthetic mix)")
+    parser.add_argument("--shuffle", action="store_true", help="Replay recorded requests in random order")
+    parser.add_argument("--url", help="Server to load (default: the app in-process)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=None, help="Stop after this many requests")
+    parser.add_argument("--duration", type=float, default=None, help="Stop after this many seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+    if not args.requests and not args.duration:
+        args.requests = 500
+    return asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
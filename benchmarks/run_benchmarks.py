@@ -0,0 +1,344 @@
+# benchmarks/run_benchmarks.py
+#
+# Benchmark harness for the hot paths: ingest (per load_data.py stage),
+# /v1/context cold and warm, representative /v1/query workloads, NHANES
+# merge + decode + recode, and the Streamlit plotting path. Runs against
+# synthetic_data.py output at one or more scale factors, appends one JSON
+# line per measurement to a history file, and compares against a saved
+# baseline to flag regressions.
+#
+# Usage (from the repo root):
+#   python benchmarks/run_benchmarks.py --scales 0.1 1 --save-baseline
+#   python benchmarks/run_benchmarks.py --scales 0.1 1          # compares to the baseline
+#   python benchmarks/run_benchmarks.py --groups query context  # subset
+
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "data_prep", "nhanes"))
+
+BENCH_DIR = os.path.join(REPO_ROOT, "benchmarks")
+HISTORY_FILE = os.path.join(BENCH_DIR, "history.jsonl")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+WORK_DIR = os.path.join(BENCH_DIR, "work")
+
+GROUPS = ["ingest", "context", "query", "nhanes", "plotting"]
+
+# A benchmark regresses when its median is this much slower than the baseline...
+DEFAULT_THRESHOLD = 0.20
+# ...and at least this many seconds slower (keeps tiny timings from flapping)
+MIN_DELTA_SECONDS = 0.005
+
+# SQL for the Streamlit preset questions, as the LLM typically writes it
+PRESET_QUERIES = {
+    "preset_pm25_ca_ny": """
+        SELECT state, year, pm25_annual_mean FROM state_air_quality
+        WHERE state IN ('California', 'New York') AND year BETWEEN 2018 AND 2022
+        ORDER BY state, year""",
+    "preset_top_mortality_2022": """
+        SELECT state, SUM(number_of_deaths) AS total_deaths FROM wonder_mortality
+        WHERE year = 2022 GROUP BY state ORDER BY total_deaths DESC LIMIT 10""",
+    "preset_county_copd": """
+        SELECT state, county_name, copd_prevalence FROM places_health
+        WHERE year = 2022 ORDER BY copd_prevalence DESC""",
+    "preset_pm25_ca_trend": """
+        SELECT year, pm25_annual_mean FROM state_air_quality
+        WHERE state = 'California' AND year BETWEEN 2018 AND 2023 ORDER BY year""",
+    "preset_pm25_top_states": """
+        SELECT state, year, pm25_annual_mean FROM state_air_quality
+        WHERE year BETWEEN 2018 AND 2022 AND state IN (
+            SELECT state FROM state_air_quality WHERE year BETWEEN 2018 AND 2022
+            GROUP BY state ORDER BY AVG(pm25_annual_mean) DESC LIMIT 5)
+        ORDER BY state, year""",
+}
+
+JOIN_QUERIES = {
+    "join_pm25_mortality": """
+        SELECT a.state, a.year, a.pm25_annual_mean, SUM(w.number_of_deaths) AS deaths
+        FROM state_air_quality a
+        JOIN wonder_mortality w ON w.state_key = a.state_key AND w.year = a.year
+        GROUP BY a.state, a.year, a.pm25_annual_mean""",
+    "join_places_air": """
+        SELECT p.state, AVG(p.copd_prevalence) AS copd, AVG(a.pm25_annual_mean) AS pm25
+        FROM places_health p
+        JOIN state_air_quality a ON a.state_key = p.state_key AND a.year = p.year
+        GROUP BY p.state""",
+    "join_panel": """
+        SELECT state_name, year, pm25_annual_mean, copd_prevalence, age_adjusted_death_rate
+        FROM state_year_panel WHERE year BETWEEN 2018 AND 2023 ORDER BY state_name, year""",
+    "wonder_age_profile": """
+        SELECT age_years, SUM(number_of_deaths) AS deaths, SUM(population) AS population
+        FROM wonder_mortality GROUP BY age_years ORDER BY age_years""",
+}
+
+# Aggregates approximate mode should answer from the samples at the default
+# max_relative_error; a fallback to exact fails the run instead of timing the wrong path
+APPROX_QUERIES = {
+    "approx_total_deaths": "SELECT SUM(number_of_deaths) AS deaths FROM wonder_mortality",
+    "approx_mortality_by_year": "SELECT year, SUM(number_of_deaths) FROM wonder_mortality GROUP BY year",
+}
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def measure(func, repeat):
+    """Run func repeat times; returns (timings, last result)."""
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+class Recorder:
+    def __init__(self, scale, repeat):
+        self.scale = scale
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, group, name, func, repeat=None, rows=None):
+        timings, result = measure(func, repeat or self.repeat)
+        if rows is None and isinstance(result, int):
+            rows = result
+        record = {
+            "scale": self.scale,
+            "group": group,
+            "name": name,
+            "repeat": len(timings),
+            "median_s": statistics.median(timings),
+            "min_s": min(timings),
+            "rows": rows,
+        }
+        self.results.append(record)
+        print(f"  {group:<9} {name:<32} median {record['median_s'] * 1000:10.2f} ms   min {record['min_s'] * 1000:10.2f} ms")
+        return result
+
+def prepare_data(scale, seed):
+    """Generate (or reuse) the synthetic inputs for one scale; returns the work directory."""
+    from synthetic_data import generate
+
+    work = os.path.join(WORK_DIR, f"scale_{scale:g}_seed_{seed}")
+    data_dir = os.path.join(work, "data")
+    if not os.path.exists(os.path.join(data_dir, "wonder_2018-2023.csv")):
+        print(f"Generating synthetic data at scale {scale:g}...")
+        generate(data_dir, scale=scale, seed=seed, labels_dir=os.path.join(REPO_ROOT, "sample_data"))
+    return work
+
+def bench_ingest(recorder, work):
+    import load_data
+    from create_tables import create_tables
+
+    # A plain database file in the work directory, rebuilt in place (no snapshot swap)
+    conn = sqlite3.connect("copd_public_health.db")
+    create_tables(conn)
+    for name, stage in load_data.load_stages(os.path.join(work, "data")):
+        def quiet_stage(stage=stage):
+            # Stages print progress; keep the benchmark output readable
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                return stage(conn)
+
+        recorder.run("ingest", name, quiet_stage, repeat=1)
+    conn.commit()
+    conn.close()
+
+def bench_context(recorder, client, mcp_server):
+    def fetch(expected_status, headers=None):
+        response = client.post("/v1/context", headers=headers)
+        if response.status_code != expected_status:
+            raise RuntimeError(f"/v1/context returned {response.status_code}")
+
+    def cold():
+        mcp_server._context_cache["version"] = None
+        fetch(200)
+
+    recorder.run("context", "context_cold", cold)
+    etag = client.post("/v1/context").headers.get("ETag")
+    recorder.run("context", "context_warm", lambda: fetch(200))
+    recorder.run("context", "context_not_modified", lambda: fetch(304, {"If-None-Match": etag}))
+
+def bench_queries(recorder, client):
+    from query_tables import QUERIES
+
+    def run_query(sql, **options):
+        result = client.post("/v1/query", json={"query": sql, **options}).json()
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        if options.get("approximate") and not result.get("approximate"):
+            raise RuntimeError(f"approximate query fell back to exact: {result.get('fallback_reason')}")
+        return len(result["rows"])
+
+    for name, sql in PRESET_QUERIES.items():
+        recorder.run("query", name, lambda sql=sql: run_query(sql))
+    for i, (description, sql) in enumerate(QUERIES):
+        recorder.run("query", f"stats_{i}_{description.split()[0].lower()}", lambda sql=sql: run_query(sql))
+    for name, sql in JOIN_QUERIES.items():
+        recorder.run("query", name, lambda sql=sql: run_query(sql))
+
+    batch = {"queries": [{"name": str(i), "query": sql} for i, (_, sql) in enumerate(QUERIES)]}
+    recorder.run("query", "stats_batch", lambda: client.post("/v1/query/batch", json=batch).json()["executed"])
+    for name, sql in APPROX_QUERIES.items():
+        recorder.run("query", name, lambda sql=sql: run_query(sql, approximate=True))
+
+def bench_nhanes(recorder, scale, work):
+    """Merge per-component frames on SEQN, decode labels and apply the derived-variable recodes."""
+    from benchmark_recodes import make_frame
+    from decode_variables import apply_nhanes_labels
+    from derived_variables import DERIVED_VARIABLES, compile_recodes
+
+    frame = make_frame(max(1000, int(12000 * scale * 10)))
+    components = [
+        frame[["SEQN", "RIDAGEYR"]],
+        frame[["SEQN", "SMQ020", "SMQ040", "SMAQUEX2"]],
+        frame[["SEQN", "MCQ010", "MCQ053", "MCQ149", "DIQ010"]],
+        frame[["SEQN", "BMXBMI", "ALQ130", "ALQ111", "LBXHSCRP"]],
+    ]
+    labels_path = os.path.join(work, "data", "nhanes_value_labels.json")
+    apply_recodes = compile_recodes(DERIVED_VARIABLES)
+
+    def merge():
+        merged = components[0]
+        for component in components[1:]:
+            merged = merged.merge(component, on="SEQN", how="left")
+        return merged
+
+    merged = recorder.run("nhanes", "merge", merge, rows=len(frame))
+    decoded = recorder.run("nhanes", "decode_labels", lambda: apply_nhanes_labels(merged, path=labels_path), rows=len(frame))
+    recorder.run("nhanes", "recode", lambda: apply_recodes(decoded), rows=len(frame))
+
+def bench_plotting(recorder, client):
+    import pandas as pd
+    from plotting import plot_columns, prepare_series, render_line_chart
+
+    workloads = {
+        "plot_pm25_all_states": "SELECT state, year, pm25_annual_mean FROM state_air_quality ORDER BY state, year",
+        "plot_mortality_age_by_state": """
+            SELECT state, age_years, SUM(number_of_deaths) AS deaths FROM wonder_mortality
+            GROUP BY state, age_years""",
+    }
+    for name, sql in workloads.items():
+        result = client.post("/v1/query", json={"query": sql}).json()
+        df = pd.DataFrame(result["rows"], columns=result["columns"])
+        columns = plot_columns(df)
+
+        def draw(df=df, columns=columns):
+            render_line_chart(prepare_series(df, *columns), columns[0], columns[1])
+            return len(df)
+
+        recorder.run("plotting", name, draw)
+
+def run_scale(scale, seed, repeat, groups):
+    work = prepare_data(scale, seed)
+    recorder = Recorder(scale, repeat)
+    print(f"\nScale {scale:g}")
+
+    previous = os.getcwd()
+    os.chdir(work)
+    try:
+        if "ingest" in groups or not os.path.exists("copd_public_health.db"):
+            bench_ingest(recorder, work)
+
+        from fastapi.testclient import TestClient
+        import mcp_server
+        client = TestClient(mcp_server.app)
+
+        if "context" in groups:
+            bench_context(recorder, client, mcp_server)
+        if "query" in groups:
+            bench_queries(recorder, client)
+        if "nhanes" in groups:
+            bench_nhanes(recorder, scale, work)
+        if "plotting" in groups:
+            bench_plotting(recorder, client)
+    finally:
+        os.chdir(previous)
+    return recorder.results
+
+def result_key(record):
+    return f"{record['scale']:g}/{record['group']}/{record['name']}"
+
+def compare(results, baseline, threshold):
+    """Print each benchmark against the baseline; returns the regressed keys."""
+    regressions = []
+    print(f"\n{'benchmark':<52} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for record in results:
+        key = result_key(record)
+        if key not in baseline:
+            continue
+        before, after = baseline[key], record["median_s"]
+        change = (after - before) / before if before else 0.0
+        regressed = change > threshold and after - before > MIN_DELTA_SECONDS
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{key:<52} {before * 1000:>12.2f} {after * 1000:>12.2f} {change:>+7.0%}{flag}")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest, context, query, NHANES and plotting paths")
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    run = {
+        "run_id": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+    }
+
+    results = []
+    for scale in args.scales:
+        results += run_scale(scale, args.seed, args.repeat, args.groups)
+
+    with open(args.history, "a") as f:
+        for record in results:
+            f.write(json.dumps({**run, **record}) + "\n")
+    print(f"\nAppended {len(results)} results to {args.history}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update({result_key(record): record["median_s"] for record in results})
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
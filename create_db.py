@@ -1,4 +1,11 @@
+import os
 import sqlite3
+import sys
 
-conn = sqlite3.connect('copd_public_health.db')
-conn.close()
\ No newline at end of file
+database = 'copd_public_health.db'
+if os.path.islink(database):
+    # A published snapshot already exists; load_data.py builds new ones
+    sys.exit(f"{database} is a published snapshot; rebuild with load_data.py instead")
+
+conn = sqlite3.connect(database)
+conn.close()
@@ -1,62 +1,158 @@
+import os
 import sqlite3
+import sys
 
-conn = sqlite3.connect('copd_public_health.db')
-cursor = conn.cursor()
-
-# Drop existing tables if they exist
-cursor.execute("DROP TABLE IF EXISTS nhanes_survey")
-cursor.execute("DROP TABLE IF EXISTS wonder_mortality")
-cursor.execute("DROP TABLE IF EXISTS places_health")
-cursor.execute("DROP TABLE IF EXISTS state_air_quality")
-
-# Create tables
-cursor.execute("""
-CREATE TABLE nhanes_survey (
-    SEQN INTEGER,                      -- Respondent ID
-    year INTEGER,                      -- Survey year
-    MCQ010 INTEGER,                    -- Ever been told you have asthma
-    MCQ160p INTEGER,                   -- Ever been told you had COPD
-    SMQ020 INTEGER,                    -- Smoked at least 100 cigarettes
-    SMQ040 INTEGER,                    -- Do you now smoke cigarettes
-    RIAGENDR INTEGER,                  -- Gender
-    RIDAGEYR INTEGER,                  -- Age at screening
-    RIDRETH1 INTEGER,                  -- Race/Hispanic origin
-    HIQ011 INTEGER,                    -- Covered by health insurance
-    PRIMARY KEY (SEQN, year)
-)""")
-
-cursor.execute("""
-CREATE TABLE wonder_mortality (
-    state TEXT,                         -- State abbreviation
-    year INTEGER,                       -- Year
-    sex TEXT,                          -- Gender
-    age TEXT,                          -- Age group
-    race TEXT,                         -- Race/ethnicity
-    cause_of_death TEXT,               -- ICD-10 Cause
-    number_of_deaths INTEGER,          -- Number of deaths
-    population INTEGER,                -- Population
-    PRIMARY KEY (state, year, sex, age, race, cause_of_death)
-)""")
-
-cursor.execute("""
-CREATE TABLE places_health (
-    state TEXT,                         -- State abbreviation
-    county_name TEXT,                   -- County name
-    fips_code TEXT,                     -- County FIPS
-    year INTEGER,                       -- Year of BRFSS data
-    copd_prevalence FLOAT,              -- % COPD prevalence
-    smoking_prevalence FLOAT,           -- % smoking prevalence
-    obesity_prevalence FLOAT,           -- % obesity prevalence
-    PRIMARY KEY (fips_code, year)
-)""")
-
-cursor.execute("""
-CREATE TABLE state_air_quality (
-    state TEXT,                         -- State abbreviation
-    year INTEGER,                       -- Year
-    pm25_annual_mean FLOAT,             -- Annual mean PM2.5
-    PRIMARY KEY (state, year)
-)""")
-
-conn.commit()
-conn.close()
+from approx import SAMPLED_TABLES, sample_table, strata_table
+
+def create_tables(conn):
+    """Drop and recreate every table on conn (an empty file for a new snapshot)."""
+    cursor = conn.cursor()
+
+    # Drop existing tables if they exist
+    cursor.execute("DROP TABLE IF EXISTS nhanes_survey")
+    cursor.execute("DROP TABLE IF EXISTS wonder_mortality")
+    cursor.execute("DROP TABLE IF EXISTS places_health")
+    cursor.execute("DROP TABLE IF EXISTS state_air_quality")
+    cursor.execute("DROP TABLE IF EXISTS places_rtree")
+    cursor.execute("DROP TABLE IF EXISTS state_dim")
+    cursor.execute("DROP TABLE IF EXISTS state_year_panel")
+    cursor.execute("DROP TABLE IF EXISTS nhanes_variables")
+    cursor.execute("DROP TABLE IF EXISTS nhanes_value_labels")
+    cursor.execute("DROP TABLE IF EXISTS nhanes_label_search")
+    for table in SAMPLED_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {sample_table(table)}")
+        cursor.execute(f"DROP TABLE IF EXISTS {strata_table(table)}")
+
+    # Create tables
+    cursor.execute("""
+    CREATE TABLE nhanes_survey (
+        SEQN INTEGER,                      -- Respondent ID
+        year INTEGER,                      -- Survey year
+        MCQ010 INTEGER,                    -- Ever been told you have asthma
+        MCQ160p INTEGER,                   -- Ever been told you had COPD
+        SMQ020 INTEGER,                    -- Smoked at least 100 cigarettes
+        SMQ040 INTEGER,                    -- Do you now smoke cigarettes
+        RIAGENDR INTEGER,                  -- Gender
+        RIDAGEYR INTEGER,                  -- Age at screening
+        RIDRETH1 INTEGER,                  -- Race/Hispanic origin
+        HIQ011 INTEGER,                    -- Covered by health insurance
+        WTINT2YR REAL,                     -- Interview sample weight
+        WTMEC2YR REAL,                     -- MEC exam sample weight
+        SDMVSTRA INTEGER,                  -- Masked variance pseudo-stratum
+        SDMVPSU INTEGER,                   -- Masked variance pseudo-PSU
+        PRIMARY KEY (SEQN, year)
+    )""")
+
+    cursor.execute("""
+    CREATE TABLE wonder_mortality (
+        state TEXT,                         -- State abbreviation
+        state_key INTEGER,                  -- state_dim key (state FIPS)
+        year INTEGER,                       -- Year
+        sex TEXT,                          -- Gender
+        age TEXT,                          -- Age group
+        age_years INTEGER,                 -- Age parsed to integer years (NULL if not stated)
+        race TEXT,                         -- Race/ethnicity
+        cause_of_death TEXT,               -- ICD-10 Cause
+        number_of_deaths INTEGER,          -- Number of deaths
+        population INTEGER,                -- Population
+        PRIMARY KEY (state, year, sex, age, race, cause_of_death)
+    )""")
+
+    cursor.execute("""
+    CREATE TABLE places_health (
+        state TEXT,                         -- State abbreviation
+        state_key INTEGER,                  -- state_dim key (state FIPS)
+        county_name TEXT,                   -- County name
+        fips_code TEXT,                     -- County FIPS
+        year INTEGER,                       -- Year of BRFSS data
+        population INTEGER,                 -- County total population
+        longitude FLOAT,                    -- County centroid longitude
+        latitude FLOAT,                     -- County centroid latitude
+        copd_prevalence FLOAT,              -- % COPD prevalence
+        smoking_prevalence FLOAT,           -- % smoking prevalence
+        obesity_prevalence FLOAT,           -- % obesity prevalence
+        PRIMARY KEY (fips_code, year)
+    )""")
+
+    cursor.execute("""
+    CREATE TABLE state_air_quality (
+        state TEXT,                         -- State abbreviation
+        state_key INTEGER,                  -- state_dim key (state FIPS)
+        year INTEGER,                       -- Year
+        pm25_annual_mean FLOAT,             -- Annual mean PM2.5
+        PRIMARY KEY (state, year)
+    )""")
+
+    # Spatial index over places_health centroids (id = places_health rowid, see geo.py)
+    cursor.execute("""
+    CREATE VIRTUAL TABLE places_rtree USING rtree(
+        id,                                 -- places_health rowid
+        min_lon, max_lon,                   -- Longitude (a point: min = max)
+        min_lat, max_lat                    -- Latitude (a point: min = max)
+    )""")
+
+    # Canonical state dimension (see states.py); NHANES public files carry no state
+    cursor.execute("""
+    CREATE TABLE state_dim (
+        state_key INTEGER,                  -- State FIPS code
+        state_abbr TEXT,                    -- USPS abbreviation (PLACES)
+        state_name TEXT,                    -- Full name (WONDER, EPA)
+        PRIMARY KEY (state_key)
+    )""")
+
+    cursor.execute("CREATE INDEX idx_wonder_state_key ON wonder_mortality (state_key, year)")
+    cursor.execute("CREATE INDEX idx_places_state_key ON places_health (state_key, year)")
+    cursor.execute("CREATE INDEX idx_air_quality_state_key ON state_air_quality (state_key, year)")
+
+    # Precomputed cross-dataset panel (see states.build_state_year_panel)
+    cursor.execute("""
+    CREATE TABLE state_year_panel (
+        state_key INTEGER,                  -- state_dim key
+        year INTEGER,                       -- Year
+        state_name TEXT,                    -- Full state name
+        state_abbr TEXT,                    -- State abbreviation
+        pm25_annual_mean FLOAT,             -- EPA annual mean PM2.5
+        copd_prevalence FLOAT,              -- Population-weighted PLACES COPD prevalence
+        smoking_prevalence FLOAT,           -- Population-weighted PLACES smoking prevalence
+        obesity_prevalence FLOAT,           -- Population-weighted PLACES obesity prevalence
+        deaths INTEGER,                     -- WONDER deaths
+        population INTEGER,                 -- WONDER population
+        crude_death_rate FLOAT,             -- Deaths per 100,000
+        age_adjusted_death_rate FLOAT,      -- Age-adjusted deaths per 100,000 (US 2000 standard)
+        PRIMARY KEY (state_key, year)
+    )""")
+
+    # NHANES label dictionary (see nhanes_labels.py)
+    cursor.execute("""
+    CREATE TABLE nhanes_variables (
+        variable TEXT,                      -- NHANES variable name (upper case)
+        label TEXT,                         -- SAS label
+        PRIMARY KEY (variable)
+    )""")
+
+    cursor.execute("""
+    CREATE TABLE nhanes_value_labels (
+        variable TEXT,                      -- NHANES variable name (upper case)
+        code TEXT,                          -- Response code
+        label TEXT,                         -- Code meaning
+        PRIMARY KEY (variable, code)
+    )""")
+
+    cursor.execute("""
+    CREATE VIRTUAL TABLE nhanes_label_search USING fts5(
+        variable,                           -- NHANES variable name
+        label,                              -- SAS label
+        value_labels,                       -- All code meanings, space separated
+        tokenize = 'porter unicode61'
+    )""")
+
+    conn.commit()
+
+if __name__ == '__main__':
+    database = sys.argv[1] if len(sys.argv) > 1 else 'copd_public_health.db'
+    if os.path.islink(database):
+        # A published snapshot: servers open it immutable, so it must never be rewritten
+        sys.exit(f"{database} is a published snapshot; rebuild with load_data.py instead")
+    conn = sqlite3.connect(database)
+    create_tables(conn)
+    conn.close()
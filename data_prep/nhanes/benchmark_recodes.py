@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from derived_variables import DERIVED_VARIABLES, compile_recodes
+
+
+def recode_yes_no(series):
+    """
+    Maps NHANES yes/no variables to 1/0.
+    Returns pd.NA for any unexpected values.
+    """
+    return series.replace({1: 1, 2: 0}).where(series.isin([1, 2]))
+
+def legacy_derived_variables(merged):
+    """The hand-written recodes process_nhanes_data.py used before the spec engine."""
+    merged = merged.copy()
+    merged["age_group"] = pd.cut(
+        merged["RIDAGEYR"], bins=[0, 18, 39, 64, 120],
+        labels=["<18", "18–39", "40–64", "65+"]
+    )
+    merged["smoked_100_cigs"] = recode_yes_no(merged["SMQ020"])
+    merged["current_smoker"] = merged["SMQ040"].map({1: 1, 2: 1, 3: 0, 7: None, 9: None})
+    merged["household_smokers"] = recode_yes_no(merged["SMAQUEX2"])
+    merged["asthma_ever"] = recode_yes_no(merged["MCQ010"])
+    merged["asthma_now"] = recode_yes_no(merged["MCQ053"])
+    merged["bronchitis"] = recode_yes_no(merged["MCQ149"])
+    merged["has_diabetes"] = recode_yes_no(merged["DIQ010"])
+    merged["bmi"] = merged["BMXBMI"]
+    merged["bmi_category"] = pd.cut(
+        merged["BMXBMI"],
+        bins=[0, 18.5, 25, 30, 100],
+        labels=["Underweight", "Normal", "Overweight", "Obese"]
+    )
+    merged["drinks_per_week"] = merged["ALQ130"]
+    merged["alcohol_use"] = recode_yes_no(merged["ALQ111"])
+    merged["high_crp"] = merged["LBXHSCRP"].apply(lambda x: 1 if x >= 3 else (0 if pd.notna(x) else pd.NA))
+    return merged
+
+def make_frame(rows, seed=0):
+    """Synthetic merged frame with NHANES-like codes, sentinels and missing values."""
+    rng = np.random.default_rng(seed)
+
+    def codes(choices, p_missing=0.1):
+        values = rng.choice(choices, rows).astype(np.float64)
+        values[rng.random(rows) < p_missing] = np.nan
+        return values
+
+    return pd.DataFrame({
+        "SEQN": np.arange(rows, dtype=np.float64),
+        "RIDAGEYR": rng.integers(0, 81, rows).astype(np.float64),
+        "SMQ020": codes([1, 2, 7, 9]),
+        "SMQ040": codes([1, 2, 3, 7, 9], p_missing=0.5),
+        "SMAQUEX2": codes([1, 2]),
+        "MCQ010": codes([1, 2, 9]),
+        "MCQ053": codes([1, 2, 9]),
+        "MCQ149": codes([1, 2]),
+        "DIQ010": codes([1, 2, 3, 9]),
+        "BMXBMI": np.round(rng.normal(29, 7, rows).clip(12, 90), 1),
+        "ALQ130": codes(np.arange(1, 16).tolist() + [777, 999]),
+        "ALQ111": codes([1, 2, 7, 9]),
+        "LBXHSCRP": np.where(rng.random(rows) < 0.2, np.nan, rng.lognormal(0.5, 1.1, rows)),
+    })
+
+def check_equal(legacy, compiled):
+    """The two engines must agree on every derived column (NaN == NA)."""
+    for spec in DERIVED_VARIABLES:
+        name = spec["name"]
+        a, b = legacy[name], compiled[name]
+        if spec["kind"] == "bins":
+            assert (a.astype(object).fillna("NA") == b.astype(object).fillna("NA")).all(), name
+        else:
+            a = pd.to_numeric(a, errors="coerce").to_numpy(dtype=np.float64)
+            b = np.asarray(b, dtype=np.float64)
+            assert np.array_equal(a, b, equal_nan=True), name
+
+def best_of(func, frame, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(frame)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main(sizes, repeats):
+    apply_recodes = compile_recodes(DERIVED_VARIABLES)
+
+    print(f"{'rows':>10} {'legacy (s)':>12} {'compiled (s)':>13} {'speedup':>8}")
+    for rows in sizes:
+        frame = make_frame(rows)
+        legacy_time, legacy = best_of(legacy_derived_variables, frame, repeats)
+        compiled_time, compiled = best_of(apply_recodes, frame, repeats)
+        check_equal(legacy, compiled)
+        print(f"{rows:>10} {legacy_time:>12.4f} {compiled_time:>13.4f} {legacy_time / compiled_time:>7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare hand-written and compiled NHANES recodes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    main(args.sizes, args.repeats)
@@ -0,0 +1,84 @@
+import json
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+VALUE_LABELS_FILE = "../../data/nhanes/nhanes_value_labels.json"
+
+# Suffix for the decoded (categorical) copy of each coded variable
+LABEL_SUFFIX = "_label"
+
+@lru_cache(maxsize=None)
+def load_value_labels(path=VALUE_LABELS_FILE):
+    """
+    Parses the value-label JSON once per process.
+    Variable names are upper-cased to match the XPT column names.
+    """
+    with open(path) as f:
+        return {name.upper(): codes for name, codes in json.load(f).items()}
+
+def is_categorical(codes):
+    """
+    True for variables whose labels are all integer codes.
+    Continuous variables carry range entries like "0 to 79": "Range of Values".
+    Same rule as the SQL view in nhanes_labels.create_decoded_view.
+    """
+    return all(re.fullmatch(r"-?[0-9]+", code) or code == "< blank >" for code in codes)
+
+def compile_decoder(codes):
+    """
+    Turns {code: label} into a sorted code array plus the index of each code's
+    category, so decoding is a single searchsorted over the column.
+    """
+    pairs = sorted((int(code), label) for code, label in codes.items() if code != "< blank >")
+
+    categories = []
+    positions = {}
+    category_index = []
+    for _, label in pairs:
+        if label not in positions:
+            positions[label] = len(categories)
+            categories.append(label)
+        category_index.append(positions[label])
+
+    return (
+        np.array([code for code, _ in pairs], dtype=np.float64),
+        np.array(category_index, dtype=np.int32),
+        categories,
+    )
+
+@lru_cache(maxsize=None)
+def compile_decoders(path=VALUE_LABELS_FILE):
+    """Precompiled lookup arrays for every categorical variable in the label file."""
+    return {
+        name: compile_decoder(codes)
+        for name, codes in load_value_labels(path).items()
+        if codes and is_categorical(codes)
+    }
+
+def decode_series(series, decoder):
+    """Vectorized code -> label mapping; unknown codes and missing values become NaN."""
+    codes, category_index, categories = decoder
+    values = pd.to_numeric(series, errors="coerce").to_numpy(dtype=np.float64)
+
+    idx = np.minimum(np.searchsorted(codes, values), len(codes) - 1)
+    matched = codes[idx] == values  # NaN never matches
+    category_codes = np.where(matched, category_index[idx], -1)
+
+    return pd.Categorical.from_codes(category_codes, categories=categories)
+
+def apply_nhanes_labels(df, path=VALUE_LABELS_FILE, suffix=LABEL_SUFFIX):
+    """
+    Adds a categorical `<VAR>_label` column for every coded variable in df.
+    Raw codes are kept so recodes and SQL filters keep working on them.
+    """
+    decoders = compile_decoders(path)
+    decoded = {
+        f"{col}{suffix}": decode_series(df[col], decoders[col.upper()])
+        for col in df.columns
+        if col.upper() in decoders
+    }
+    return pd.concat([df, pd.DataFrame(decoded, index=df.index)], axis=1)
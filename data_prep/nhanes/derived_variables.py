@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+
+# Declarative spec for the derived NHANES indicators.
+#   yes_no:    1 -> 1, 2 -> 0, anything else -> NaN
+#   map:       integer code -> value, unmapped codes -> NaN
+#   bins:      right-closed intervals like pd.cut, returns an ordered categorical
+#   threshold: 1 if value >= threshold, 0 if below, NaN if missing
+#   copy:      the source column as float
+DERIVED_VARIABLES = [
+    # Demographics
+    {"name": "age_group", "source": "RIDAGEYR", "kind": "bins",
+     "bins": [0, 18, 39, 64, 120], "labels": ["<18", "18–39", "40–64", "65+"]},
+
+    # Smoking
+    {"name": "smoked_100_cigs", "source": "SMQ020", "kind": "yes_no"},
+    {"name": "current_smoker", "source": "SMQ040", "kind": "map",
+     "map": {1: 1, 2: 1, 3: 0}},  # Every day, Some days, Not at all
+    {"name": "household_smokers", "source": "SMAQUEX2", "kind": "yes_no"},
+
+    # Respiratory
+    {"name": "asthma_ever", "source": "MCQ010", "kind": "yes_no"},
+    {"name": "asthma_now", "source": "MCQ053", "kind": "yes_no"},
+    {"name": "bronchitis", "source": "MCQ149", "kind": "yes_no"},
+
+    # Diabetes
+    {"name": "has_diabetes", "source": "DIQ010", "kind": "yes_no"},  # Doctor told you?
+
+    # BMI category
+    {"name": "bmi", "source": "BMXBMI", "kind": "copy"},
+    {"name": "bmi_category", "source": "BMXBMI", "kind": "bins",
+     "bins": [0, 18.5, 25, 30, 100], "labels": ["Underweight", "Normal", "Overweight", "Obese"]},
+
+    # Alcohol (optional — may confound respiratory health)
+    {"name": "drinks_per_week", "source": "ALQ130", "kind": "copy"},  # usual drinks/week
+    {"name": "alcohol_use", "source": "ALQ111", "kind": "yes_no"},  # At least 12 drinks ever?
+
+    # Inflammation marker (HSCRP ≥ 3.0 mg/L = high risk)
+    {"name": "high_crp", "source": "LBXHSCRP", "kind": "threshold", "threshold": 3.0},
+]
+
+YES_NO_MAP = {1: 1, 2: 0}
+
+def compile_code_map(mapping):
+    """Dense lookup table indexed by integer code; NaN for unmapped codes."""
+    table = np.full(max(mapping) + 1, np.nan)
+    for code, value in mapping.items():
+        table[code] = np.nan if value is None else value
+    return table
+
+def lookup(values, table):
+    """Vectorized table[values] for float codes; non-integer or out-of-range -> NaN."""
+    valid = (values >= 0) & (values < len(table)) & (values == np.floor(values))
+    idx = np.where(valid, values, 0).astype(np.intp)
+    return np.where(valid, table[idx], np.nan)
+
+def compile_spec(spec):
+    """Return a function float array -> derived column for one spec entry."""
+    kind = spec["kind"]
+
+    if kind in ("yes_no", "map"):
+        table = compile_code_map(YES_NO_MAP if kind == "yes_no" else spec["map"])
+        return lambda values: lookup(values, table)
+
+    if kind == "bins":
+        edges = np.asarray(spec["bins"], dtype=np.float64)
+        categories = pd.Index(spec["labels"])
+        if len(categories) != len(edges) - 1:
+            raise ValueError(f"{spec['name']}: need {len(edges) - 1} labels for {len(edges)} bin edges")
+
+        def apply_bins(values):
+            # side="left" makes intervals right-closed: edges[i-1] < v <= edges[i]
+            i = np.searchsorted(edges, values, side="left")
+            codes = np.where((i >= 1) & (i < len(edges)), i - 1, -1)
+            return pd.Categorical.from_codes(codes, categories=categories, ordered=True)
+        return apply_bins
+
+    if kind == "threshold":
+        threshold = spec["threshold"]
+        return lambda values: np.where(np.isnan(values), np.nan, (values >= threshold).astype(np.float64))
+
+    if kind == "copy":
+        return lambda values: values.copy()
+
+    raise ValueError(f"{spec['name']}: unknown recode kind {kind!r}")
+
+def compile_recodes(specs=DERIVED_VARIABLES):
+    """
+    Compile the spec into a single function df -> df with all derived columns.
+    Each source column is converted to a float array once and shared by every
+    recode that reads it; all outputs are attached in one concat.
+    """
+    by_source = {}
+    for spec in specs:
+        by_source.setdefault(spec["source"], []).append((spec["name"], compile_spec(spec)))
+
+    def apply_recodes(df):
+        derived = {}
+        for source, recodes in by_source.items():
+            if source not in df.columns:
+                print(f"⚠️ Skipping {[name for name, _ in recodes]}: missing column {source}")
+                continue
+            values = pd.to_numeric(df[source], errors="coerce").to_numpy(dtype=np.float64)
+            for name, recode in recodes:
+                derived[name] = recode(values)
+
+        # Re-running on an already enriched frame replaces the old columns
+        base = df.drop(columns=[name for name in derived if name in df.columns])
+        return pd.concat([base, pd.DataFrame(derived, index=df.index)], axis=1)
+
+    return apply_recodes
@@ -0,0 +1,173 @@
+# db_pool.py
+#
+# Small pool of read-only SQLite connections shared by request handlers.
+# Connections are opened with mode=ro and query_only, so statements that
+# try to write fail instead of touching the database, and they can be used
+# from any worker thread (one thread at a time).
+#
+# When the database path is a snapshot symlink (see snapshots.py) the pool
+# notices it being repointed: idle connections to the old file are closed
+# straight away, busy ones when they are released, and replacements open
+# against the new file. Published snapshots are never written again, so
+# with immutable=True they are opened with SQLite's immutable flag (no file
+# locking or change detection); mmap_size turns on memory-mapped reads, so
+# worker processes share the OS page cache instead of each copying pages.
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_POOL_SIZE = 8
+
+# Bytes of each database file SQLite may memory-map (0 disables mmap)
+DEFAULT_MMAP_SIZE = 1 << 30
+
+# How often acquire() checks whether the database path points somewhere new
+SNAPSHOT_CHECK_SECONDS = 1.0
+
+class ReadPool:
+    def __init__(self, database, size=DEFAULT_POOL_SIZE, on_switch=None, immutable=False, mmap_size=0):
+        self.database = database
+        self.size = size
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self.idle = queue.LifoQueue()
+        self.opened = 0
+        self.waiting = 0
+        self.lock = threading.Lock()
+        # Snapshot tracking: which file pooled connections were opened on
+        self.on_switch = on_switch
+        self.target = os.path.realpath(database)
+        self.generation = 0
+        self.generations = {}
+        self.checked_at = time.monotonic()
+
+    def open(self, path=None):
+        """A new read-only connection to path, by default the file the database path currently points at."""
+        path = path or os.path.realpath(self.database)
+        # Only a published snapshot (reached through the symlink) is safe to treat as immutable
+        immutable = self.immutable and os.path.islink(self.database)
+        uri = f"file:{path}?mode=ro" + ("&immutable=1" if immutable else "")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only = 1")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return conn
+
+    def open_pooled(self):
+        # Open the file the current generation was recorded for, so cache versions
+        # taken from self.target always describe what pooled connections read
+        with self.lock:
+            generation, target = self.generation, self.target
+        conn = self.open(target)
+        with self.lock:
+            self.generations[conn] = generation
+        return conn
+
+    def discard(self, conn):
+        conn.close()
+        with self.lock:
+            self.generations.pop(conn, None)
+
+    def check_snapshot(self, force=False):
+        """Drain idle connections if the database path was repointed since the last check."""
+        now = time.monotonic()
+        if not force and now - self.checked_at < SNAPSHOT_CHECK_SECONDS:
+            return
+        self.checked_at = now
+        target = os.path.realpath(self.database)
+        if target == self.target:
+            return
+        with self.lock:
+            if target == self.target:
+                return
+            self.target = target
+            self.generation += 1
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+            with self.lock:
+                self.opened -= 1
+        if self.on_switch is not None:
+            self.on_switch()
+
+    def current(self, conn):
+        """conn, or a replacement if a switch made it stale while it sat idle."""
+        if self.generations.get(conn) == self.generation:
+            return conn
+        self.discard(conn)
+        try:
+            return self.open_pooled()
+        except sqlite3.Error:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    def acquire(self):
+        self.check_snapshot()
+        try:
+            return self.current(self.idle.get_nowait())
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.opened < self.size:
+                self.opened += 1
+                reserved = True
+            else:
+                reserved = False
+        if reserved:
+            try:
+                return self.open_pooled()
+            except sqlite3.Error:
+                with self.lock:
+                    self.opened -= 1
+                raise
+        # Pool is at capacity: wait for a connection to come back
+        with self.lock:
+            self.waiting += 1
+        try:
+            conn = self.idle.get()
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        return self.current(conn)
+
+    @property
+    def in_use(self):
+        return self.opened - self.idle.qsize()
+
+    def release(self, conn):
+        if self.generations.get(conn) == self.generation:
+            self.idle.put(conn)
+            return
+        # Opened on a snapshot that has since been replaced: swap in a fresh one
+        self.discard(conn)
+        try:
+            self.idle.put(self.open_pooled())
+        except sqlite3.Error:
+            with self.lock:
+                self.opened -= 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+            with self.lock:
+                self.opened -= 1
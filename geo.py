@@ -0,0 +1,105 @@
+# geo.py
+#
+# Spatial lookups over PLACES county centroids using SQLite's R-tree module.
+# places_rtree holds one point (as a degenerate box) per places_health rowid.
+
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.195
+
+# First search radius for k-nearest queries; doubled until k points are found
+INITIAL_RADIUS_KM = 50.0
+
+PLACES_COLUMNS = [
+    "state", "county_name", "fips_code", "year", "longitude", "latitude",
+    "copd_prevalence", "smoking_prevalence", "obesity_prevalence",
+]
+
+def parse_point(text):
+    """'POINT (lon lat)' -> (lon, lat); (None, None) if it does not parse."""
+    try:
+        lon, lat = str(text).strip()[len("POINT"):].strip(" ()").split()
+        return float(lon), float(lat)
+    except ValueError:
+        return None, None
+
+def haversine_km(lon1, lat1, lon2, lat2):
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def radius_box(lon, lat, radius_km):
+    """Bounding box (min_lon, min_lat, max_lon, max_lat) containing the circle."""
+    dlat = radius_km / KM_PER_DEGREE
+    # Use the latitude closest to the pole so the box stays wide enough at its edge
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return lon - dlon, max(lat - dlat, -90.0), lon + dlon, min(lat + dlat, 90.0)
+
+def radius_boxes(lon, lat, radius_km):
+    """
+    radius_box split at the antimeridian: one box, or two when the circle
+    crosses +/-180 degrees longitude (R-tree ranges can't wrap around).
+    """
+    min_lon, min_lat, max_lon, max_lat = radius_box(lon, lat, radius_km)
+    if max_lon - min_lon >= 360.0:
+        return [(-180.0, min_lat, 180.0, max_lat)]
+    if min_lon < -180.0:
+        return [(-180.0, min_lat, max_lon, max_lat), (min_lon + 360.0, min_lat, 180.0, max_lat)]
+    if max_lon > 180.0:
+        return [(min_lon, min_lat, 180.0, max_lat), (-180.0, min_lat, max_lon - 360.0, max_lat)]
+    return [(min_lon, min_lat, max_lon, max_lat)]
+
+def query_radius_box(cursor, lon, lat, radius_km, year=None):
+    """PLACES rows inside the bounding box(es) of a circle, across the antimeridian if need be."""
+    return [row for box in radius_boxes(lon, lat, radius_km) for row in query_bbox(cursor, *box, year=year)]
+
+def query_bbox(cursor, min_lon, min_lat, max_lon, max_lat, year=None, limit=None):
+    """PLACES rows whose centroid falls inside the box, via the R-tree index."""
+    sql = f"""
+        SELECT {', '.join(f'p.{c}' for c in PLACES_COLUMNS)}
+        FROM places_rtree r
+        JOIN places_health p ON p.rowid = r.id
+        WHERE r.min_lon <= ? AND r.max_lon >= ?
+          AND r.min_lat <= ? AND r.max_lat >= ?
+          -- R-tree boxes are float32 and rounded outward; re-check exactly
+          AND p.longitude BETWEEN ? AND ?
+          AND p.latitude BETWEEN ? AND ?
+    """
+    params = [max_lon, min_lon, max_lat, min_lat, min_lon, max_lon, min_lat, max_lat]
+    if year is not None:
+        sql += " AND p.year = ?"
+        params.append(year)
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+def query_nearest(cursor, lon, lat, k=10, year=None):
+    """
+    The k PLACES rows nearest to (lon, lat), each with a distance_km column.
+    Grows a search box until it holds k points, then widens it once more to the
+    k-th distance so no closer point outside the first box can be missed.
+    """
+    radius = INITIAL_RADIUS_KM
+    while True:
+        rows = query_radius_box(cursor, lon, lat, radius, year=year)
+        if len(rows) >= k or radius >= math.pi * EARTH_RADIUS_KM:
+            break
+        radius *= 2
+
+    lon_idx, lat_idx = PLACES_COLUMNS.index("longitude"), PLACES_COLUMNS.index("latitude")
+
+    def with_distance(rows):
+        return sorted(
+            (list(row) + [haversine_km(lon, lat, row[lon_idx], row[lat_idx])] for row in rows),
+            key=lambda row: row[-1]
+        )
+
+    nearest = with_distance(rows)[:k]
+    if len(nearest) == k and nearest[-1][-1] > radius:
+        nearest = with_distance(query_radius_box(cursor, lon, lat, nearest[-1][-1], year=year))[:k]
+    return nearest
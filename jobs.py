@@ -0,0 +1,253 @@
+# jobs.py
+#
+# Background query jobs for SQL too slow for an interactive request.
+# Each job runs on its own read-only connection in a worker thread and
+# spills its result to Parquet part files under JOB_DIR/<job_id>/, so large
+# outputs never sit in server memory. Clients poll status and then page
+# through the parts. Finished jobs are removed after RETENTION_SECONDS.
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from query_profile import explain_plan
+
+JOB_DIR = "job_results"
+
+# Rows fetched from SQLite and written per Parquet part file
+PART_ROWS = 50000
+
+# Jobs running at once; later submissions queue
+MAX_RUNNING_JOBS = 2
+
+# Finished jobs (and their files) are kept this long
+RETENTION_SECONDS = 3600
+
+# The progress handler runs every this many SQLite VM instructions
+PROGRESS_INTERVAL = 10000
+
+FINISHED = ("done", "failed", "cancelled")
+
+def to_arrow_column(values):
+    """Arrow array for one column; mixed SQLite types fall back to text."""
+    try:
+        return pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+
+class JobCancelled(Exception):
+    pass
+
+class JobManager:
+    def __init__(self, open_connection, job_dir=JOB_DIR, retention_seconds=RETENTION_SECONDS, observe=None):
+        self.open_connection = open_connection
+        # Optional callback(sql, seconds, rows, error, explain) for each finished job
+        self.observe = observe
+        self.job_dir = job_dir
+        self.retention_seconds = retention_seconds
+        self.jobs = {}
+        self.cancel_flags = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=MAX_RUNNING_JOBS, thread_name_prefix="job")
+
+    def path(self, job_id, name=""):
+        return os.path.join(self.job_dir, job_id, name)
+
+    def save(self, job, part=None, table=None):
+        """
+        Persist job metadata (and optionally a new part file) next to its parts.
+        Holding the lock keeps a cancelled job's directory from being recreated.
+        """
+        with self.lock:
+            if job["job_id"] not in self.jobs:
+                raise JobCancelled(job["job_id"])
+            if part is not None:
+                pq.write_table(table, self.path(job["job_id"], part))
+                job["parts"].append({"file": part, "rows": table.num_rows})
+                job["total_rows"] += table.num_rows
+            meta_path = self.path(job["job_id"], "job.json")
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(job, f)
+            os.replace(meta_path + ".tmp", meta_path)
+
+    def submit(self, sql):
+        self.cleanup()
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "query": sql,
+            "status": "queued",
+            "columns": [],
+            "parts": [],
+            "total_rows": 0,
+            "vm_steps": 0,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        os.makedirs(self.path(job_id), exist_ok=True)
+        with self.lock:
+            self.jobs[job_id] = job
+            self.cancel_flags[job_id] = threading.Event()
+        self.save(job)
+        self.executor.submit(self.run, job_id)
+        return self.status(job_id)
+
+    def run(self, job_id):
+        job, cancelled = self.jobs.get(job_id), self.cancel_flags.get(job_id)
+        if job is None or cancelled is None or cancelled.is_set():
+            return
+
+        conn = None
+        try:
+            job.update(status="running", started_at=time.time())
+            self.save(job)
+            conn = self.open_connection()
+
+            def progress():
+                job["vm_steps"] += PROGRESS_INTERVAL
+                return 1 if cancelled.is_set() else 0
+
+            conn.set_progress_handler(progress, PROGRESS_INTERVAL)
+            cursor = conn.cursor()
+            cursor.execute(job["query"])
+            job["columns"] = [d[0] for d in cursor.description] if cursor.description else []
+
+            while True:
+                rows = cursor.fetchmany(PART_ROWS)
+                if not rows:
+                    break
+                part = f"part-{len(job['parts']):05d}.parquet"
+                table = pa.table(
+                    [to_arrow_column(list(values)) for values in zip(*rows)],
+                    names=[f"c{i}" for i in range(len(job["columns"]))]
+                )
+                self.save(job, part, table)
+
+            job["status"] = "done"
+        except Exception as e:
+            if cancelled.is_set():
+                job["status"] = "cancelled"
+            else:
+                job.update(status="failed", error=str(e))
+        finally:
+            job["finished_at"] = time.time()
+            if self.observe is not None and job["status"] != "cancelled":
+                explain = (lambda: explain_plan(conn.cursor(), job["query"])[0]) if conn is not None else None
+                self.observe(job["query"], job["finished_at"] - job["started_at"], job["total_rows"], job["error"], explain)
+            if conn is not None:
+                conn.close()
+            try:
+                self.save(job)
+            except JobCancelled:
+                pass
+
+    def get(self, job_id):
+        """Job metadata from memory, or from disk if another process ran it."""
+        job = self.jobs.get(job_id)
+        if job is None:
+            try:
+                with open(self.path(os.path.basename(job_id), "job.json")) as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return job
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        finished = job["finished_at"] or time.time()
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "columns": job["columns"],
+            "rows_ready": job["total_rows"],
+            "vm_steps": job["vm_steps"],
+            "elapsed_seconds": round(finished - (job["started_at"] or finished), 3),
+            "error": job["error"],
+        }
+
+    def results(self, job_id, offset=0, limit=1000):
+        """A page of rows read from the part files that overlap [offset, offset + limit)."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+
+        rows, start = [], 0
+        end = offset + limit
+        for part in list(job["parts"]):
+            stop = start + part["rows"]
+            if stop > offset and start < end:
+                table = pq.read_table(self.path(job["job_id"], part["file"]))
+                lo = max(offset - start, 0)
+                piece = table.slice(lo, min(end, stop) - start - lo)
+                rows.extend(zip(*(column.to_pylist() for column in piece.columns)))
+            if stop >= end:
+                break
+            start = stop
+
+        next_offset = offset + len(rows)
+        more = next_offset < job["total_rows"] or job["status"] not in FINISHED
+        return {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "columns": job["columns"],
+            "rows": [list(row) for row in rows],
+            "offset": offset,
+            "total_rows": job["total_rows"],
+            "next_offset": next_offset if more else None,
+        }
+
+    def cancel(self, job_id):
+        """Stop a queued or running job and delete its files."""
+        flag = self.cancel_flags.get(job_id)
+        if flag is not None:
+            flag.set()
+        with self.lock:
+            self.jobs.pop(job_id, None)
+            self.cancel_flags.pop(job_id, None)
+            shutil.rmtree(self.path(os.path.basename(job_id)), ignore_errors=True)
+
+    def shutdown(self):
+        """Stop running jobs at their next progress check, mark queued ones cancelled, and wait for workers."""
+        with self.lock:
+            pending = [(self.jobs[job_id], flag) for job_id, flag in self.cancel_flags.items() if job_id in self.jobs]
+        for job, flag in pending:
+            if job["status"] in FINISHED:
+                continue
+            flag.set()
+            if job["status"] == "queued":
+                job.update(status="cancelled", finished_at=time.time(), error="Server shut down")
+                try:
+                    self.save(job)
+                except JobCancelled:
+                    pass
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def cleanup(self):
+        """Drop finished jobs older than the retention period, including ones left on disk by earlier runs."""
+        if not os.path.isdir(self.job_dir):
+            return
+        cutoff = time.time() - self.retention_seconds
+        for job_id in os.listdir(self.job_dir):
+            job = self.jobs.get(job_id)
+            if job is None:
+                # Not ours (or from a previous run): judge by when its metadata last changed
+                meta_path = self.path(job_id, "job.json")
+                expired = os.path.getmtime(meta_path if os.path.exists(meta_path) else self.path(job_id)) < cutoff
+            else:
+                expired = job["status"] in FINISHED and (job["finished_at"] or 0) < cutoff
+            if expired:
+                with self.lock:
+                    self.jobs.pop(job_id, None)
+                    self.cancel_flags.pop(job_id, None)
+                    shutil.rmtree(self.path(job_id), ignore_errors=True)
@@ -0,0 +1,34 @@
+# llm_stub.py
+#
+# Offline stand-in for the OpenAI client, selected with LLM_BACKEND=stub.
+# It answers chat.completions.create() with canned SQL or commentary after a
+# configurable delay, so the app can be exercised without an API key.
+
+import os
+import time
+from types import SimpleNamespace
+
+# Simulated round trip (seconds) for each completion
+STUB_DELAY_SECONDS = float(os.getenv("STUB_LLM_DELAY", "1.0"))
+
+STUB_SQL = """```sql
+SELECT state, year, pm25_annual_mean
+FROM state_air_quality
+WHERE state IN ('California', 'New York') AND year BETWEEN 2018 AND 2022
+ORDER BY state, year;
+```"""
+
+STUB_COMMENTARY = "Stub commentary: the results were received and look plausible for a quick check."
+
+class StubCompletions:
+    def create(self, model=None, messages=None, temperature=None, **kwargs):
+        time.sleep(STUB_DELAY_SECONDS)
+        system = (messages or [{}])[0].get("content", "")
+        content = STUB_SQL if "SQL queries" in system else STUB_COMMENTARY
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class StubLLM:
+    """Matches the small part of the OpenAI client the app uses."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=StubCompletions())
@@ -1,11 +1,17 @@
 import pandas as pd
 import sqlite3
 import os
-
-conn = sqlite3.connect('copd_public_health.db')
-cursor = conn.cursor()
-
-data_dir = 'sample_data'
+import sys
+from approx import build_sample_tables
+from create_tables import create_tables
+from mortality_rates import parse_age
+from geo import parse_point
+from nhanes_labels import create_decoded_view, load_label_tables
+from snapshots import DATABASE_LINK, SnapshotInvalid, new_snapshot_path, prune_snapshots, publish_snapshot, remove_database_files, validate_snapshot
+from states import build_state_year_panel, load_state_dim, state_key
+
+# COPD_DATA_DIR points the loader at another input set (e.g. synthetic_data.py output)
+data_dir = os.getenv('COPD_DATA_DIR', 'sample_data')
 postfix = '' #'_sample'
 
 # Define expected columns - matching the simplified table schema
@@ -19,198 +25,331 @@ nhanes_columns = [
     "RIAGENDR",      # Gender
     "RIDAGEYR",      # Age at screening
     "RIDRETH1",      # Race/Hispanic origin
-    "HIQ011"         # Covered by health insurance
+    "HIQ011",        # Covered by health insurance
+    "WTINT2YR",      # Interview sample weight
+    "WTMEC2YR",      # MEC exam sample weight
+    "SDMVSTRA",      # Masked variance pseudo-stratum
+    "SDMVPSU"        # Masked variance pseudo-PSU
 ]
 
-# Load NHANES sample
-print("Loading NHANES data...")
-df_nhanes = pd.read_csv(os.path.join(data_dir, f'nhanes_2021-2023_copd{postfix}.csv'))
-
-# Keep only columns that exist and are in our schema
-available_columns = [col for col in nhanes_columns if col in df_nhanes.columns]
-print(f"Loading columns: {available_columns}")
-
-df_nhanes = df_nhanes[available_columns]  # Safe subset
-
-# Ensure year column exists (2022 for 2021-2023 cycle)
-if 'year' not in df_nhanes.columns:
-    df_nhanes['year'] = 2022
-
-print("NHANES data shape:", df_nhanes.shape)
-print("NHANES columns:", df_nhanes.columns.tolist())
-
-# Clear existing NHANES data
-print("Clearing existing NHANES data...")
-cursor.execute("DELETE FROM nhanes_survey")
-conn.commit()
-
-print("Inserting new NHANES data...")
-df_nhanes.to_sql('nhanes_survey', conn, if_exists='append', index=False)
-
-# Load WONDER data
-print("\nLoading WONDER mortality data...")
-df_wonder = pd.read_csv(os.path.join(data_dir, f'wonder_2018-2023{postfix}.csv'))
-
-# Map the real CSV columns to the DB column names
-df_wonder = df_wonder.rename(columns={
-    'State': 'state',
-    'Year': 'year',
-    'Sex Code': 'sex',
-    'Single-Year Ages': 'age',
-    'Single Race 6': 'race',
-    'ICD-10 113 Cause List': 'cause_of_death',
-    'Deaths': 'number_of_deaths'
-})
-
-# Aggregate deaths by all primary key columns
-print("Aggregating WONDER data...")
-df_wonder = df_wonder.groupby([
-    'state', 'year', 'sex', 'age', 'race', 'cause_of_death'
-])['number_of_deaths'].sum().reset_index()
-
-# Print unique values for key columns to verify data
-print("\nWONDER data verification:")
-print("Unique years:", sorted(df_wonder['year'].unique()))
-print("Unique states:", len(df_wonder['state'].unique()))
-print("Unique races:", df_wonder['race'].unique())
-
-# Calculate population (not available in raw data)
-# Group by state, year, sex, age, and race to get total deaths
-state_totals = df_wonder.groupby([
-    'state', 'year', 'sex', 'age', 'race'
-])['number_of_deaths'].sum().reset_index()
-
-# For this sample, we'll estimate population as deaths * 1000 (placeholder)
-state_totals['population'] = state_totals['number_of_deaths'] * 1000
-
-# Merge population back to main dataframe
-df_wonder = df_wonder.merge(
-    state_totals[['state', 'year', 'sex', 'age', 'race', 'population']], 
-    on=['state', 'year', 'sex', 'age', 'race']
-)
-
-# Keep only expected columns
-wonder_columns = [
-    'state', 'year', 'sex', 'age', 'race', 
-    'cause_of_death', 'number_of_deaths', 'population'
-]
-df_wonder = df_wonder[wonder_columns]
-
-print("\nWONDER data shape:", df_wonder.shape)
-print("WONDER data columns:", df_wonder.columns.tolist())
-print("Sample of WONDER data:")
-print(df_wonder.head())
-
-# Clear existing WONDER data
-print("\nClearing existing WONDER data...")
-cursor.execute("DELETE FROM wonder_mortality")
-conn.commit()
-
-print("Inserting new WONDER data...")
-df_wonder.to_sql('wonder_mortality', conn, if_exists='append', index=False)
-
-print("\nLoading PLACES health data...")
-df_places = pd.read_csv(os.path.join(data_dir, f'places_2022{postfix}.csv'), low_memory=False)
-
-# Print column names and sample data to debug
-print("\nPLACES raw data info:")
-print("Columns:", df_places.columns.tolist())
-print("Sample row:")
-print(df_places.iloc[0])
-
-# Drop any unnamed columns
-df_places = df_places.loc[:, ~df_places.columns.str.contains('^Unnamed')]
-
-# Create a filtered DataFrame for each measure we need
-print("\nUnique measures in PLACES data:")
-print(df_places['Measure'].unique())
-
-obesity = df_places[
-    (df_places['Category'] == 'Health Outcomes') & 
-    (df_places['Measure'] == 'Obesity among adults')
-].copy()
-
-smoking = df_places[
-    (df_places['Measure'] == 'Current cigarette smoking among adults')
-].copy()
-
-copd = df_places[
-    (df_places['Measure'] == 'Chronic obstructive pulmonary disease among adults')
-].copy()
-
-# Print counts for each measure to debug
-print("\nMeasure counts:")
-print("Obesity records:", len(obesity))
-print("Smoking records:", len(smoking))
-print("COPD records:", len(copd))
-
-# Create separate DataFrames for each measure
-obesity_df = pd.DataFrame({
-    'state': obesity['StateAbbr'],
-    'county_name': obesity['LocationName'],
-    'fips_code': obesity['LocationID'].astype(str),
-    'year': 2022,  # 2024 release uses 2022 BRFSS data
-    'obesity_prevalence': obesity['Data_Value']
-})
-
-smoking_df = pd.DataFrame({
-    'fips_code': smoking['LocationID'].astype(str),
-    'year': 2022,
-    'smoking_prevalence': smoking['Data_Value']
-})
-
-copd_df = pd.DataFrame({
-    'fips_code': copd['LocationID'].astype(str),
-    'year': 2022,
-    'copd_prevalence': copd['Data_Value']
-})
-
-# Merge all measures together
-places_processed = obesity_df.merge(
-    smoking_df[['fips_code', 'smoking_prevalence']], on='fips_code', how='left'
-).merge(
-    copd_df[['fips_code', 'copd_prevalence']], on='fips_code', how='left'
-)
-
-# Remove duplicates after merging
-places_processed = places_processed.drop_duplicates(subset=['fips_code', 'year'], keep='first')
-
-print("\nFinal PLACES data shape:", places_processed.shape)
-print("Sample of processed data:")
-print(places_processed.head())
-print("\nValue counts:")
-print("COPD values:", places_processed['copd_prevalence'].notna().sum())
-print("Smoking values:", places_processed['smoking_prevalence'].notna().sum())
-print("Obesity values:", places_processed['obesity_prevalence'].notna().sum())
-
-# Clear existing PLACES data
-print("Clearing existing PLACES data...")
-cursor.execute("DELETE FROM places_health")
-conn.commit()
-
-print("Inserting new PLACES data...")
-places_processed.to_sql('places_health', conn, if_exists='append', index=False)
-
-print("\nLoading EPA air quality data...")
-df_aqi = pd.read_csv(os.path.join(data_dir, f'epa_pm25_2010-2024{postfix}.csv'))
-
-# Drop any unnamed columns
-df_aqi = df_aqi.loc[:, ~df_aqi.columns.str.contains('^Unnamed')]
-
-# No aggregation needed
-print("EPA AQI data shape:", df_aqi.shape)
-print("EPA AQI columns:", df_aqi.columns.tolist())
-print("Sample of EPA AQI data:")
-print(df_aqi.head())
-
-# Clear existing air quality data
-print("Clearing existing air quality data...")
-cursor.execute("DELETE FROM state_air_quality")
-conn.commit()
-
-print("Inserting new air quality data...")
-df_aqi.to_sql('state_air_quality', conn, if_exists='append', index=False)
-
-conn.commit()
-conn.close()
-print("\nAll data loaded successfully!")
+def load_states(conn):
+    """Canonical state dimension; every state-level table stores its state_key."""
+    print("Loading state dimension...")
+    load_state_dim(conn)
+
+def load_nhanes(conn, data_dir=data_dir, postfix=postfix):
+    """NHANES respondents -> nhanes_survey."""
+    cursor = conn.cursor()
+
+    # Load NHANES sample
+    print("Loading NHANES data...")
+    df_nhanes = pd.read_csv(os.path.join(data_dir, f'nhanes_2021-2023_copd{postfix}.csv'))
+
+    # Keep only columns that exist and are in our schema
+    available_columns = [col for col in nhanes_columns if col in df_nhanes.columns]
+    print(f"Loading columns: {available_columns}")
+
+    df_nhanes = df_nhanes[available_columns]  # Safe subset
+
+    # Ensure year column exists (2022 for 2021-2023 cycle)
+    if 'year' not in df_nhanes.columns:
+        df_nhanes['year'] = 2022
+
+    print("NHANES data shape:", df_nhanes.shape)
+    print("NHANES columns:", df_nhanes.columns.tolist())
+
+    # Clear existing NHANES data
+    print("Clearing existing NHANES data...")
+    cursor.execute("DELETE FROM nhanes_survey")
+    conn.commit()
+
+    print("Inserting new NHANES data...")
+    df_nhanes.to_sql('nhanes_survey', conn, if_exists='append', index=False)
+    return len(df_nhanes)
+
+def load_wonder(conn, data_dir=data_dir, postfix=postfix):
+    """WONDER mortality export -> wonder_mortality."""
+    cursor = conn.cursor()
+
+    # Load WONDER data
+    print("\nLoading WONDER mortality data...")
+    df_wonder = pd.read_csv(os.path.join(data_dir, f'wonder_2018-2023{postfix}.csv'))
+
+    # Map the real CSV columns to the DB column names
+    df_wonder = df_wonder.rename(columns={
+        'State': 'state',
+        'Year': 'year',
+        'Sex Code': 'sex',
+        'Single-Year Ages': 'age',
+        'Single Race 6': 'race',
+        'ICD-10 113 Cause List': 'cause_of_death',
+        'Deaths': 'number_of_deaths'
+    })
+
+    # Aggregate deaths by all primary key columns
+    print("Aggregating WONDER data...")
+    has_population = 'Population' in df_wonder.columns
+    if has_population:
+        # WONDER reports the stratum population on every row; "Not Applicable" becomes NaN
+        df_wonder['population'] = pd.to_numeric(df_wonder['Population'], errors='coerce')
+    else:
+        df_wonder['population'] = float('nan')
+
+    df_wonder = df_wonder.groupby([
+        'state', 'year', 'sex', 'age', 'race', 'cause_of_death'
+    ]).agg(
+        number_of_deaths=('number_of_deaths', 'sum'),
+        population=('population', 'max')
+    ).reset_index()
+
+    # Print unique values for key columns to verify data
+    print("\nWONDER data verification:")
+    print("Unique years:", sorted(df_wonder['year'].unique()))
+    print("Unique states:", len(df_wonder['state'].unique()))
+    print("Unique races:", df_wonder['race'].unique())
+
+    if not has_population:
+        # Older exports without a Population column: estimate it as deaths * 1000 (placeholder)
+        state_totals = df_wonder.groupby([
+            'state', 'year', 'sex', 'age', 'race'
+        ])['number_of_deaths'].sum().reset_index()
+        state_totals['population'] = state_totals['number_of_deaths'] * 1000
+
+        df_wonder = df_wonder.drop(columns=['population']).merge(
+            state_totals[['state', 'year', 'sex', 'age', 'race', 'population']],
+            on=['state', 'year', 'sex', 'age', 'race']
+        )
+
+    # Parse single-year ages ("57 years", "< 1 year", "100+ years") once, at load time
+    age_lookup = {age: parse_age(age) for age in df_wonder['age'].unique()}
+    df_wonder['age_years'] = df_wonder['age'].map(age_lookup).astype('Int64')
+
+    # Keep only expected columns
+    df_wonder['state_key'] = df_wonder['state'].map(state_key)
+
+    wonder_columns = [
+        'state', 'state_key', 'year', 'sex', 'age', 'age_years', 'race',
+        'cause_of_death', 'number_of_deaths', 'population'
+    ]
+    df_wonder = df_wonder[wonder_columns]
+
+    print("\nWONDER data shape:", df_wonder.shape)
+    print("WONDER data columns:", df_wonder.columns.tolist())
+    print("Sample of WONDER data:")
+    print(df_wonder.head())
+
+    # Clear existing WONDER data
+    print("\nClearing existing WONDER data...")
+    cursor.execute("DELETE FROM wonder_mortality")
+    conn.commit()
+
+    print("Inserting new WONDER data...")
+    df_wonder.to_sql('wonder_mortality', conn, if_exists='append', index=False)
+    return len(df_wonder)
+
+def load_places(conn, data_dir=data_dir, postfix=postfix):
+    """Long-format PLACES -> one places_health row per county, plus the R-tree."""
+    cursor = conn.cursor()
+
+    print("\nLoading PLACES health data...")
+    df_places = pd.read_csv(os.path.join(data_dir, f'places_2022{postfix}.csv'), low_memory=False)
+
+    # Print column names and sample data to debug
+    print("\nPLACES raw data info:")
+    print("Columns:", df_places.columns.tolist())
+    print("Sample row:")
+    print(df_places.iloc[0])
+
+    # Drop any unnamed columns
+    df_places = df_places.loc[:, ~df_places.columns.str.contains('^Unnamed')]
+
+    # Create a filtered DataFrame for each measure we need
+    print("\nUnique measures in PLACES data:")
+    print(df_places['Measure'].unique())
+
+    obesity = df_places[
+        (df_places['Category'] == 'Health Outcomes') & 
+        (df_places['Measure'] == 'Obesity among adults')
+    ].copy()
+
+    smoking = df_places[
+        (df_places['Measure'] == 'Current cigarette smoking among adults')
+    ].copy()
+
+    copd = df_places[
+        (df_places['Measure'] == 'Chronic obstructive pulmonary disease among adults')
+    ].copy()
+
+    # Print counts for each measure to debug
+    print("\nMeasure counts:")
+    print("Obesity records:", len(obesity))
+    print("Smoking records:", len(smoking))
+    print("COPD records:", len(copd))
+
+    # Create separate DataFrames for each measure
+    obesity_df = pd.DataFrame({
+        'state': obesity['StateAbbr'],
+        'state_key': obesity['StateAbbr'].map(state_key),
+        'county_name': obesity['LocationName'],
+        'fips_code': obesity['LocationID'].astype(str),
+        'year': 2022,  # 2024 release uses 2022 BRFSS data
+        'population': obesity['TotalPopulation'],
+        'obesity_prevalence': obesity['Data_Value']
+    })
+
+    # County centroids, "POINT (lon lat)" parsed once here
+    if 'Geolocation' in obesity.columns:
+        points = obesity['Geolocation'].map(parse_point)
+        obesity_df['longitude'] = points.str[0]
+        obesity_df['latitude'] = points.str[1]
+
+    smoking_df = pd.DataFrame({
+        'fips_code': smoking['LocationID'].astype(str),
+        'year': 2022,
+        'smoking_prevalence': smoking['Data_Value']
+    })
+
+    copd_df = pd.DataFrame({
+        'fips_code': copd['LocationID'].astype(str),
+        'year': 2022,
+        'copd_prevalence': copd['Data_Value']
+    })
+
+    # Merge all measures together
+    places_processed = obesity_df.merge(
+        smoking_df[['fips_code', 'smoking_prevalence']], on='fips_code', how='left'
+    ).merge(
+        copd_df[['fips_code', 'copd_prevalence']], on='fips_code', how='left'
+    )
+
+    # Remove duplicates after merging
+    places_processed = places_processed.drop_duplicates(subset=['fips_code', 'year'], keep='first')
+
+    print("\nFinal PLACES data shape:", places_processed.shape)
+    print("Sample of processed data:")
+    print(places_processed.head())
+    print("\nValue counts:")
+    print("COPD values:", places_processed['copd_prevalence'].notna().sum())
+    print("Smoking values:", places_processed['smoking_prevalence'].notna().sum())
+    print("Obesity values:", places_processed['obesity_prevalence'].notna().sum())
+
+    # Clear existing PLACES data
+    print("Clearing existing PLACES data...")
+    cursor.execute("DELETE FROM places_health")
+    conn.commit()
+
+    print("Inserting new PLACES data...")
+    places_processed.to_sql('places_health', conn, if_exists='append', index=False)
+
+    print("Indexing PLACES centroids...")
+    cursor.execute("DELETE FROM places_rtree")
+    cursor.execute("""
+        INSERT INTO places_rtree (id, min_lon, max_lon, min_lat, max_lat)
+        SELECT rowid, longitude, longitude, latitude, latitude
+        FROM places_health
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL
+    """)
+    conn.commit()
+    return len(places_processed)
+
+def load_air_quality(conn, data_dir=data_dir, postfix=postfix):
+    """EPA state-year PM2.5 -> state_air_quality."""
+    cursor = conn.cursor()
+
+    print("\nLoading EPA air quality data...")
+    df_aqi = pd.read_csv(os.path.join(data_dir, f'epa_pm25_2010-2024{postfix}.csv'))
+
+    # Drop any unnamed columns
+    df_aqi = df_aqi.loc[:, ~df_aqi.columns.str.contains('^Unnamed')]
+
+    # No aggregation needed
+    df_aqi['state_key'] = df_aqi['state'].map(state_key)
+    print("EPA AQI data shape:", df_aqi.shape)
+    print("EPA AQI columns:", df_aqi.columns.tolist())
+    print("Sample of EPA AQI data:")
+    print(df_aqi.head())
+
+    # Clear existing air quality data
+    print("Clearing existing air quality data...")
+    cursor.execute("DELETE FROM state_air_quality")
+    conn.commit()
+
+    print("Inserting new air quality data...")
+    df_aqi.to_sql('state_air_quality', conn, if_exists='append', index=False)
+    return len(df_aqi)
+
+def load_labels(conn, data_dir=data_dir):
+    """NHANES label dictionary, FTS index and decoded view."""
+    print("\nLoading NHANES label dictionary...")
+    num_variables = load_label_tables(conn, data_dir)
+    print(f"Indexed {num_variables} NHANES variables")
+
+    num_decoded = create_decoded_view(conn)
+    print(f"Created nhanes_survey_decoded view with {num_decoded} label columns")
+    return num_variables
+
+def build_panel(conn):
+    """Precomputed state x year panel."""
+    print("\nBuilding state x year panel...")
+    num_panel_rows = build_state_year_panel(conn)
+    print(f"State x year panel rows: {num_panel_rows}")
+    return num_panel_rows
+
+def build_samples(conn):
+    """Stratified samples for approximate queries."""
+    print("\nBuilding stratified samples for approximate queries...")
+    for table, sample_rows in build_sample_tables(conn).items():
+        print(f"{table}: {sample_rows} sample rows")
+
+def load_stages(data_dir=data_dir, postfix=postfix):
+    """(name, stage) pairs in load order; each stage takes a connection, so callers can time them one by one."""
+    return [
+        ("state_dim", load_states),
+        ("nhanes", lambda conn: load_nhanes(conn, data_dir, postfix)),
+        ("wonder", lambda conn: load_wonder(conn, data_dir, postfix)),
+        ("places", lambda conn: load_places(conn, data_dir, postfix)),
+        ("air_quality", lambda conn: load_air_quality(conn, data_dir, postfix)),
+        ("labels", lambda conn: load_labels(conn, data_dir)),
+        ("panel", build_panel),
+        ("samples", build_samples),
+    ]
+
+def load_into(database, data_dir=data_dir, postfix=postfix):
+    """Run every stage against database in place (its tables must already exist)."""
+    conn = sqlite3.connect(database)
+    for _, stage in load_stages(data_dir, postfix):
+        stage(conn)
+    conn.commit()
+    conn.close()
+
+def main(database=DATABASE_LINK, data_dir=data_dir, postfix=postfix):
+    """
+    Build a new snapshot file from scratch, validate it, then atomically switch
+    database over to it; the server keeps answering from the old snapshot
+    until the switch and never sees a partially loaded table.
+    """
+    path = new_snapshot_path()
+    building = path + ".building"
+    try:
+        conn = sqlite3.connect(building)
+        create_tables(conn)
+        conn.close()
+        load_into(building, data_dir, postfix)
+        counts = validate_snapshot(building, database)
+        os.replace(building, path)
+    except Exception:
+        remove_database_files(building)
+        raise
+
+    publish_snapshot(path, database)
+    for name in prune_snapshots(database):
+        print(f"Removed retired snapshot {name}")
+    print("\nAll data loaded successfully!")
+    print(f"Published {path}: " + ", ".join(f"{table} {count}" for table, count in counts.items()))
+
+if __name__ == '__main__':
+    try:
+        main()
+    except SnapshotInvalid as e:
+        print(f"Snapshot not published: {e}")
+        sys.exit(1)
@@ -1,8 +1,41 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import asyncio
+import math
+import os
 import sqlite3
+import threading
+import time
 
-app = FastAPI()
+import numpy as np
+
+from analytics import METRICS, StateYearArrays
+from approx import SAMPLE_PREFIX, DEFAULT_MAX_RELATIVE_ERROR, ApproximationUnavailable, approximate_query
+from db_pool import DEFAULT_MMAP_SIZE, ReadPool
+from jobs import JobManager
+from metrics import MetricsMiddleware, Registry
+from query_log import QueryRecorder
+from query_profile import PROFILE_STEP_INTERVAL, explain_plan, summarize_plan
+from query_stats import DEFAULT_SLOW_QUERY_MS, ORDER_KEYS, QueryStats, statement_key
+from response_encoding import LAYOUTS, dumps, encode_response, to_columns
+from snapshots import prune_snapshots
+from geo import PLACES_COLUMNS, query_bbox, query_nearest
+from mortality_rates import MortalityData
+from nhanes_labels import search_labels
+from survey_stats import estimate_by_group
+
+@asynccontextmanager
+async def lifespan(app):
+    # Caches warm in the background; /ready reports 503 until warm_up() finishes
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    yield
+    shut_down()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS (important for LLMs and Streamlit)
 app.add_middleware(
@@ -15,12 +48,57 @@ app.add_middleware(
 
 DATABASE = 'copd_public_health.db'
 
+# Pooled read-only connections for endpoints that only read. DATABASE is
+# normally a symlink to the live snapshot; when load_data.py publishes a new
+# one the pool reopens against it, long-retired snapshots are removed and the
+# caches are re-warmed (see on_snapshot_switch).
+# Snapshots are opened immutable and memory-mapped, so several worker
+# processes can share one file without locking (MCP_IMMUTABLE=0 to disable).
+read_pool = ReadPool(
+    DATABASE,
+    immutable=os.getenv("MCP_IMMUTABLE", "1") == "1",
+    mmap_size=int(os.getenv("MCP_MMAP_BYTES", DEFAULT_MMAP_SIZE))
+)
+
+# Per-fingerprint statistics for every executed statement; slow ones are logged
+query_stats = QueryStats(
+    slow_query_ms=float(os.getenv("SLOW_QUERY_MS", DEFAULT_SLOW_QUERY_MS)),
+    slow_log_path=os.getenv("SLOW_QUERY_LOG", "slow_queries.log")
+)
+
+# Long-running queries submitted through /v1/jobs; results spill to Parquet
+jobs = JobManager(read_pool.open, observe=query_stats.record)
+
+# Set QUERY_LOG to a file to record /v1/query and /v1/query/batch traffic for replay
+query_log = QueryRecorder(os.getenv("QUERY_LOG"))
+
+# Runtime telemetry served at /metrics (Prometheus text format)
+registry = Registry()
+HTTP_REQUESTS = registry.counter("mcp_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+HTTP_LATENCY = registry.histogram("mcp_http_request_duration_seconds", "HTTP request latency by route", ("route", "method"))
+HTTP_RESPONSE_BYTES = registry.counter("mcp_http_response_bytes_total", "Response body bytes by route", ("route",))
+HTTP_IN_FLIGHT = registry.gauge("mcp_http_requests_in_flight", "HTTP requests being handled")
+QUERY_PHASES = registry.histogram("mcp_query_phase_seconds", "SQL time split into execute, fetch, serialize and compress", ("phase",))
+QUERY_ROWS = registry.counter("mcp_query_rows_total", "Rows returned by SQL endpoints", ("route",))
+QUERIES_ACTIVE = registry.gauge("mcp_queries_active", "SQL statements executing")
+QUERIES_QUEUED = registry.gauge("mcp_queries_queued", "Batch statements waiting for a worker thread")
+
+app.add_middleware(
+    MetricsMiddleware,
+    requests=HTTP_REQUESTS, latency=HTTP_LATENCY, response_bytes=HTTP_RESPONSE_BYTES, in_flight=HTTP_IN_FLIGHT
+)
+
 # Define granularity and units manually for known tables/columns
 TABLE_GRANULARITY = {
     "state_air_quality": "state-level",
     "places_health": "county-level",
     "nhanes_survey": "individual-level",
-    "wonder_mortality": "state-level"
+    "nhanes_survey_decoded": "individual-level",
+    "wonder_mortality": "state-level",
+    "state_year_panel": "state-level",
+    "state_dim": "dimension",
+    "nhanes_variables": "dictionary",
+    "nhanes_value_labels": "dictionary"
 }
 
 COLUMN_UNITS = {
@@ -40,6 +118,17 @@ COLUMN_UNITS = {
         "number_of_deaths": "Count",
         "population": "Count",
         "year": "Year"
+    },
+    "state_year_panel": {
+        "pm25_annual_mean": "µg/m³",
+        "copd_prevalence": "%",
+        "smoking_prevalence": "%",
+        "obesity_prevalence": "%",
+        "deaths": "Count",
+        "population": "Count",
+        "crude_death_rate": "per 100,000",
+        "age_adjusted_death_rate": "per 100,000",
+        "year": "Year"
     }
 }
 
@@ -90,53 +179,853 @@ def get_column_metadata(cursor, table_name):
 
     return columns_metadata
 
-@app.post("/v1/context")
-async def context():
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-
-    # Get all table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+def list_data_tables(cursor):
+    """
+    Names of queryable tables and views, leaving out virtual tables (FTS, R-tree),
+    their shadow tables and the approximate-query samples.
+    """
+    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'view');")
     tables = cursor.fetchall()
 
+    virtual = [name for name, sql in tables if sql and sql.upper().startswith("CREATE VIRTUAL TABLE")]
+    return [
+        name for name, _ in tables
+        if name not in virtual
+        and not name.startswith("sqlite_")
+        and not name.startswith(SAMPLE_PREFIX)
+        and not any(name.startswith(f"{v}_") for v in virtual)
+    ]
+
+def get_data_version():
+    """
+    Token identifying the current database contents; changes whenever the file is
+    rewritten or a new snapshot is published. It describes the file pooled
+    connections read (the pool is brought up to date first), so a cache is never
+    filled from the old snapshot under the new snapshot's version.
+    """
+    read_pool.check_snapshot(force=True)
+    stat = os.stat(read_pool.target)
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+# Schema context is expensive to build (a scan per column), so it is kept per data version
+_context_cache = {"version": None, "context": None, "hits": 0, "misses": 0, "lock": threading.Lock()}
+
+def build_context():
     context = {"tables": []}
 
-    for (table_name,) in tables:
-        columns = get_column_metadata(cursor, table_name)
+    with read_pool.connection() as conn:
+        cursor = conn.cursor()
+        for table_name in list_data_tables(cursor):
+            columns = get_column_metadata(cursor, table_name)
 
-        table_meta = {
-            "name": table_name,
-            "description": f"Table {table_name} in the COPD public health database.",
-            "granularity": TABLE_GRANULARITY.get(table_name, "unknown"),
-            "columns": columns
-        }
+            table_meta = {
+                "name": table_name,
+                "description": f"Table {table_name} in the COPD public health database.",
+                "granularity": TABLE_GRANULARITY.get(table_name, "unknown"),
+                "columns": columns
+            }
 
-        context["tables"].append(table_meta)
+            context["tables"].append(table_meta)
 
-    conn.close()
     return context
 
+def get_cached_context():
+    """Return (version, context), rebuilding the context only when the data version changes."""
+    version = get_data_version()
+    if _context_cache["version"] == version:
+        _context_cache["hits"] += 1
+        return version, _context_cache["context"]
+    # One thread rebuilds; concurrent requests for the same version wait for it
+    with _context_cache["lock"]:
+        if _context_cache["version"] != version:
+            _context_cache["context"] = build_context()
+            _context_cache["version"] = version
+            _context_cache["misses"] += 1
+        else:
+            _context_cache["hits"] += 1
+        return version, _context_cache["context"]
+
+# Handlers that read SQLite or crunch arrays are plain defs, so FastAPI runs them
+# in its threadpool and a cold cache build or a wait for a pooled connection
+# never stalls the event loop
+
+@app.get("/v1/context")
+@app.post("/v1/context")
+def context(request: Request):
+    version, context = get_cached_context()
+    etag = f'"{version}"'
+
+    # Conditional request: clients holding the current version get an empty 304
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    return JSONResponse({**context, "version": version}, headers={"ETag": etag})
+
+# How often (in SQLite VM instructions) a query's time budget is checked
+TIMEOUT_CHECK_INTERVAL = 10000
+
 @app.post("/v1/query")
-async def query(body: dict):
+async def query(body: dict, request: Request):
+    """
+    Run one SQL statement. An optional "timeout_ms" caps execution time; a query
+    that runs over it is interrupted and reported with "timed_out": true so the
+    client can resubmit it through /v1/jobs.
+
+    With "approximate": true, COUNT/SUM/AVG queries over a sampled table are
+    answered from its stratified sample, with 95% "margins" per value. If the
+    query can't be approximated within "max_relative_error" (default 0.05) it
+    runs exactly and the response says why in "fallback_reason".
+
+    With "profile": true, an exact run also returns "profile": the EXPLAIN
+    QUERY PLAN tree, sampled VM steps, the number of full scans and temp
+    B-trees in the plan, and times in ms:
+      prepare_ms    compiling the statement, timed on a separate EXPLAIN run
+      first_row_ms  cursor.execute(): compile plus VM steps up to the first row
+      execute_ms    execute() plus fetchall(): every VM step and row conversion
+      serialize_ms  JSON-encoding the response
+
+    "layout": "columns" returns "data" (one list per column) instead of "rows".
+    Large responses are gzip- or zstd-compressed per Accept-Encoding.
+    """
+    layout = body.get("layout", "rows")
+    if layout not in LAYOUTS:
+        return {"error": f"layout must be one of {', '.join(LAYOUTS)}"}
+
+    started = time.time()
+    result = await run_in_threadpool(execute_query, body)
+    query_log.record("/v1/query", body, started, result)
+    QUERY_ROWS.inc("/v1/query", amount=len(result.get("rows", [])))
+    if layout == "columns":
+        result = to_columns(result)
+
+    if "profile" in result:
+        # Time one dump, then dump again so the response can include it
+        start = time.perf_counter()
+        dumps(result)
+        result["profile"]["serialize_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return serialize(result, request)
+
+def serialize(result, request):
+    """JSON-encode a result dict directly (no jsonable_encoder pass) and compress it if worthwhile."""
+    with QUERY_PHASES.time("serialize"):
+        body = dumps(result)
+    with QUERY_PHASES.time("compress"):
+        return encode_response(body, request.headers.get("accept-encoding"))
+
+def execute_query(body):
+    timed_out = False
     try:
         query_text = body.get("query")
         if not query_text:
             return {"error": "No query provided"}
         
-        conn = sqlite3.connect(DATABASE)
+        conn = read_pool.acquire()
         cursor = conn.cursor()
 
-        cursor.execute(query_text)
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description] if cursor.description else []
+        # One progress handler serves both the time budget and VM step sampling
+        profile = bool(body.get("profile"))
+        timeout_ms = body.get("timeout_ms")
+        deadline = time.monotonic() + float(timeout_ms) / 1000 if timeout_ms else None
+        interval = PROFILE_STEP_INTERVAL if profile else TIMEOUT_CHECK_INTERVAL
+        vm_steps = 0
 
-        conn.close()
+        def progress():
+            nonlocal timed_out, vm_steps
+            vm_steps += interval
+            if deadline is not None:
+                timed_out = time.monotonic() > deadline
+            return 1 if timed_out else 0
 
-        return {
+        if deadline is not None or profile:
+            conn.set_progress_handler(progress, interval)
+
+        try:
+            fallback_reason = None
+            if body.get("approximate"):
+                max_error = float(body.get("max_relative_error", DEFAULT_MAX_RELATIVE_ERROR))
+                try:
+                    result = approximate_query(cursor, query_text, max_error)
+                    return {**result, "approximate": True, "confidence": 0.95}
+                except ApproximationUnavailable as e:
+                    fallback_reason = str(e)
+
+            if profile:
+                plan, prepare_seconds = explain_plan(cursor, query_text)
+                vm_steps = 0
+
+            QUERIES_ACTIVE.inc()
+            start = time.perf_counter()
+            try:
+                cursor.execute(query_text)
+                first_row_seconds = time.perf_counter() - start
+                rows = cursor.fetchall()
+                execute_seconds = time.perf_counter() - start
+            except sqlite3.Error as e:
+                query_stats.record(query_text, time.perf_counter() - start, error=str(e))
+                raise
+            finally:
+                QUERIES_ACTIVE.dec()
+            QUERY_PHASES.observe(first_row_seconds, "execute")
+            QUERY_PHASES.observe(execute_seconds - first_row_seconds, "fetch")
+            columns = [description[0] for description in cursor.description] if cursor.description else []
+            # EXPLAIN gets its own cursor: running it on cursor would replace the result's description
+            query_stats.record(
+                query_text, execute_seconds, len(rows),
+                explain=lambda: explain_plan(conn.cursor(), query_text)[0], plan=plan if profile else None
+            )
+        finally:
+            cursor.close()
+            conn.set_progress_handler(None, 0)
+            read_pool.release(conn)
+
+        result = {
             "columns": columns,
             "rows": rows
         }
+        if fallback_reason:
+            result.update(approximate=False, fallback_reason=fallback_reason)
+        if profile:
+            result["profile"] = {
+                "plan": plan,
+                **summarize_plan(plan),
+                "prepare_ms": round(prepare_seconds * 1000, 3),
+                # sqlite3 steps the VM lazily while fetching, so execute and fetch aren't separable
+                "first_row_ms": round(first_row_seconds * 1000, 3),
+                "execute_ms": round(execute_seconds * 1000, 3),
+                "vm_steps": vm_steps,
+                "vm_step_resolution": interval,
+            }
+        return result
+    except sqlite3.Error as e:
+        if timed_out:
+            return {"error": f"Query exceeded {body.get('timeout_ms')} ms; submit it to /v1/jobs", "timed_out": True}
+        return {"error": f"Database error: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Server error: {str(e)}"}
+
+
+# Most statements accepted in one /v1/query/batch request
+MAX_BATCH_QUERIES = 50
+
+def execute_read(sql):
+    """Run one statement on a pooled read-only connection; returns a result or error dict."""
+    try:
+        with read_pool.connection() as conn:
+            cursor = conn.cursor()
+            QUERIES_ACTIVE.inc()
+            start = time.perf_counter()
+            try:
+                with QUERY_PHASES.time("execute"):
+                    cursor.execute(sql)
+                with QUERY_PHASES.time("fetch"):
+                    rows = cursor.fetchall()
+                columns = [description[0] for description in cursor.description] if cursor.description else []
+                query_stats.record(
+                    sql, time.perf_counter() - start, len(rows), explain=lambda: explain_plan(conn.cursor(), sql)[0]
+                )
+            except sqlite3.Error as e:
+                query_stats.record(sql, time.perf_counter() - start, error=str(e))
+                raise
+            finally:
+                QUERIES_ACTIVE.dec()
+                cursor.close()
+        return {"columns": columns, "rows": rows}
     except sqlite3.Error as e:
         return {"error": f"Database error: {str(e)}"}
     except Exception as e:
         return {"error": f"Server error: {str(e)}"}
+
+@app.post("/v1/query/batch")
+async def query_batch(body: dict, request: Request):
+    """
+    Run several named read-only queries in one round trip.
+
+    {"queries": [{"name": "row_counts", "query": "SELECT ..."}, ...]}
+    or {"queries": {"row_counts": "SELECT ...", ...}}
+
+    Identical statements run once; distinct ones run in parallel on pooled
+    connections. Each result carries its own columns/rows or error.
+    "layout": "columns" applies to every result, as in /v1/query.
+    """
+    layout = body.get("layout", "rows")
+    if layout not in LAYOUTS:
+        return {"error": f"layout must be one of {', '.join(LAYOUTS)}"}
+
+    started = time.time()
+    result = await execute_batch(body)
+    query_log.record("/v1/query/batch", body, started, result)
+    QUERY_ROWS.inc("/v1/query/batch", amount=sum(len(r.get("rows", [])) for r in result.get("results", [])))
+    if layout == "columns" and "results" in result:
+        result["results"] = [to_columns(item) for item in result["results"]]
+    return serialize(result, request)
+
+async def execute_batch(body):
+    queries = body.get("queries")
+    if isinstance(queries, dict):
+        queries = [{"name": name, "query": sql} for name, sql in queries.items()]
+    if not isinstance(queries, list) or not queries:
+        return {"error": "No queries provided"}
+    if len(queries) > MAX_BATCH_QUERIES:
+        return {"error": f"Too many queries ({len(queries)}); the limit is {MAX_BATCH_QUERIES}"}
+
+    # Duplicates are spotted on a normalized key, but the first original text is what runs
+    names, keys, originals = [], [], {}
+    for i, item in enumerate(queries):
+        if isinstance(item, str):
+            item = {"query": item}
+        names.append(str(item.get("name", i)) if isinstance(item, dict) else str(i))
+        sql = item.get("query") if isinstance(item, dict) else None
+        key = statement_key(sql) if isinstance(sql, str) else ""
+        keys.append(key)
+        if key:
+            originals.setdefault(key, sql)
+
+    unique = list(originals)
+
+    def execute_queued(sql):
+        QUERIES_QUEUED.dec()
+        return execute_read(sql)
+
+    QUERIES_QUEUED.inc(amount=len(unique))
+    outcomes = await asyncio.gather(*(run_in_threadpool(execute_queued, originals[key]) for key in unique))
+    by_key = dict(zip(unique, outcomes))
+
+    results = [
+        {"name": name, **(by_key[key] if key else {"error": "No query provided"})}
+        for name, key in zip(names, keys)
+    ]
+    return {
+        "results": results,
+        "executed": len(unique)
+    }
+
+
+@app.get("/v1/stats/queries")
+async def query_statistics(limit: int = 20, order_by: str = "total_ms"):
+    """
+    Heaviest query shapes since the server started. Statements are grouped by
+    fingerprint (literals replaced by ?), each with count, errors, total/mean/
+    p95/max time in ms, rows returned, an example and its last plan.
+    """
+    if order_by not in ORDER_KEYS:
+        return {"error": f"order_by must be one of {', '.join(ORDER_KEYS)}"}
+    return {
+        "queries": query_stats.top(max(1, min(limit, 500)), order_by),
+        "fingerprints": len(query_stats.entries),
+        "slow_query_ms": query_stats.slow_query_ms,
+    }
+
+
+@app.post("/v1/jobs")
+async def submit_job(body: dict):
+    """Start a background query; poll GET /v1/jobs/{job_id} and page through /results."""
+    query_text = body.get("query")
+    if not query_text:
+        return {"error": "No query provided"}
+    try:
+        return jobs.submit(query_text)
+    except OSError as e:
+        return {"error": f"Server error: {str(e)}"}
+
+@app.get("/v1/jobs/{job_id}")
+async def job_status(job_id: str):
+    status = jobs.status(job_id)
+    if status is None:
+        return JSONResponse({"error": f"Unknown job {job_id}"}, status_code=404)
+    return status
+
+@app.get("/v1/jobs/{job_id}/results")
+def job_results(job_id: str, request: Request, offset: int = 0, limit: int = 1000):
+    # Plain def: reading the Parquet parts and encoding a large page both run in the threadpool
+    try:
+        page = jobs.results(job_id, max(offset, 0), min(max(limit, 1), 50000))
+    except OSError as e:
+        return {"error": f"Results unavailable: {str(e)}"}
+    if page is None:
+        return JSONResponse({"error": f"Unknown job {job_id}"}, status_code=404)
+    return serialize(page, request)
+
+@app.delete("/v1/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    jobs.cancel(job_id)
+    return {"job_id": job_id, "status": "cancelled"}
+
+
+@app.get("/v1/search")
+def search(q: str, limit: int = 10):
+    """Rank NHANES variables (with their code tables) for a keyword query."""
+    try:
+        conn = read_pool.open()
+        try:
+            results = search_labels(conn.cursor(), q, limit=min(max(limit, 1), 100))
+        finally:
+            conn.close()
+
+        return {
+            "query": q,
+            "results": results
+        }
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+
+# NHANES complex survey design
+NHANES_WEIGHTS = ("WTINT2YR", "WTMEC2YR")
+NHANES_STRATA = "SDMVSTRA"
+NHANES_PSU = "SDMVPSU"
+
+# Column arrays of nhanes_survey, loaded once per data version
+_survey_columns = {"version": None, "names": set(), "arrays": {}}
+_survey_columns_lock = threading.Lock()
+
+def get_survey_columns(version, names):
+    """Return {name: float array} for nhanes_survey columns, reading only the ones not cached yet."""
+    with _survey_columns_lock:
+        return load_survey_columns(version, names)
+
+def load_survey_columns(version, names):
+    if _survey_columns["version"] != version:
+        with read_pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("PRAGMA table_info(nhanes_survey);")
+            _survey_columns.update(
+                version=version,
+                names={row[1].upper(): row[1] for row in cursor.fetchall()},
+                arrays={}
+            )
+
+    missing = [name for name in names if name.upper() not in _survey_columns["arrays"]]
+    unknown = [name for name in missing if name.upper() not in _survey_columns["names"]]
+    if unknown:
+        raise ValueError(f"Unknown nhanes_survey column(s): {', '.join(unknown)}")
+
+    if missing:
+        with read_pool.connection() as conn:
+            cursor = conn.cursor()
+            select = ", ".join(_survey_columns["names"][name.upper()] for name in missing)
+            cursor.execute(f"SELECT {select} FROM nhanes_survey ORDER BY rowid;")
+            data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, len(missing))
+        for i, name in enumerate(missing):
+            _survey_columns["arrays"][name.upper()] = data[:, i]
+
+    return {name: _survey_columns["arrays"][name.upper()] for name in names}
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def number_codes(name, value):
+    """Sorted tuple of the numeric code(s) in value; ValueError for anything else (strings, nested lists)."""
+    values = value if isinstance(value, list) else [value]
+    if not values or not all(is_number(v) for v in values):
+        raise ValueError(f"{name} must be a number or a list of numbers")
+    return tuple(sorted(values))
+
+def normalize_filters(filters):
+    """Canonical, hashable form of {"COL": [codes]} / {"COL": {"min": x, "max": y}} filters."""
+    if not isinstance(filters or {}, dict):
+        raise ValueError("filters must be an object of column: codes or {min, max}")
+    normalized = []
+    for column, condition in sorted((filters or {}).items()):
+        if isinstance(condition, dict):
+            low, high = condition.get("min"), condition.get("max")
+            if any(bound is not None and not is_number(bound) for bound in (low, high)):
+                raise ValueError(f"filters.{column} min/max must be numbers")
+            normalized.append((column, "range", low, high))
+        else:
+            normalized.append((column, "in", number_codes(f"filters.{column}", condition)))
+    return tuple(normalized)
+
+def to_json_number(value):
+    value = float(value)
+    if math.isnan(value):
+        return None
+    return int(value) if value.is_integer() else value
+
+@lru_cache(maxsize=512)
+def cached_survey_estimate(version, variable, by, statistic, weight, positive, valid, filters):
+    """Weighted estimate for one (variable, grouping, filters) combination; cached per data version."""
+    filter_columns = [f[0] for f in filters]
+    names = list(dict.fromkeys([variable, weight, NHANES_STRATA, NHANES_PSU, *by, *filter_columns]))
+    arrays = get_survey_columns(version, names)
+
+    # Subpopulation filters restrict the domain but keep the full design for variances
+    domain = None
+    for column, op, *args in filters:
+        values = arrays[column]
+        if op == "in":
+            mask = np.isin(values, args[0])
+        else:
+            low, high = args
+            mask = np.ones(len(values), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        domain = mask if domain is None else domain & mask
+
+    keys, result = estimate_by_group(
+        arrays[variable], arrays[weight], arrays[NHANES_STRATA], arrays[NHANES_PSU],
+        by=[arrays[column] for column in by], statistic=statistic,
+        positive=positive, valid=valid, domain=domain
+    )
+
+    fields = ["estimate", "se", "ci_low", "ci_high", "n", "weighted_n"]
+    rows = [
+        [to_json_number(k) for k in key] + [to_json_number(result[field][g]) for field in fields]
+        for g, key in enumerate(keys)
+        if result["n"][g] > 0
+    ]
+    return {
+        "variable": variable,
+        "statistic": statistic,
+        "weight": weight,
+        "columns": list(by) + fields,
+        "rows": rows
+    }
+
+@app.post("/v1/nhanes/estimate")
+def nhanes_estimate(body: dict):
+    """
+    Survey-weighted prevalence (%) or mean of an NHANES variable by group, with
+    Taylor-linearized standard errors and 95% confidence intervals.
+
+    Body: {"variable": "MCQ160P", "by": ["RIAGENDR"], "statistic": "prevalence",
+           "positive": [1], "valid": [1, 2], "weight": "WTINT2YR",
+           "filters": {"SMQ020": [1], "RIDAGEYR": {"min": 40}}}
+    """
+    try:
+        variable = body.get("variable")
+        if not variable:
+            return {"error": "No variable provided"}
+        if not isinstance(variable, str):
+            return {"error": "variable must be a column name"}
+
+        statistic = body.get("statistic", "prevalence")
+        if statistic not in ("prevalence", "mean"):
+            return {"error": "statistic must be 'prevalence' or 'mean'"}
+
+        weight = body.get("weight", NHANES_WEIGHTS[0])
+        if weight not in NHANES_WEIGHTS:
+            return {"error": f"weight must be one of {list(NHANES_WEIGHTS)}"}
+
+        by = body.get("by") or []
+        if not isinstance(by, list) or not all(isinstance(column, str) for column in by):
+            return {"error": "by must be a list of column names"}
+        by = tuple(by)
+        positive = number_codes("positive", body.get("positive") or [1])
+        valid = number_codes("valid", body.get("valid") or [1, 2])
+        filters = normalize_filters(body.get("filters"))
+
+        return cached_survey_estimate(
+            get_data_version(), variable, by, statistic, weight, positive, valid, filters
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+
+# Encoded WONDER rows, rebuilt once per data version
+_mortality_data = {"version": None, "data": None, "lock": threading.Lock()}
+
+def get_mortality_data(version):
+    if _mortality_data["version"] == version:
+        return _mortality_data["data"]
+    with _mortality_data["lock"]:
+        if _mortality_data["version"] != version:
+            with read_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT state, year, sex, race, age_years, cause_of_death, number_of_deaths, population
+                    FROM wonder_mortality
+                    WHERE age_years IS NOT NULL;
+                """)
+                _mortality_data["data"] = MortalityData(cursor.fetchall())
+            _mortality_data["version"] = version
+        return _mortality_data["data"]
+
+@lru_cache(maxsize=512)
+def cached_mortality_rates(version, group_by, cause, filters, min_age, max_age):
+    data = get_mortality_data(version)
+    columns, rows = data.rates(
+        group_by=group_by, cause=cause,
+        filters={name: values for name, values in filters},
+        min_age=min_age, max_age=max_age
+    )
+    return {
+        "standard_population": "US 2000 (11 age groups)",
+        "rate_per": 100000,
+        "columns": columns,
+        "rows": rows
+    }
+
+@app.post("/v1/mortality/rates")
+def mortality_rates(body: dict):
+    """
+    Crude and age-adjusted death rates per 100,000 (US 2000 standard) with 95% CIs.
+
+    Body: {"group_by": ["state", "year", "cause_of_death"], "cause": "<cause_of_death>",
+           "filters": {"state": ["Alabama"], "sex": ["F"]}, "min_age": 40, "max_age": null}
+    """
+    for bound in ("min_age", "max_age"):
+        value = body.get(bound)
+        if value is not None and not is_number(value):
+            return {"error": f"{bound} must be a number"}
+    try:
+        group_by = tuple(body.get("group_by") or ())
+        filters = tuple(
+            (name, tuple(sorted(map(str, values if isinstance(values, list) else [values]))))
+            for name, values in sorted((body.get("filters") or {}).items())
+        )
+        return cached_mortality_rates(
+            get_data_version(), group_by, body.get("cause"), filters,
+            body.get("min_age"), body.get("max_age")
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+
+@app.post("/v1/places/nearby")
+def places_nearby(body: dict):
+    """
+    PLACES counties by location, answered from the R-tree index.
+
+    Bounding box: {"bbox": [min_lon, min_lat, max_lon, max_lat], "year": 2022, "limit": 500}
+    K nearest:    {"lon": -85.86, "lat": 33.27, "k": 10, "year": 2022}
+    """
+    try:
+        year = body.get("year")
+        if not body.get("bbox") and (body.get("lon") is None or body.get("lat") is None):
+            return {"error": "Provide either bbox or lon/lat"}
+
+        conn = read_pool.open()
+        try:
+            cursor = conn.cursor()
+            if body.get("bbox"):
+                min_lon, min_lat, max_lon, max_lat = map(float, body["bbox"])
+                rows = query_bbox(cursor, min_lon, min_lat, max_lon, max_lat, year=year, limit=body.get("limit"))
+                columns = PLACES_COLUMNS
+            else:
+                k = min(max(int(body.get("k", 10)), 1), 1000)
+                rows = query_nearest(cursor, float(body["lon"]), float(body["lat"]), k=k, year=year)
+                columns = PLACES_COLUMNS + ["distance_km"]
+        finally:
+            conn.close()
+
+        return {
+            "columns": columns,
+            "rows": rows
+        }
+    except (TypeError, ValueError) as e:
+        return {"error": f"Invalid request: {str(e)}"}
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+
+# Aligned state x year arrays for analytics, rebuilt once per data version
+_analytics_arrays = {"version": None, "arrays": None, "lock": threading.Lock()}
+
+def get_analytics_arrays(version):
+    if _analytics_arrays["version"] == version:
+        return _analytics_arrays["arrays"]
+    with _analytics_arrays["lock"]:
+        if _analytics_arrays["version"] != version:
+            with read_pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT state_key, state_name, year, {', '.join(METRICS)}
+                    FROM state_year_panel;
+                """)
+                _analytics_arrays["arrays"] = StateYearArrays(cursor.fetchall())
+            _analytics_arrays["version"] = version
+        return _analytics_arrays["arrays"]
+
+@lru_cache(maxsize=256)
+def cached_correlation(version, metrics, min_year, max_year):
+    matrix, counts = get_analytics_arrays(version).correlation(metrics, min_year, max_year)
+    return {
+        "metrics": list(metrics),
+        "correlation": [[to_json_number(v) for v in row] for row in matrix],
+        "n": [[int(v) for v in row] for row in counts]
+    }
+
+@lru_cache(maxsize=256)
+def cached_lagged_correlation(version, x, y, max_lag, min_year, max_year):
+    results = get_analytics_arrays(version).lagged_correlation(x, y, max_lag, min_year, max_year)
+    return {
+        "x": x,
+        "y": y,
+        "columns": ["lag", "correlation", "n"],
+        "rows": [[lag, to_json_number(corr), n] for lag, corr, n in results]
+    }
+
+@lru_cache(maxsize=256)
+def cached_trends(version, metric, min_year, max_year):
+    results = get_analytics_arrays(version).trends(metric, min_year, max_year)
+    return {
+        "metric": metric,
+        "columns": ["state", "slope_per_year", "intercept", "r2", "n"],
+        "rows": [[state, to_json_number(slope), to_json_number(intercept), to_json_number(r2), n]
+                 for state, slope, intercept, r2, n in results]
+    }
+
+@app.post("/v1/analytics/correlation")
+def analytics_correlation(body: dict):
+    """
+    Correlation matrix over state-year cells, or lagged correlation of two metrics.
+
+    Matrix: {"metrics": ["pm25_annual_mean", "age_adjusted_death_rate"], "min_year": 2018}
+    Lagged: {"x": "pm25_annual_mean", "y": "age_adjusted_death_rate", "max_lag": 3}
+    """
+    try:
+        version = get_data_version()
+        min_year, max_year = body.get("min_year"), body.get("max_year")
+        if body.get("x") and body.get("y"):
+            return cached_lagged_correlation(
+                version, body["x"], body["y"], int(body.get("max_lag", 3)), min_year, max_year
+            )
+        metrics = tuple(body.get("metrics") or METRICS)
+        return cached_correlation(version, metrics, min_year, max_year)
+    except ValueError as e:
+        return {"error": str(e)}
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+@app.post("/v1/analytics/trends")
+def analytics_trends(body: dict):
+    """Per-state linear trend of one metric. Body: {"metric": "pm25_annual_mean", "min_year": 2018}"""
+    try:
+        metric = body.get("metric")
+        if not metric:
+            return {"error": "No metric provided"}
+        return cached_trends(get_data_version(), metric, body.get("min_year"), body.get("max_year"))
+    except ValueError as e:
+        return {"error": str(e)}
+    except sqlite3.Error as e:
+        return {"error": f"Database error: {str(e)}"}
+
+
+# Scrape-time metrics: pool, job, cache and SQLite state
+
+LRU_CACHES = {
+    "survey_estimate": cached_survey_estimate,
+    "mortality_rates": cached_mortality_rates,
+    "correlation": cached_correlation,
+    "lagged_correlation": cached_lagged_correlation,
+    "trends": cached_trends,
+}
+
+# PRAGMAs reported as mcp_sqlite_pragma. Page-cache hit/miss counters are not
+# exported: Python's sqlite3 has no access to sqlite3_db_status (and they would
+# be per connection); mcp_cache_* covers the server's own result caches
+SQLITE_PRAGMAS = ("page_size", "page_count", "freelist_count", "cache_size", "cache_spill")
+
+def collect_cache_lookups():
+    lookups = {
+        ("context", "hit"): _context_cache["hits"],
+        ("context", "miss"): _context_cache["misses"],
+    }
+    for name, function in LRU_CACHES.items():
+        info = function.cache_info()
+        lookups[(name, "hit")] = info.hits
+        lookups[(name, "miss")] = info.misses
+    return lookups
+
+def collect_cache_hit_ratio():
+    lookups = collect_cache_lookups()
+    ratios = {}
+    for name in dict.fromkeys(name for name, _ in lookups):
+        hits, misses = lookups[(name, "hit")], lookups[(name, "miss")]
+        ratios[(name,)] = hits / (hits + misses) if hits + misses else 0.0
+    return ratios
+
+def collect_jobs():
+    counts = {(status,): 0 for status in ("queued", "running", "done", "failed", "cancelled")}
+    for job in list(jobs.jobs.values()):
+        counts[(job["status"],)] = counts.get((job["status"],), 0) + 1
+    return counts
+
+def collect_sqlite_pragmas():
+    # Own connection rather than a pooled one, so a scrape never waits behind an exhausted pool
+    conn = read_pool.open()
+    try:
+        return {(name,): conn.execute(f"PRAGMA {name}").fetchone()[0] for name in SQLITE_PRAGMAS}
+    finally:
+        conn.close()
+
+registry.callback("mcp_read_pool_connections", "Pooled read-only connections by state", "gauge",
+                  lambda: {("idle",): read_pool.idle.qsize(), ("in_use",): read_pool.in_use}, ("state",))
+registry.callback("mcp_read_pool_size", "Pool capacity", "gauge", lambda: {(): read_pool.size})
+registry.callback("mcp_read_pool_waiting", "Threads waiting for a pooled connection", "gauge", lambda: {(): read_pool.waiting})
+registry.callback("mcp_jobs", "Background jobs by status", "gauge", collect_jobs, ("status",))
+registry.callback("mcp_cache_lookups_total", "Result cache lookups", "counter", collect_cache_lookups, ("cache", "result"))
+registry.callback("mcp_cache_hit_ratio", "Result cache hits / lookups since start", "gauge", collect_cache_hit_ratio, ("cache",))
+registry.callback("mcp_sqlite_pragma", "SQLite PRAGMA values for the database (cache_size < 0 is KiB)", "gauge",
+                  collect_sqlite_pragmas, ("pragma",))
+
+# Worker lifecycle: warm-up, readiness and shutdown
+
+# Read the live snapshot once at startup so its pages are in the OS cache
+WARM_PAGE_CACHE = os.getenv("MCP_WARM_PAGE_CACHE", "1") == "1"
+WARM_READ_BYTES = 1 << 20
+
+_readiness = {"ready": False, "shutting_down": False, "version": None, "warm_up_seconds": None, "error": None}
+
+def warm_caches():
+    """Read the live snapshot into the OS page cache and build its per-version caches; returns the version."""
+    if WARM_PAGE_CACHE:
+        with open(read_pool.target, "rb") as f:
+            while f.read(WARM_READ_BYTES):
+                pass
+    version, _ = get_cached_context()
+    get_survey_columns(version, [*NHANES_WEIGHTS, NHANES_STRATA, NHANES_PSU])
+    get_mortality_data(version)
+    get_analytics_arrays(version)
+    return version
+
+def warm_up():
+    """Fill the pool and the per-version caches so the first requests don't pay for them."""
+    start = time.perf_counter()
+    try:
+        connections = [read_pool.acquire() for _ in range(read_pool.size)]
+        for conn in connections:
+            conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            read_pool.release(conn)
+
+        version = warm_caches()
+        _readiness.update(ready=True, version=version, warm_up_seconds=round(time.perf_counter() - start, 3))
+    except Exception as e:
+        _readiness["error"] = f"Warm-up failed: {str(e)}"
+
+def rewarm():
+    try:
+        _readiness["version"] = warm_caches()
+    except Exception as e:
+        _readiness["error"] = f"Re-warm after snapshot switch failed: {str(e)}"
+
+def on_snapshot_switch():
+    """Called by the pool when a new snapshot is published: prune old ones and warm the new one in the background."""
+    prune_snapshots()
+    if _readiness["ready"] and not _readiness["shutting_down"]:
+        threading.Thread(target=rewarm, name="re-warm", daemon=True).start()
+
+read_pool.on_switch = on_snapshot_switch
+
+def shut_down():
+    """Stop reporting ready, cancel background jobs and close pooled connections."""
+    _readiness.update(ready=False, shutting_down=True)
+    jobs.shutdown()
+    read_pool.close()
+
+@app.get("/ready")
+async def ready():
+    """200 once this worker has warmed up; 503 while warming, after a failed warm-up, or when shutting down."""
+    status_code = 200 if _readiness["ready"] and not _readiness["shutting_down"] else 503
+    return JSONResponse({**_readiness, "pid": os.getpid()}, status_code=status_code)
+
+@app.get("/metrics")
+def metrics():
+    # Plain def: collectors touch SQLite, so render in the threadpool, not on the event loop
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,212 @@
+# mortality_rates.py
+#
+# Crude and age-adjusted death rates from WONDER single-year-age rows.
+# Rows are encoded into integer arrays once; every request is then a couple
+# of bincounts over (group x standard age band).
+
+import re
+
+import numpy as np
+
+Z_95 = 1.959964
+RATE_PER = 100_000
+
+# WONDER flags rates based on fewer deaths than this as unreliable
+MIN_RELIABLE_DEATHS = 20
+
+# US 2000 standard population (per million), 11 age groups as used by CDC WONDER
+US_2000_STANDARD = [
+    (0, 0, 13_818),
+    (1, 4, 55_317),
+    (5, 14, 145_565),
+    (15, 24, 138_646),
+    (25, 34, 135_573),
+    (35, 44, 162_613),
+    (45, 54, 134_834),
+    (55, 64, 87_247),
+    (65, 74, 66_037),
+    (75, 84, 44_842),
+    (85, 200, 15_508),
+]
+
+DIMENSIONS = ("state", "year", "sex", "race", "cause_of_death")
+
+# Dimensions population varies by; every cause in a stratum shares its population
+POPULATION_DIMENSIONS = ("state", "year", "sex", "race")
+
+def parse_age(text):
+    """WONDER 'Single-Year Ages' label -> integer years ('< 1 year' -> 0, 'Not Stated' -> None)."""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if text.startswith("<"):
+        return 0
+    match = re.match(r"(\d+)", text)
+    return int(match.group(1)) if match else None
+
+def to_label(value):
+    """Numeric-looking labels (years) go back to int for JSON."""
+    return int(value) if str(value).isdigit() else str(value)
+
+def encode(values):
+    """Factorize a column into (codes, labels)."""
+    labels, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.ravel(), labels
+
+class MortalityData:
+    """
+    Encoded WONDER rows: one row per (state, year, sex, race, age, cause).
+    Build once per data version and reuse for every rate request.
+    """
+
+    def __init__(self, rows, standard=US_2000_STANDARD):
+        # rows: (state, year, sex, race, age_years, cause_of_death, deaths, population)
+        rows = [row for row in rows if row[4] is not None]
+        columns = list(zip(*rows)) if rows else [()] * 8
+
+        self.dims = {name: encode(columns[i]) for i, name in enumerate(POPULATION_DIMENSIONS)}
+        self.dims["cause_of_death"] = encode(columns[5])
+        self.cause_codes, self.causes = self.dims["cause_of_death"]
+        self.age = np.asarray(columns[4], dtype=np.int64)
+        self.deaths = np.nan_to_num(np.asarray(columns[6], dtype=np.float64))
+        population = np.asarray(columns[7], dtype=np.float64)
+
+        lower = np.array([low for low, _, _ in standard])
+        self.band_lower = lower
+        self.band_upper = np.array([high for _, high, _ in standard])
+        self.band_labels = [f"{low}-{high}" if high < 200 else f"{low}+" for low, high, _ in standard]
+        self.band_weights = np.array([weight for _, _, weight in standard], dtype=np.float64)
+        self.band = np.searchsorted(lower, self.age, side="right") - 1
+
+        # Population is repeated on every cause row of a stratum; keep it once per stratum
+        stratum_key = self.combined_key(POPULATION_DIMENSIONS) * (self.age.max(initial=0) + 1) + self.age
+        _, first, stratum = np.unique(stratum_key, return_index=True, return_inverse=True)
+        stratum = stratum.ravel()
+        self.stratum_rows = first
+        self.stratum_population = np.zeros(len(first))
+        np.maximum.at(self.stratum_population, stratum, np.nan_to_num(population))
+
+    def combined_key(self, names, rows=slice(None)):
+        """Mixed-radix integer key over the given dimensions."""
+        key = np.zeros(len(self.age), dtype=np.int64)[rows]
+        for name in names:
+            codes, labels = self.dims[name]
+            key = key * len(labels) + codes[rows]
+        return key
+
+    def row_mask(self, filters, min_age=None, max_age=None):
+        """Boolean mask of rows passing {dimension: [values]} and age filters."""
+        mask = np.ones(len(self.age), dtype=bool)
+        for name, values in (filters or {}).items():
+            codes, labels = self.dims[name]
+            wanted = np.flatnonzero(np.isin(labels, [str(v) for v in values]))
+            mask &= np.isin(codes, wanted)
+        if min_age is not None:
+            mask &= self.age >= min_age
+        if max_age is not None:
+            mask &= self.age <= max_age
+        return mask
+
+    def rates(self, group_by=(), cause=None, filters=None, min_age=None, max_age=None):
+        """
+        Crude and age-adjusted rates per 100,000 with 95% CIs for each group.
+        Every group uses the same standard: the bands overlapping the requested age
+        range. WONDER only has rows where deaths > 0, so a band with no population
+        counts as zero deaths; those groups, and groups with fewer than
+        MIN_RELIABLE_DEATHS deaths, are flagged "unreliable".
+        Grouping or filtering by cause_of_death splits deaths only; each cause
+        group gets the population of its other dimensions. Returns (columns, rows).
+        """
+        unknown = [name for name in list(group_by) + list(filters or {}) if name not in self.dims]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}; use {list(DIMENSIONS)}")
+
+        # Strata are tagged with an arbitrary cause row, so cause filters apply to deaths only
+        population_filters = {name: values for name, values in (filters or {}).items() if name in POPULATION_DIMENSIONS}
+        stratum_mask = self.row_mask(population_filters, min_age, max_age)[self.stratum_rows]
+
+        death_mask = self.row_mask(filters, min_age, max_age)
+        if cause is not None:
+            matches = np.flatnonzero(self.causes == cause)
+            if not len(matches):
+                raise ValueError(f"Unknown cause_of_death: {cause}")
+            death_mask &= self.cause_codes == matches[0]
+
+        # Dense group ids (mixed-radix over the grouping dimensions)
+        death_group = self.combined_key(group_by, death_mask)
+        keys = np.arange(int(np.prod([len(self.dims[name][1]) for name in group_by])))
+
+        # Each group's per-dimension codes (reverse of combined_key)
+        group_codes = {}
+        remaining = keys.copy()
+        for name in reversed(group_by):
+            size = len(self.dims[name][1])
+            group_codes[name] = remaining % size
+            remaining = remaining // size
+
+        # Population is binned over the grouping dimensions it varies by, then spread to every group
+        population_by = [name for name in group_by if name in POPULATION_DIMENSIONS]
+        stratum_group = self.combined_key(population_by, self.stratum_rows[stratum_mask])
+        population_group = np.zeros(len(keys), dtype=np.int64)
+        for name in population_by:
+            population_group = population_group * len(self.dims[name][1]) + group_codes[name]
+        n_population_groups = int(np.prod([len(self.dims[name][1]) for name in population_by]))
+
+        # Causes excluded by the cause/filters would otherwise show up with zero deaths
+        selected = np.ones(len(keys), dtype=bool)
+        if "cause_of_death" in group_by:
+            selected = np.isin(group_codes["cause_of_death"], self.cause_codes[death_mask])
+
+        n_groups, n_bands = len(keys), len(self.band_weights)
+        deaths = np.bincount(
+            death_group * n_bands + self.band[death_mask],
+            weights=self.deaths[death_mask], minlength=n_groups * n_bands
+        ).reshape(n_groups, n_bands)
+        population = np.bincount(
+            stratum_group * n_bands + self.band[self.stratum_rows[stratum_mask]],
+            weights=self.stratum_population[stratum_mask], minlength=n_population_groups * n_bands
+        ).reshape(n_population_groups, n_bands)[population_group]
+
+        total_deaths = deaths.sum(axis=1)
+        total_population = population.sum(axis=1)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            crude = total_deaths / total_population * RATE_PER
+            crude_se = np.sqrt(total_deaths) / total_population * RATE_PER
+
+            # Direct standardization on one standard for all groups, so their rates compare
+            in_range = np.ones(n_bands, dtype=bool)
+            if min_age is not None:
+                in_range &= self.band_upper >= min_age
+            if max_age is not None:
+                in_range &= self.band_lower <= max_age
+            weights = np.where(in_range, self.band_weights, 0.0)
+            weights = weights / weights.sum()
+            band_rates = np.where(population > 0, deaths / population, 0.0)
+            adjusted = (weights * band_rates).sum(axis=1) * RATE_PER
+            adjusted_se = np.sqrt((weights ** 2 * np.where(population > 0, deaths / population ** 2, 0.0)).sum(axis=1)) * RATE_PER
+
+        missing_bands = ((population <= 0) & in_range).sum(axis=1)
+        unreliable = (missing_bands > 0) | (total_deaths < MIN_RELIABLE_DEATHS)
+
+        labels = [self.dims[name][1][group_codes[name]] for name in group_by]
+
+        columns = list(group_by) + [
+            "deaths", "population",
+            "crude_rate", "crude_ci_low", "crude_ci_high",
+            "age_adjusted_rate", "age_adjusted_ci_low", "age_adjusted_ci_high",
+            "missing_age_bands", "unreliable",
+        ]
+        rows = []
+        for g in range(n_groups):
+            if total_population[g] <= 0 or not selected[g]:
+                continue
+            rows.append(
+                [to_label(label[g]) for label in labels] + [
+                    float(total_deaths[g]), float(total_population[g]),
+                    float(crude[g]), float(max(crude[g] - Z_95 * crude_se[g], 0.0)), float(crude[g] + Z_95 * crude_se[g]),
+                    float(adjusted[g]), float(max(adjusted[g] - Z_95 * adjusted_se[g], 0.0)), float(adjusted[g] + Z_95 * adjusted_se[g]),
+                    int(missing_bands[g]), bool(unreliable[g]),
+                ]
+            )
+        return columns, rows
@@ -0,0 +1,136 @@
+# nhanes_labels.py
+#
+# NHANES variable/value label dictionary: loads the scraped label JSON files
+# into lookup tables plus an FTS5 index, and searches that index.
+
+import json
+import os
+import re
+
+VARIABLE_LABELS_FILE = 'nhanes_variable_labels.json'
+VALUE_LABELS_FILE = 'nhanes_value_labels.json'
+
+# Column weights for bm25(): variable name, variable label, value labels
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+def load_label_files(data_dir):
+    """Read the variable and value label JSON files; variable names are upper-cased."""
+    with open(os.path.join(data_dir, VARIABLE_LABELS_FILE)) as f:
+        variable_labels = {name.upper(): label for name, label in json.load(f).items()}
+    with open(os.path.join(data_dir, VALUE_LABELS_FILE)) as f:
+        value_labels = {name.upper(): codes for name, codes in json.load(f).items()}
+    return variable_labels, value_labels
+
+def load_label_tables(conn, data_dir):
+    """Replace the contents of the label tables and rebuild the FTS index."""
+    variable_labels, value_labels = load_label_files(data_dir)
+    cursor = conn.cursor()
+
+    cursor.execute("DELETE FROM nhanes_variables")
+    cursor.execute("DELETE FROM nhanes_value_labels")
+    cursor.execute("DELETE FROM nhanes_label_search")
+
+    # Variables that only appear in the value file still get a row
+    variables = sorted(set(variable_labels) | set(value_labels))
+    cursor.executemany(
+        "INSERT INTO nhanes_variables (variable, label) VALUES (?, ?)",
+        [(name, variable_labels.get(name, name)) for name in variables]
+    )
+    cursor.executemany(
+        "INSERT INTO nhanes_value_labels (variable, code, label) VALUES (?, ?, ?)",
+        [(name, code, label) for name, codes in value_labels.items() for code, label in codes.items()]
+    )
+    cursor.executemany(
+        "INSERT INTO nhanes_label_search (variable, label, value_labels) VALUES (?, ?, ?)",
+        [
+            (name, variable_labels.get(name, name), " ".join(value_labels.get(name, {}).values()))
+            for name in variables
+        ]
+    )
+    conn.commit()
+    return len(variables)
+
+def create_decoded_view(conn, view_name='nhanes_survey_decoded'):
+    """
+    (Re)create a view over nhanes_survey that adds a <VAR>_label column for each
+    coded variable. Labels are resolved by indexed lookups into nhanes_value_labels,
+    so decoding happens inside SQLite with no per-row Python work.
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(nhanes_survey);")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    # Only categorical variables: continuous ones have range codes like "0 to 79".
+    # Same rule as decode_variables.is_categorical: every code matches -?[0-9]+ or is "< blank >"
+    cursor.execute("""
+        SELECT variable
+        FROM (
+            SELECT variable, code,
+                   CASE WHEN code GLOB '-*' THEN substr(code, 2) ELSE code END AS digits
+            FROM nhanes_value_labels
+        )
+        GROUP BY variable
+        HAVING SUM(code != '< blank >' AND (digits = '' OR digits GLOB '*[^0-9]*')) = 0;
+    """)
+    coded = {variable for (variable,) in cursor.fetchall()}
+
+    label_columns = [
+        f"""CAST((SELECT v.label FROM nhanes_value_labels v
+                  WHERE v.variable = '{col.upper()}'
+                  AND v.code = CAST(CAST(s.{col} AS INTEGER) AS TEXT)) AS TEXT) AS {col}_label"""
+        for col in columns
+        if col.upper() in coded
+    ]
+
+    cursor.execute(f"DROP VIEW IF EXISTS {view_name}")
+    cursor.execute(f"""
+        CREATE VIEW {view_name} AS
+        SELECT s.*{''.join(f', {expr}' for expr in label_columns)}
+        FROM nhanes_survey s
+    """)
+    conn.commit()
+    return len(label_columns)
+
+def build_match_expression(query):
+    """Turn free text into an FTS5 prefix query (OR of quoted terms)."""
+    terms = re.findall(r'\w+', query)
+    return " OR ".join(f'"{term}"*' for term in terms)
+
+def search_labels(cursor, query, limit=10):
+    """Rank NHANES variables against a keyword query and attach their code tables."""
+    match = build_match_expression(query)
+    if not match:
+        return []
+
+    cursor.execute(f"""
+        SELECT variable, label, bm25(nhanes_label_search, {', '.join(map(str, SEARCH_WEIGHTS))}) AS rank
+        FROM nhanes_label_search
+        WHERE nhanes_label_search MATCH ?
+        ORDER BY rank
+        LIMIT ?;
+    """, (match, limit))
+    hits = cursor.fetchall()
+    if not hits:
+        return []
+
+    # One round trip for the code tables of all hits
+    variables = [variable for variable, _, _ in hits]
+    placeholders = ", ".join("?" for _ in variables)
+    cursor.execute(f"""
+        SELECT variable, code, label
+        FROM nhanes_value_labels
+        WHERE variable IN ({placeholders});
+    """, variables)
+    codes = {}
+    for variable, code, label in cursor.fetchall():
+        codes.setdefault(variable, {})[code] = label
+
+    return [
+        {
+            "variable": variable,
+            "label": label,
+            "score": -rank,  # bm25() is lower-is-better
+            "values": codes.get(variable, {}),
+        }
+        for variable, label, rank in hits
+    ]
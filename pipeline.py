@@ -0,0 +1,52 @@
+# pipeline.py
+#
+# Background machinery for the Streamlit app: one asyncio event loop on a
+# daemon thread holding a pooled httpx.AsyncClient to the MCP server, and a
+# thread pool for blocking LLM calls so commentary can run while the table
+# and chart are rendered.
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# Keep-alive connections reused across reruns and sessions
+MAX_CONNECTIONS = 20
+REQUEST_TIMEOUT_SECONDS = 60.0
+
+# Blocking LLM calls that may run at the same time
+LLM_WORKERS = 4
+
+class Pipeline:
+    """Shared loop + HTTP client + worker pool; create once per process."""
+
+    def __init__(self, base_url):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mcp-client-loop", daemon=True)
+        self.thread.start()
+        self.client = self.run(self.open_client(base_url))
+        self.executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+    async def open_client(self, base_url):
+        # The client must be created on the loop that will drive it
+        return httpx.AsyncClient(
+            base_url=base_url,
+            timeout=REQUEST_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+        )
+
+    def run(self, coro):
+        """Run a coroutine on the background loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def post(self, path, json=None, headers=None):
+        """POST to the MCP server over a pooled connection; returns the httpx.Response."""
+        return self.run(self.client.post(path, json=json, headers=headers))
+
+    def get(self, path, params=None):
+        return self.run(self.client.get(path, params=params))
+
+    def submit(self, fn, *args):
+        """Start a blocking call (e.g. an LLM request) in the background; returns a Future."""
+        return self.executor.submit(fn, *args)
@@ -0,0 +1,136 @@
+# plotting.py
+#
+# Chart-ready preparation of query results: one sort + groupby pass over the
+# frame, a data-driven cap on the number of lines, and vectorized min/max
+# downsampling of long series before anything reaches matplotlib.
+
+import hashlib
+import io
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+# Columns that can serve as the x axis, in order of preference
+X_COLUMNS = ["year", "age_years"]
+
+# Columns that identify a series (one line each)
+SERIES_COLUMNS = ["state", "state_name", "county_name"]
+
+# Keys and identifiers: numeric, but never a quantity worth plotting
+ID_COLUMNS = {"SEQN", "LocationID", "SDMVSTRA", "SDMVPSU"}
+ID_SUFFIXES = ("_key", "_code", "_id", "_fips")
+
+# Most lines a chart shows; remaining series are folded into one median line
+MAX_SERIES = 8
+
+# Most points drawn per line; longer series keep each bucket's min and max
+MAX_POINTS = 400
+
+# Markers only help when lines are short
+MARKER_MAX_POINTS = 40
+
+OTHER_SERIES = "Other (median)"
+
+def result_hash(df):
+    """Stable content hash of a result frame, used as the figure cache key."""
+    digest = hashlib.sha1(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def is_id_column(col):
+    return col in ID_COLUMNS or str(col).lower().endswith(ID_SUFFIXES)
+
+def plot_columns(df):
+    """Pick (x, y, series) columns for a line chart, or None if the result is not plottable."""
+    x_col = next((col for col in X_COLUMNS if col in df.columns), None)
+    if x_col is None or len(df.columns) < 2:
+        return None
+
+    series_col = next((col for col in SERIES_COLUMNS if col in df.columns), None)
+    y_candidates = [
+        col for col in df.columns
+        if col not in (x_col, series_col) and pd.api.types.is_numeric_dtype(df[col]) and not is_id_column(col)
+    ]
+    if not y_candidates:
+        return None
+    return x_col, y_candidates[0], series_col
+
+def downsample(frame, x_col, y_col, group_col, max_points=MAX_POINTS):
+    """
+    Min/max bucket downsampling of every series at once.
+    Input must be sorted by (group, x); series already short enough are untouched.
+    """
+    sizes = frame.groupby(group_col, sort=False)[x_col].transform("size").to_numpy()
+    if sizes.max(initial=0) <= max_points:
+        return frame
+
+    # Each series of n points gets max_points / 2 buckets; keep the min and max of each
+    position = frame.groupby(group_col, sort=False).cumcount().to_numpy()
+    buckets = np.where(sizes > max_points, position * (max_points // 2) // sizes, position)
+    keys = [frame[group_col].to_numpy(), buckets]
+
+    y = frame[y_col]
+    keep = pd.Index(y.groupby(keys, sort=False).idxmin().dropna()).union(
+        pd.Index(y.groupby(keys, sort=False).idxmax().dropna())
+    )
+    return frame.loc[frame.index.isin(keep)]
+
+def prepare_series(df, x_col, y_col, series_col=None, max_series=MAX_SERIES, max_points=MAX_POINTS):
+    """
+    Return [(label, x array, y array)] ready to draw.
+    One sort and one groupby over the whole frame; no per-series filtering.
+    """
+    frame = df[[c for c in (series_col, x_col, y_col) if c]].dropna(subset=[x_col, y_col])
+
+    if series_col is None:
+        frame = frame.groupby(x_col, as_index=False, sort=True)[y_col].mean()
+        frame["_series"] = ""
+        series_col = "_series"
+
+    # Collapse duplicate (series, x) points so every series is a function of x
+    frame = frame.groupby([series_col, x_col], as_index=False, sort=True)[y_col].mean()
+
+    # Series cap: keep the series with the highest mean, fold the rest into a median line
+    means = frame.groupby(series_col, sort=False)[y_col].mean().sort_values(ascending=False)
+    if len(means) > max_series:
+        top = means.index[:max_series - 1]
+        in_top = frame[series_col].isin(top)
+        other = frame[~in_top].groupby(x_col, as_index=False, sort=True)[y_col].median()
+        other[series_col] = OTHER_SERIES
+        frame = pd.concat([frame[in_top], other[[series_col, x_col, y_col]]], ignore_index=True)
+        order = list(top) + [OTHER_SERIES]
+    else:
+        order = list(means.index)
+
+    frame = downsample(frame.reset_index(drop=True), x_col, y_col, series_col, max_points)
+
+    grouped = {label: group for label, group in frame.groupby(series_col, sort=False)}
+    return [
+        (label, grouped[label][x_col].to_numpy(), grouped[label][y_col].to_numpy())
+        for label in order
+        if label in grouped
+    ]
+
+def render_line_chart(series, xlabel, ylabel):
+    """Draw prepared series and return the figure as PNG bytes."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for label, x, y in series:
+        marker = 'o' if len(x) <= MARKER_MAX_POINTS else None
+        ax.plot(x, y, marker=marker, label=label or None)
+
+    if any(label for label, _, _ in series):
+        ax.legend()
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(f"{ylabel} over {xlabel}")
+    ax.grid(True)
+    plt.setp(ax.get_xticklabels(), rotation=45)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.getvalue()
@@ -0,0 +1,62 @@
+# query_log.py
+#
+# Optional record of the queries the MCP server receives, one JSON object per
+# line: arrival time, endpoint, SQL, options, duration, row count and error.
+# The file doubles as a workload for benchmarks/load_test.py to replay.
+# Enabled by pointing QUERY_LOG at a file; otherwise recording is a no-op.
+
+import json
+import threading
+import time
+
+# Request options worth replaying alongside the SQL
+RECORDED_OPTIONS = ("timeout_ms", "approximate", "max_relative_error")
+
+class QueryRecorder:
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.path)
+
+    def record(self, endpoint, body, started, result):
+        """Append one request; started is the time.time() at arrival, result the response dict."""
+        if not self.path:
+            return
+        entry = {
+            "ts": round(started, 6),
+            "endpoint": endpoint,
+            "duration_ms": round((time.time() - started) * 1000, 3),
+        }
+        if endpoint == "/v1/query/batch":
+            entry["queries"] = body.get("queries")
+            entry["rows"] = sum(len(r.get("rows", [])) for r in result.get("results", []))
+            entry["error"] = result.get("error") or next(
+                (r["error"] for r in result.get("results", []) if "error" in r), None
+            )
+        else:
+            entry["query"] = body.get("query")
+            entry["options"] = {k: body[k] for k in RECORDED_OPTIONS if k in body}
+            entry["rows"] = len(result.get("rows", []))
+            entry["error"] = result.get("error")
+
+        line = json.dumps(entry, default=str) + "\n"
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line)
+
+def load_workload(path):
+    """Recorded requests from a QUERY_LOG file as (endpoint, body) pairs, in arrival order."""
+    workload = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get("endpoint") == "/v1/query/batch":
+                workload.append(("/v1/query/batch", {"queries": entry["queries"]}))
+            else:
+                workload.append(("/v1/query", {"query": entry["query"], **entry.get("options", {})}))
+    return workload
@@ -0,0 +1,50 @@
+# query_profile.py
+#
+# Helpers for /v1/query's "profile" mode: the EXPLAIN QUERY PLAN tree of a
+# statement, counts of the plan steps that usually explain a slow query
+# (full table scans and temporary B-trees for ORDER BY / GROUP BY /
+# DISTINCT), and a text rendering of the tree for display.
+
+import time
+
+# Progress-handler granularity while profiling, in SQLite VM instructions
+PROFILE_STEP_INTERVAL = 1000
+
+def explain_plan(cursor, sql):
+    """
+    EXPLAIN QUERY PLAN rows as [{"id", "parent", "detail"}] plus the time it
+    took; since EXPLAIN compiles the statement without running it, that time
+    stands in for the prepare phase.
+    """
+    start = time.perf_counter()
+    rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    prepare_seconds = time.perf_counter() - start
+    return [{"id": row[0], "parent": row[1], "detail": row[3]} for row in rows], prepare_seconds
+
+def is_full_scan(detail):
+    # "SCAN t" reads every row; "SCAN t USING INDEX i" still walks the whole index
+    return detail.startswith("SCAN ") and "CONSTANT ROW" not in detail
+
+def summarize_plan(nodes):
+    return {
+        "full_scans": sum(is_full_scan(node["detail"]) for node in nodes),
+        "temp_btrees": sum("TEMP B-TREE" in node["detail"] for node in nodes),
+    }
+
+def format_plan(nodes):
+    """Plan as an indented tree, like the sqlite3 shell's .eqp output."""
+    children = {}
+    for node in nodes:
+        children.setdefault(node["parent"], []).append(node)
+
+    lines = []
+
+    def walk(parent, prefix):
+        siblings = children.get(parent, [])
+        for i, node in enumerate(siblings):
+            last = i == len(siblings) - 1
+            lines.append(f"{prefix}{'`--' if last else '|--'}{node['detail']}")
+            walk(node["id"], prefix + ("   " if last else "|  "))
+
+    walk(0, "")
+    return "\n".join(lines)
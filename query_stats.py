@@ -0,0 +1,190 @@
+# query_stats.py
+#
+# Per-shape statistics for executed SQL. Each statement is reduced to a
+# fingerprint (comments dropped, literals replaced by ?, IN lists collapsed,
+# whitespace and case normalized), so the many near-identical variants an
+# LLM writes for one question aggregate together. For every fingerprint we
+# keep count, errors, total/mean/max/p95 time, rows returned and the last
+# query plan; statements over the slow threshold are also written to a
+# rotating JSON-lines log, one file per process (see per_process_path).
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+from logging.handlers import RotatingFileHandler
+
+from query_profile import format_plan
+
+# Statements slower than this go to the slow log (and refresh their plan)
+DEFAULT_SLOW_QUERY_MS = 1000
+
+SLOW_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_LOG_BACKUPS = 5
+
+# Distinct fingerprints tracked; the least recently seen is dropped beyond this
+MAX_FINGERPRINTS = 2000
+
+# Recent durations kept per fingerprint for the p95
+LATENCY_WINDOW = 256
+
+ORDER_KEYS = ("total_ms", "mean_ms", "p95_ms", "max_ms", "count", "rows", "errors")
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>[xX]?'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[A-Za-z_][\w$.]*)
+  | (?P<symbol>[^\s\w'"`\[]+)
+""", re.VERBOSE | re.DOTALL)
+
+VALUE_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """Normalized statement text with literals replaced by ?."""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if kind in ("string", "number"):
+            tokens.append("?")
+        elif kind == "quoted":
+            tokens.append(match.group())
+        else:
+            tokens.append(match.group().lower())
+    text = " ".join(tokens).rstrip("; ")
+    # Spacing around punctuation: "( ? , ? )" and "(?,?)" come out the same
+    text = re.sub(r"\(\s+", "(", text)
+    text = re.sub(r"\s+\)", ")", text)
+    text = re.sub(r"\s*,\s*", ", ", text)
+    return VALUE_LIST_PATTERN.sub("(?+)", text)
+
+def statement_key(sql):
+    """
+    Comment-, whitespace- and trailing-semicolon-insensitive form of a statement,
+    with its literals kept, for spotting exact duplicates (not for executing).
+    """
+    tokens = [match.group() for match in TOKEN_PATTERN.finditer(sql) if match.lastgroup != "comment"]
+    return " ".join(tokens).rstrip("; ")
+
+def per_process_path(path):
+    """
+    slow_queries.log -> slow_queries.<pid>.log. Worker processes each rotate
+    their own file; RotatingFileHandler renames files underneath any other
+    process writing the same path, losing or interleaving records.
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}.{os.getpid()}{ext}"
+
+def fingerprint_id(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class QueryStats:
+    def __init__(self, slow_query_ms=DEFAULT_SLOW_QUERY_MS, slow_log_path=None, max_fingerprints=MAX_FINGERPRINTS):
+        self.slow_query_ms = slow_query_ms
+        self.max_fingerprints = max_fingerprints
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.slow_log = None
+        if slow_log_path:
+            self.slow_log = logging.getLogger(f"slow_queries.{slow_log_path}")
+            self.slow_log.propagate = False
+            self.slow_log.setLevel(logging.INFO)
+            if not self.slow_log.handlers:
+                handler = RotatingFileHandler(per_process_path(slow_log_path), maxBytes=SLOW_LOG_MAX_BYTES, backupCount=SLOW_LOG_BACKUPS)
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                self.slow_log.addHandler(handler)
+
+    def record(self, sql, seconds, rows=0, error=None, explain=None, plan=None):
+        """
+        Add one execution. explain is an optional zero-argument callable returning
+        EXPLAIN QUERY PLAN nodes (see query_profile.explain_plan); it is only
+        called for a fingerprint's first execution and for slow ones, while the
+        caller's connection is still open.
+        """
+        text = fingerprint(sql)
+        key = fingerprint_id(text)
+        slow = seconds * 1000 >= self.slow_query_ms
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = {
+                    "fingerprint": key,
+                    "query": text,
+                    "example": sql,
+                    "count": 0,
+                    "errors": 0,
+                    "total_seconds": 0.0,
+                    "max_seconds": 0.0,
+                    "rows": 0,
+                    "recent": deque(maxlen=LATENCY_WINDOW),
+                    "plan": None,
+                    "last_seen": None,
+                }
+                if len(self.entries) > self.max_fingerprints:
+                    self.entries.popitem(last=False)
+            self.entries.move_to_end(key)
+            entry["count"] += 1
+            entry["errors"] += error is not None
+            entry["total_seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+            entry["rows"] += rows
+            entry["recent"].append(seconds)
+            entry["last_seen"] = time.time()
+            needs_plan = error is None and (slow or entry["plan"] is None)
+
+        if needs_plan and plan is None and explain is not None:
+            try:
+                plan = explain()
+            except Exception:
+                plan = None
+        if plan is not None:
+            entry["plan"] = plan
+
+        if slow and self.slow_log is not None:
+            self.slow_log.info(json.dumps({
+                "ts": round(time.time(), 3),
+                "fingerprint": key,
+                "duration_ms": round(seconds * 1000, 3),
+                "rows": rows,
+                "error": error,
+                "query": sql,
+                "plan": format_plan(plan) if plan else None,
+            }))
+
+    def summary(self, entry):
+        count = entry["count"]
+        return {
+            "fingerprint": entry["fingerprint"],
+            "query": entry["query"],
+            "example": entry["example"],
+            "count": count,
+            "errors": entry["errors"],
+            "total_ms": round(entry["total_seconds"] * 1000, 3),
+            "mean_ms": round(entry["total_seconds"] * 1000 / count, 3),
+            "p95_ms": round(percentile(entry["recent"], 0.95) * 1000, 3),
+            "max_ms": round(entry["max_seconds"] * 1000, 3),
+            "rows": entry["rows"],
+            "last_seen": entry["last_seen"],
+            "plan": format_plan(entry["plan"]) if entry["plan"] else None,
+        }
+
+    def top(self, limit=20, order_by="total_ms"):
+        """The limit heaviest fingerprints by order_by (one of ORDER_KEYS)."""
+        with self.lock:
+            summaries = [self.summary(entry) for entry in self.entries.values()]
+        summaries.sort(key=lambda summary: summary[order_by], reverse=True)
+        return summaries[:limit]
@@ -1,19 +1,10 @@
 import sqlite3
 import pandas as pd
 
-# Connect to the database
-conn = sqlite3.connect('copd_public_health.db')
-
-# Create a function to run queries and display results nicely
-def run_query(query, description):
-    print(f"\n{description}")
-    print("-" * 80)
-    result = pd.read_sql_query(query, conn)
-    print(result)
-    print()
-
-# Count rows in each table
-run_query("""
+# (description, SQL) for the summary statistics; also used by benchmarks/
+QUERIES = [
+    # Count rows in each table
+    ("Row counts for all tables:", """
 SELECT 
     'nhanes_survey' as table_name, 
     COUNT(*) as row_count 
@@ -33,20 +24,20 @@ SELECT
     'state_air_quality' as table_name, 
     COUNT(*) as row_count 
 FROM state_air_quality
-""", "Row counts for all tables:")
+"""),
 
-# NHANES Survey Statistics
-run_query("""
+    # NHANES Survey Statistics
+    ("NHANES Survey Statistics:", """
 SELECT 
     COUNT(*) as total_respondents,
     SUM(CASE WHEN MCQ160p = 1 THEN 1 ELSE 0 END) as copd_count,
     SUM(CASE WHEN SMQ020 = 1 THEN 1 ELSE 0 END) as smokers_count,
     AVG(RIDAGEYR) as avg_age
 FROM nhanes_survey
-""", "NHANES Survey Statistics:")
+"""),
 
-# WONDER Mortality Statistics
-run_query("""
+    # WONDER Mortality Statistics
+    ("WONDER Mortality Statistics by Year:", """
 SELECT 
     year,
     COUNT(DISTINCT state) as num_states,
@@ -55,10 +46,10 @@ SELECT
 FROM wonder_mortality
 GROUP BY year
 ORDER BY year
-""", "WONDER Mortality Statistics by Year:")
+"""),
 
-# PLACES Health Statistics
-run_query("""
+    # PLACES Health Statistics
+    ("PLACES Health Statistics:", """
 SELECT 
     COUNT(DISTINCT state) as num_states,
     COUNT(DISTINCT county_name) as num_counties,
@@ -66,10 +57,10 @@ SELECT
     AVG(smoking_prevalence) as avg_smoking_prevalence,
     AVG(obesity_prevalence) as avg_obesity_prevalence
 FROM places_health
-""", "PLACES Health Statistics:")
+"""),
 
-# Air Quality Statistics
-run_query("""
+    # Air Quality Statistics
+    ("Air Quality Statistics by Year:", """
 SELECT 
     year,
     COUNT(DISTINCT state) as num_states,
@@ -79,7 +70,23 @@ SELECT
 FROM state_air_quality
 GROUP BY year
 ORDER BY year
-""", "Air Quality Statistics by Year:")
+"""),
+]
+
+# Create a function to run queries and display results nicely
+def run_query(conn, query, description):
+    print(f"\n{description}")
+    print("-" * 80)
+    result = pd.read_sql_query(query, conn)
+    print(result)
+    print()
+
+if __name__ == '__main__':
+    # Connect to the database
+    conn = sqlite3.connect('copd_public_health.db')
+
+    for description, query in QUERIES:
+        run_query(conn, query, description)
 
-# Close the connection
-conn.close() 
\ No newline at end of file
+    # Close the connection
+    conn.close()
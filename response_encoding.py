@@ -0,0 +1,88 @@
+# response_encoding.py
+#
+# Fast path for large SQL results. Rows from sqlite3 are already plain
+# tuples of str/int/float/None, so they are dumped straight to JSON bytes
+# (orjson when installed) instead of going through FastAPI's
+# jsonable_encoder walk. Results can optionally be laid out column-major,
+# and bodies over MIN_COMPRESS_BYTES are compressed with zstd or gzip,
+# whichever the client accepts (zstd needs the zstandard package).
+
+import gzip
+import json
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Smaller bodies aren't worth the compression overhead
+MIN_COMPRESS_BYTES = 1024
+
+GZIP_LEVEL = 5
+ZSTD_LEVEL = 3
+
+LAYOUTS = ("rows", "columns")
+
+def dumps(obj):
+    """JSON bytes; NaN/inf become null with orjson (the stdlib path rejects them, as FastAPI did)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(",", ":"), allow_nan=False, default=str).encode()
+
+def to_columns(result):
+    """Column-major form of a {"columns", "rows"} result: "data" holds one list per column."""
+    if "rows" not in result:
+        return result
+    columnar = {key: value for key, value in result.items() if key != "rows"}
+    rows = result["rows"]
+    columnar["row_count"] = len(rows)
+    columnar["data"] = [list(values) for values in zip(*rows)] if rows else [[] for _ in result.get("columns", [])]
+    columnar["layout"] = "columns"
+    return columnar
+
+def accepted_encodings(header):
+    """Encodings from an Accept-Encoding header with a non-zero q-value."""
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.lower())
+    return accepted
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+def compress(body, encoding):
+    if encoding == "zstd":
+        # Compressor objects aren't safe to share across threads; they are cheap to create
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+def encode_response(body, accept_encoding=None, status_code=200):
+    """Response for already-dumped JSON bytes, compressed when large enough and accepted."""
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
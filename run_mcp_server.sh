@@ -1 +1,13 @@
-uvicorn mcp_server:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+# Development (default): one process with auto-reload
+#   bash run_mcp_server.sh
+# Production: several workers sharing the read-only snapshot; stop with SIGTERM
+# for a graceful shutdown (in-flight requests get MCP_GRACEFUL_SECONDS to finish)
+#   MCP_MODE=prod MCP_WORKERS=8 bash run_mcp_server.sh
+if [ "${MCP_MODE:-dev}" = "prod" ]; then
+    exec uvicorn mcp_server:app --host 0.0.0.0 --port "${PORT:-8000}" \
+        --workers "${MCP_WORKERS:-$(nproc)}" \
+        --timeout-graceful-shutdown "${MCP_GRACEFUL_SECONDS:-30}" \
+        --no-access-log
+else
+    uvicorn mcp_server:app --host 0.0.0.0 --port 8000 --reload
+fi
@@ -1,39 +1,205 @@
+# sample_datasets.py
+#
+# Copies the source datasets into sample_data/, or with --sample writes
+# development-sized samples of them. Sources are streamed in chunks (CSV)
+# or record batches (parquet), so memory stays bounded by the chunk size
+# plus the number of strata, however large the source file is:
+#
+#   --fraction F   keep F of every stratum, exactly (min --min-per-stratum);
+#                  one pass counts the strata, a second selects and writes
+#   --size N       keep N rows of every stratum in one pass (reservoir
+#                  sampling, so only the reservoir is held in memory)
+#
+# Strata default to state/year per dataset (--no-strata samples the whole
+# file uniformly). PLACES is sampled by county rather than by row, so every
+# measure of a chosen county is kept and the per-county pivot still works;
+# EPA is sampled by state, so every kept state has its full 2010-2024 series.
+#
+#   python sample_datasets.py --sample --fraction 0.1
+#   python sample_datasets.py --sample --size 200 --datasets wonder
+
 import argparse
-import pandas as pd
 import os
 import shutil
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+OUTPUT_DIR = 'sample_data'
 
-def main(sample):
-    epa_aqi_file = 'data/epa_aqi/epa_pm25_2010-2024.csv'
-    nhanes_file = 'data/nhanes/nhanes_2021-2023_copd.parquet'
-    places_file = 'data/places/places_2022.csv'
-    wonder_file = 'data/wonder/wonder_2018-2023.csv'
+# strata: columns sampled separately; key: column whose values are sampled as units
+DATASETS = {
+    'epa': {'source': 'data/epa_aqi/epa_pm25_2010-2024.csv', 'strata': [], 'key': 'state'},
+    'nhanes': {'source': 'data/nhanes/nhanes_2021-2023_copd.parquet', 'strata': ['SDMVSTRA']},
+    'places': {'source': 'data/places/places_2022.csv', 'strata': ['StateAbbr', 'Year'], 'key': 'LocationID'},
+    'wonder': {'source': 'data/wonder/wonder_2018-2023.csv', 'strata': ['State', 'Year']},
+}
 
-    os.makedirs('sample_data', exist_ok=True)
+LABEL_FILES = ['data/nhanes/nhanes_variable_labels.json', 'data/nhanes/nhanes_value_labels.json']
 
-    if sample:
-        df_epa_aqi = pd.read_csv(epa_aqi_file)
-        df_nhanes = pd.read_parquet(nhanes_file)
-        df_places = pd.read_csv(places_file)
-        df_wonder = pd.read_csv(wonder_file)
+DEFAULT_FRACTION = 0.01
+DEFAULT_CHUNK_ROWS = 100_000
 
-        df_epa_aqi.head().to_csv('sample_data/epa_pm25_2010-2024_sample.csv')
-        df_nhanes.head().to_csv('sample_data/nhanes_2021-2023_copd_sample.csv')
-        df_places.head().to_csv('sample_data/places_2022_sample.csv')
-        df_wonder.head().to_csv('sample_data/wonder_2018-2023_sample.csv')
+def read_chunks(path, chunk_rows, columns=None, text_columns=()):
+    """DataFrames of at most chunk_rows rows, indexed by row position in the file."""
+    if path.endswith('.parquet'):
+        offset = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
     else:
-        shutil.copy(epa_aqi_file, 'sample_data/epa_pm25_2010-2024.csv')
-        pd.read_parquet(nhanes_file).to_csv('sample_data/nhanes_2021-2023_copd.csv')
-        shutil.copy(places_file, 'sample_data/places_2022.csv')
-        shutil.copy(wonder_file, 'sample_data/wonder_2018-2023.csv')
+        # Strata and keys are read as text so values match across chunks whatever dtype pandas infers
+        dtype = {column: str for column in text_columns}
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=columns, dtype=dtype, low_memory=False)
+
+def first_column(path):
+    if path.endswith('.parquet'):
+        return pq.ParquetFile(path).schema_arrow.names[:1]
+    return list(pd.read_csv(path, nrows=0).columns[:1])
+
+def stratum_ids(chunk, strata):
+    if not strata:
+        return pd.Series(0, index=chunk.index, dtype='uint64')
+    return pd.util.hash_pandas_object(chunk[strata], index=False)
+
+def count_strata(path, strata, key, chunk_rows):
+    """Rows per stratum, or with a key the sorted distinct key values per stratum."""
+    columns = strata + ([key] if key else []) or first_column(path)
+    counts, keys = Counter(), defaultdict(set)
+    for chunk in read_chunks(path, chunk_rows, columns, text_columns=columns):
+        ids = stratum_ids(chunk, strata)
+        if key:
+            for stratum, values in chunk[key].groupby(ids.values):
+                keys[stratum].update(values.dropna())
+        else:
+            counts.update(ids.value_counts().to_dict())
+    if key:
+        return {stratum: sorted(values) for stratum, values in keys.items()}
+    return dict(counts)
+
+def quota(available, fraction, size, min_per_stratum):
+    wanted = size if size is not None else max(round(available * fraction), min_per_stratum)
+    return min(available, wanted)
 
-    shutil.copy('data/nhanes/nhanes_variable_labels.json', 'sample_data/nhanes_variable_labels.json')
-    shutil.copy('data/nhanes/nhanes_value_labels.json', 'sample_data/nhanes_value_labels.json')
+def write_chunk(chunk, dest, first, index):
+    chunk.to_csv(dest, mode='w' if first else 'a', header=first, index=index)
+
+def sample_keys(path, dest, strata, key, chunk_rows, rng, fraction, size, min_per_stratum, index):
+    """Two passes: pick key values per stratum, then write every row carrying one of them."""
+    selected = set()
+    for stratum, values in sorted(count_strata(path, strata, key, chunk_rows).items()):
+        selected.update(rng.choice(values, quota(len(values), fraction, size, min_per_stratum), replace=False))
+    kept = 0
+    for i, chunk in enumerate(read_chunks(path, chunk_rows, text_columns=strata + [key])):
+        chunk = chunk[chunk[key].isin(selected)]
+        write_chunk(chunk, dest, i == 0, index)
+        kept += len(chunk)
+    return kept
+
+def sample_fraction(path, dest, strata, chunk_rows, rng, fraction, min_per_stratum, index):
+    """
+    Two passes: count rows per stratum, then stream the file again selecting an
+    exact simple random sample of each stratum. How many of a stratum's rows in
+    a chunk are picked is drawn from the hypergeometric distribution of its
+    remaining rows and picks, so nothing beyond the chunk needs to be held.
+    """
+    remaining = count_strata(path, strata, None, chunk_rows)
+    needed = {stratum: quota(count, fraction, None, min_per_stratum) for stratum, count in remaining.items()}
+    kept = 0
+    for i, chunk in enumerate(read_chunks(path, chunk_rows, text_columns=strata)):
+        mask = np.zeros(len(chunk), dtype=bool)
+        ids = stratum_ids(chunk, strata).values
+        for stratum, positions in pd.Series(ids).groupby(ids).indices.items():
+            rows = len(positions)
+            if needed[stratum]:
+                picks = rng.hypergeometric(rows, remaining[stratum] - rows, needed[stratum])
+                mask[rng.choice(positions, picks, replace=False)] = True
+                needed[stratum] -= picks
+            remaining[stratum] -= rows
+        write_chunk(chunk[mask], dest, i == 0, index)
+        kept += int(mask.sum())
+    return kept
+
+def sample_reservoir(path, dest, strata, chunk_rows, rng, size, index):
+    """
+    One pass: every row gets a random priority and each stratum keeps the size
+    rows with the lowest, a uniform sample without replacement. Only the
+    reservoir (size rows per stratum) and the current chunk are in memory.
+    """
+    reservoir = None
+    for chunk in read_chunks(path, chunk_rows, text_columns=strata):
+        chunk = chunk.assign(_priority=rng.random(len(chunk)), _stratum=stratum_ids(chunk, strata).values)
+        pool = chunk if reservoir is None else pd.concat([reservoir, chunk])
+        reservoir = pool.sort_values('_priority', kind='stable').groupby('_stratum', sort=False).head(size)
+    sample = reservoir.sort_index().drop(columns=['_priority', '_stratum'])
+    write_chunk(sample, dest, True, index)
+    return len(sample)
+
+def sample_dataset(name, dest, fraction=DEFAULT_FRACTION, size=None, min_per_stratum=1, stratify=True,
+                   chunk_rows=DEFAULT_CHUNK_ROWS, seed=0):
+    """Write a sample of one of DATASETS to dest; returns the number of rows kept."""
+    dataset = DATASETS[name]
+    path = dataset['source']
+    strata = dataset['strata'] if stratify else []
+    key = dataset.get('key')
+    # The parquet source never had a CSV index column, so write the row position like to_csv used to
+    index = path.endswith('.parquet')
+    rng = np.random.default_rng(seed)
+    if key:
+        return sample_keys(path, dest, strata, key, chunk_rows, rng, fraction, size, min_per_stratum, index)
+    if size is not None:
+        return sample_reservoir(path, dest, strata, chunk_rows, rng, size, index)
+    return sample_fraction(path, dest, strata, chunk_rows, rng, fraction, min_per_stratum, index)
+
+def copy_dataset(name, output_dir, chunk_rows=DEFAULT_CHUNK_ROWS):
+    path = DATASETS[name]['source']
+    dest = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0] + '.csv')
+    if not path.endswith('.parquet'):
+        shutil.copy(path, dest)
+        return
+    for i, chunk in enumerate(read_chunks(path, chunk_rows)):
+        write_chunk(chunk, dest, i == 0, True)
+
+def main(sample, datasets=tuple(DATASETS), output_dir=OUTPUT_DIR, **options):
+    os.makedirs(output_dir, exist_ok=True)
+
+    for name in datasets:
+        if not sample:
+            copy_dataset(name, output_dir, options.get('chunk_rows', DEFAULT_CHUNK_ROWS))
+            continue
+        base = os.path.splitext(os.path.basename(DATASETS[name]['source']))[0]
+        dest = os.path.join(output_dir, f'{base}_sample.csv')
+        kept = sample_dataset(name, dest, **options)
+        print(f"{name}: {kept} rows -> {dest}")
+
+    for path in LABEL_FILES:
+        shutil.copy(path, os.path.join(output_dir, os.path.basename(path)))
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--sample', action='store_true', help='Sample the datasets')
+    amount = parser.add_mutually_exclusive_group()
+    amount.add_argument('--fraction', type=float, default=DEFAULT_FRACTION, help='Share of each stratum to keep')
+    amount.add_argument('--size', type=int, help='Rows (PLACES: counties, EPA: states) to keep per stratum')
+    parser.add_argument('--min-per-stratum', type=int, default=1, help='Floor for --fraction, so small strata stay represented')
+    parser.add_argument('--no-strata', action='store_true', help='Sample each file as a whole instead of by state/year')
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help='Rows read at a time')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
     args = parser.parse_args()
 
-    main(args.sample)
+    if not 0 < args.fraction <= 1:
+        parser.error('--fraction must be in (0, 1]')
+
+    options = {}
+    if args.sample:
+        options = {'fraction': args.fraction, 'size': args.size, 'min_per_stratum': args.min_per_stratum,
+                   'stratify': not args.no_strata, 'seed': args.seed}
+    options['chunk_rows'] = args.chunk_rows
+    main(args.sample, args.datasets, args.output_dir, **options)
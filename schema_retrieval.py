@@ -0,0 +1,219 @@
+# schema_retrieval.py
+#
+# Relevance-pruned schema prompts: a small BM25 index over table and column
+# descriptions so the LLM only sees the parts of the schema a question needs.
+
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict
+
+CONTEXT_FILE = 'context.json'
+VARIABLE_LABELS_FILE = os.path.join('sample_data', 'nhanes_variable_labels.json')
+
+# Rough prompt budget for the schema section (1 token ~ 4 characters)
+DEFAULT_TOKEN_BUDGET = 1500
+MAX_TABLES = 3
+
+# Columns always kept for a selected table so joins and filters stay possible
+KEY_COLUMNS = {"state", "year", "fips_code", "county_name", "SEQN"}
+
+# Tables at or below this width are sent whole; wider ones are pruned by score
+SMALL_TABLE_COLUMNS = 12
+
+# Tables/columns scoring below this fraction of the best match are dropped
+MIN_RELATIVE_SCORE = 0.35
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "how", "in", "is",
+    "of", "on", "or", "show", "the", "to", "what", "which", "with", "between",
+    "compare", "across", "all", "top", "highest", "lowest", "give", "me", "list",
+    "have", "has", "had", "do", "does", "did", "you", "your", "ever", "told",
+    "who", "many", "much", "now", "that", "this", "there", "than", "level",
+}
+
+def tokenize(text):
+    """Lowercase word tokens with light stemming; PM2.5 becomes pm25."""
+    text = re.sub(r'(\d)\.(\d)', r'\1\2', str(text).lower())
+    tokens = []
+    for token in re.split(r'[^a-z0-9]+', text.replace('_', ' ')):
+        if not token or token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def render_table_header(table):
+    return f"Table {table['name']} (granularity: {table.get('granularity', 'unknown')}):\n"
+
+def render_column(column, description=None):
+    units = f" ({column.get('units')})" if column.get('units') else ""
+    text = f"  - {column['name']} [{column['type']}] {units}"
+    if description:
+        text += f" -- {description}"
+    text += "\n"
+    if column.get('sample_values'):
+        text += f"    e.g., {column['sample_values']}\n"
+    if 'min' in column and 'max' in column:
+        text += f"    range: {column['min']} - {column['max']}\n"
+    return text
+
+def render_schema(context):
+    """Render the full schema (every table and column) for the prompt."""
+    schema_text = ""
+    for table in context['tables']:
+        schema_text += render_table_header(table)
+        for column in table['columns']:
+            schema_text += render_column(column)
+    return schema_text
+
+def load_descriptions(context_file=CONTEXT_FILE, labels_file=VARIABLE_LABELS_FILE):
+    """Collect table and column descriptions from context.json and the NHANES labels."""
+    table_descriptions = {}
+    column_descriptions = defaultdict(dict)
+
+    if os.path.exists(context_file):
+        with open(context_file) as f:
+            static_context = json.load(f)
+        for table in static_context.get('tables', []):
+            table_descriptions[table['name']] = table.get('description', '')
+            for column in table.get('columns', []):
+                column_descriptions[table['name']][column['name'].upper()] = column.get('description', '')
+
+    # NHANES variable names are opaque codes; the SAS labels say what they mean
+    if os.path.exists(labels_file):
+        with open(labels_file) as f:
+            variable_labels = json.load(f)
+        nhanes = column_descriptions['nhanes_survey']
+        for name, label in variable_labels.items():
+            nhanes.setdefault(name.upper(), label)
+
+    return table_descriptions, column_descriptions
+
+class SchemaIndex:
+    """BM25 index over one schema context; build once per context version."""
+
+    def __init__(self, context, table_descriptions=None, column_descriptions=None):
+        if table_descriptions is None or column_descriptions is None:
+            table_descriptions, column_descriptions = load_descriptions()
+
+        self.context = context
+        self.full_text = render_schema(context)
+
+        # One document per table and one per column
+        self.docs = []  # (table_idx, column_idx or None)
+        self.rendered = {}
+        doc_tokens = []
+        for t, table in enumerate(context['tables']):
+            table_desc = table_descriptions.get(table['name'], '')
+            self.docs.append((t, None))
+            doc_tokens.append(tokenize(f"{table['name']} {table_desc} {table.get('granularity', '')}"))
+
+            for c, column in enumerate(table['columns']):
+                desc = column_descriptions.get(table['name'], {}).get(column['name'].upper(), '')
+                # Drop labels that merely repeat the variable name
+                if desc and desc.lower() == column['name'].lower():
+                    desc = ''
+                self.rendered[(t, c)] = render_column(column, desc)
+                self.docs.append((t, c))
+
+                # Key columns are always sent, so they should not make a table look relevant
+                if column['name'] in KEY_COLUMNS:
+                    doc_tokens.append([])
+                else:
+                    doc_tokens.append(tokenize(f"{column['name']} {desc} {column.get('units', '')}"))
+
+        self.doc_lengths = [len(tokens) for tokens in doc_tokens]
+        self.avg_length = sum(self.doc_lengths) / max(len(self.doc_lengths), 1)
+
+        self.postings = defaultdict(list)
+        for doc_id, tokens in enumerate(doc_tokens):
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((doc_id, tf))
+
+        n_docs = len(self.docs)
+        self.idf = {
+            term: math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def score(self, question):
+        """Return {doc_id: bm25 score} for documents matching the question."""
+        scores = defaultdict(float)
+        for term in set(tokenize(question)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def render(self, question, token_budget=DEFAULT_TOKEN_BUDGET, max_tables=MAX_TABLES):
+        """Render only the tables and columns relevant to the question within the token budget."""
+        scores = self.score(question)
+        if not scores:
+            return self.full_text
+
+        table_scores = defaultdict(float)
+        column_scores = defaultdict(float)
+        for doc_id, score in scores.items():
+            t, c = self.docs[doc_id]
+            if c is None:
+                table_scores[t] += score
+            else:
+                column_scores[(t, c)] = score
+        best_column = defaultdict(float)
+        for (t, c), score in column_scores.items():
+            best_column[t] = max(best_column[t], score)
+        for t, score in best_column.items():
+            table_scores[t] += score
+
+        best_table = max(table_scores.values())
+        selected = sorted(
+            (t for t in table_scores if table_scores[t] >= MIN_RELATIVE_SCORE * best_table),
+            key=lambda t: -table_scores[t]
+        )[:max_tables]
+
+        schema_text = ""
+        used = 0
+        for t in selected:
+            table = self.context['tables'][t]
+            columns = table['columns']
+            header = render_table_header(table)
+
+            # Key columns and small tables are always sent; wide tables only send matches
+            required = [c for c, col in enumerate(columns)
+                        if col['name'] in KEY_COLUMNS or len(columns) <= SMALL_TABLE_COLUMNS]
+            cutoff = MIN_RELATIVE_SCORE * best_column.get(t, 0.0)
+            matched = sorted(
+                (c for c in range(len(columns))
+                 if column_scores.get((t, c), 0.0) >= cutoff > 0 and c not in required),
+                key=lambda c: -column_scores[(t, c)]
+            )
+
+            lines = [self.rendered[(t, c)] for c in required]
+            used += estimate_tokens(header) + sum(estimate_tokens(line) for line in lines)
+            for c in matched:
+                line = self.rendered[(t, c)]
+                cost = estimate_tokens(line)
+                if used + cost > token_budget:
+                    break
+                lines.append(line)
+                used += cost
+
+            schema_text += header + "".join(lines)
+            if used >= token_budget:
+                break
+
+        return schema_text
@@ -0,0 +1,167 @@
+# snapshots.py
+#
+# Versioned database snapshots. A rebuild writes a brand-new file under
+# SNAPSHOT_DIR, validates it, and publishes it by atomically replacing the
+# copd_public_health.db symlink, so readers never see a half-loaded table:
+# a connection opened before the swap keeps reading the old file, and one
+# opened after it reads the new one. Superseded snapshots are recorded in
+# a manifest and deleted once they have been retired for GRACE_SECONDS.
+#
+#   python snapshots.py status
+#   python snapshots.py prune [--grace SECONDS]
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+DATABASE_LINK = "copd_public_health.db"
+SNAPSHOT_DIR = "snapshots"
+MANIFEST = "manifest.json"
+
+# How long a superseded snapshot is kept for queries and jobs still reading it
+GRACE_SECONDS = 600
+
+# Tables that must exist and be non-empty in a publishable snapshot
+REQUIRED_TABLES = (
+    "state_dim", "nhanes_survey", "wonder_mortality", "places_health",
+    "state_air_quality", "state_year_panel",
+)
+
+# A new snapshot may not hold fewer than this share of the current rows per table
+MIN_ROW_RATIO = 0.5
+
+class SnapshotInvalid(Exception):
+    pass
+
+def new_snapshot_path(snapshot_dir=SNAPSHOT_DIR):
+    """Fresh, unique snapshot file name (the file itself is not created)."""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    return os.path.join(snapshot_dir, f"copd_public_health-{stamp}-{os.getpid()}.db")
+
+def current_snapshot(link=DATABASE_LINK):
+    """Path the live database name resolves to, or None if there is none yet."""
+    return os.path.realpath(link) if os.path.exists(link) else None
+
+def table_counts(path, tables=REQUIRED_TABLES):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] if table in present else None for table in tables}
+    finally:
+        conn.close()
+
+def validate_snapshot(path, link=DATABASE_LINK, min_row_ratio=MIN_ROW_RATIO):
+    """Raise SnapshotInvalid unless path passes quick_check, has every required table filled, and hasn't shrunk."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        check = conn.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        conn.close()
+    if check != "ok":
+        raise SnapshotInvalid(f"{path}: quick_check failed: {check}")
+
+    problems = []
+    counts = table_counts(path)
+    for table, count in counts.items():
+        if count is None:
+            problems.append(f"{table} is missing")
+        elif count == 0:
+            problems.append(f"{table} is empty")
+
+    current = current_snapshot(link)
+    if current and min_row_ratio and current != os.path.realpath(path):
+        try:
+            before = table_counts(current)
+        except sqlite3.Error:
+            before = {}
+        for table, count in counts.items():
+            if before.get(table) and count and count < before[table] * min_row_ratio:
+                problems.append(f"{table} shrank from {before[table]} to {count} rows")
+
+    if problems:
+        raise SnapshotInvalid(f"{path}: " + "; ".join(problems))
+    return counts
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"retired": {}}
+
+def write_manifest(manifest, snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(snapshot_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def publish_snapshot(path, link=DATABASE_LINK, snapshot_dir=SNAPSHOT_DIR):
+    """Atomically point link at path and retire whatever it pointed to before."""
+    previous = current_snapshot(link)
+    if os.path.exists(link) and not os.path.islink(link):
+        # A database from before snapshots: keep it, under a snapshot name, for the grace period
+        legacy = os.path.join(snapshot_dir, f"copd_public_health-legacy-{int(time.time())}.db")
+        os.link(link, legacy)
+        previous = os.path.realpath(legacy)
+
+    target = os.path.relpath(os.path.abspath(path), os.path.dirname(os.path.abspath(link)))
+    tmp_link = f"{link}.tmp-{os.getpid()}"
+    os.symlink(target, tmp_link)
+    os.replace(tmp_link, link)
+
+    if previous and previous != os.path.realpath(path):
+        manifest = read_manifest(snapshot_dir)
+        manifest["retired"][os.path.basename(previous)] = time.time()
+        write_manifest(manifest, snapshot_dir)
+
+def remove_database_files(path):
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+def prune_snapshots(link=DATABASE_LINK, snapshot_dir=SNAPSHOT_DIR, grace_seconds=GRACE_SECONDS):
+    """Delete snapshots retired more than grace_seconds ago; returns their names."""
+    manifest = read_manifest(snapshot_dir)
+    current = current_snapshot(link)
+    cutoff = time.time() - grace_seconds
+    removed, changed = [], False
+    for name, retired_at in list(manifest["retired"].items()):
+        path = os.path.join(snapshot_dir, name)
+        if current and os.path.realpath(path) == current:
+            # Republished since it was retired
+            del manifest["retired"][name]
+            changed = True
+        elif retired_at < cutoff:
+            remove_database_files(path)
+            del manifest["retired"][name]
+            removed.append(name)
+            changed = True
+    if changed:
+        write_manifest(manifest, snapshot_dir)
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or prune database snapshots")
+    parser.add_argument("command", choices=["status", "prune"])
+    parser.add_argument("--grace", type=float, default=GRACE_SECONDS, help="Seconds a retired snapshot is kept")
+    args = parser.parse_args()
+
+    if args.command == "prune":
+        for name in prune_snapshots(grace_seconds=args.grace):
+            print(f"Removed {name}")
+        return
+
+    current = current_snapshot()
+    print(f"Current: {os.path.relpath(current) if current else 'none'}")
+    for name, retired_at in sorted(read_manifest()["retired"].items(), key=lambda item: item[1]):
+        age = time.time() - retired_at
+        print(f"Retired: {name} ({age:.0f} s ago{', due for removal' if age > args.grace else ''})")
+
+if __name__ == "__main__":
+    main()
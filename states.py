@@ -0,0 +1,120 @@
+# states.py
+#
+# Canonical state dimension (FIPS code, abbreviation, name) shared by every
+# dataset, and the precomputed state x year panel built on top of it.
+
+from mortality_rates import MortalityData
+
+# (FIPS code, USPS abbreviation, name); the FIPS code doubles as state_key
+STATES = [
+    (1, "AL", "Alabama"), (2, "AK", "Alaska"), (4, "AZ", "Arizona"), (5, "AR", "Arkansas"),
+    (6, "CA", "California"), (8, "CO", "Colorado"), (9, "CT", "Connecticut"), (10, "DE", "Delaware"),
+    (11, "DC", "District of Columbia"), (12, "FL", "Florida"), (13, "GA", "Georgia"), (15, "HI", "Hawaii"),
+    (16, "ID", "Idaho"), (17, "IL", "Illinois"), (18, "IN", "Indiana"), (19, "IA", "Iowa"),
+    (20, "KS", "Kansas"), (21, "KY", "Kentucky"), (22, "LA", "Louisiana"), (23, "ME", "Maine"),
+    (24, "MD", "Maryland"), (25, "MA", "Massachusetts"), (26, "MI", "Michigan"), (27, "MN", "Minnesota"),
+    (28, "MS", "Mississippi"), (29, "MO", "Missouri"), (30, "MT", "Montana"), (31, "NE", "Nebraska"),
+    (32, "NV", "Nevada"), (33, "NH", "New Hampshire"), (34, "NJ", "New Jersey"), (35, "NM", "New Mexico"),
+    (36, "NY", "New York"), (37, "NC", "North Carolina"), (38, "ND", "North Dakota"), (39, "OH", "Ohio"),
+    (40, "OK", "Oklahoma"), (41, "OR", "Oregon"), (42, "PA", "Pennsylvania"), (44, "RI", "Rhode Island"),
+    (45, "SC", "South Carolina"), (46, "SD", "South Dakota"), (47, "TN", "Tennessee"), (48, "TX", "Texas"),
+    (49, "UT", "Utah"), (50, "VT", "Vermont"), (51, "VA", "Virginia"), (53, "WA", "Washington"),
+    (54, "WV", "West Virginia"), (55, "WI", "Wisconsin"), (56, "WY", "Wyoming"),
+    (60, "AS", "American Samoa"), (66, "GU", "Guam"), (69, "MP", "Northern Mariana Islands"),
+    (72, "PR", "Puerto Rico"), (78, "VI", "Virgin Islands"),
+]
+
+# Abbreviations, names and FIPS codes all resolve to the same key;
+# lookups are case-insensitive (EPA writes "District Of Columbia")
+STATE_KEYS = {}
+for fips, abbr, name in STATES:
+    STATE_KEYS[abbr.lower()] = fips
+    STATE_KEYS[name.lower()] = fips
+    STATE_KEYS[str(fips)] = fips
+    STATE_KEYS[f"{fips:02d}"] = fips
+
+def state_key(value):
+    """Resolve a state name, abbreviation or FIPS code to its state_key (None if unknown)."""
+    if value is None:
+        return None
+    return STATE_KEYS.get(str(value).strip().lower())
+
+def load_state_dim(conn):
+    """Replace the contents of state_dim with the canonical list."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM state_dim")
+    cursor.executemany(
+        "INSERT INTO state_dim (state_key, state_abbr, state_name) VALUES (?, ?, ?)",
+        STATES
+    )
+    conn.commit()
+
+PANEL_COLUMNS = [
+    "state_key", "year", "state_name", "state_abbr",
+    "pm25_annual_mean",
+    "copd_prevalence", "smoking_prevalence", "obesity_prevalence",
+    "deaths", "population", "crude_death_rate", "age_adjusted_death_rate",
+]
+
+def build_state_year_panel(conn):
+    """
+    Rebuild state_year_panel: one row per (state_key, year) with PM2.5,
+    population-weighted PLACES prevalence and WONDER mortality rates.
+    """
+    cursor = conn.cursor()
+    panel = {}
+
+    def row(key, year):
+        return panel.setdefault((key, int(year)), {})
+
+    cursor.execute("""
+        SELECT state_key, year, AVG(pm25_annual_mean)
+        FROM state_air_quality
+        WHERE state_key IS NOT NULL
+        GROUP BY state_key, year;
+    """)
+    for key, year, pm25 in cursor.fetchall():
+        row(key, year)["pm25_annual_mean"] = pm25
+
+    # County prevalence weighted by county population
+    cursor.execute("""
+        SELECT state_key, year,
+               SUM(copd_prevalence * population) / SUM(CASE WHEN copd_prevalence IS NOT NULL THEN population END),
+               SUM(smoking_prevalence * population) / SUM(CASE WHEN smoking_prevalence IS NOT NULL THEN population END),
+               SUM(obesity_prevalence * population) / SUM(CASE WHEN obesity_prevalence IS NOT NULL THEN population END)
+        FROM places_health
+        WHERE state_key IS NOT NULL
+        GROUP BY state_key, year;
+    """)
+    for key, year, copd, smoking, obesity in cursor.fetchall():
+        row(key, year).update(copd_prevalence=copd, smoking_prevalence=smoking, obesity_prevalence=obesity)
+
+    cursor.execute("""
+        SELECT state, year, sex, race, age_years, cause_of_death, number_of_deaths, population
+        FROM wonder_mortality
+        WHERE age_years IS NOT NULL;
+    """)
+    columns, rates = MortalityData(cursor.fetchall()).rates(group_by=("state", "year"))
+    index = {name: i for i, name in enumerate(columns)}
+    for rate in rates:
+        key = state_key(rate[index["state"]])
+        if key is None:
+            continue
+        row(key, rate[index["year"]]).update(
+            deaths=rate[index["deaths"]],
+            population=rate[index["population"]],
+            crude_death_rate=rate[index["crude_rate"]],
+            age_adjusted_death_rate=rate[index["age_adjusted_rate"]],
+        )
+
+    names = {fips: (name, abbr) for fips, abbr, name in STATES}
+    cursor.execute("DELETE FROM state_year_panel")
+    cursor.executemany(
+        f"INSERT INTO state_year_panel ({', '.join(PANEL_COLUMNS)}) VALUES ({', '.join('?' for _ in PANEL_COLUMNS)})",
+        [
+            [key, year, *names[key]] + [values.get(column) for column in PANEL_COLUMNS[4:]]
+            for (key, year), values in sorted(panel.items())
+        ]
+    )
+    conn.commit()
+    return len(panel)
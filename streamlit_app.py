@@ -1,27 +1,47 @@
 # streamlit_app.py
 
 import os
-import requests
+import threading
+import time
+import httpx
 import streamlit as st
-import openai
 import pandas as pd
-import matplotlib.pyplot as plt
-from openai import OpenAI
+from pipeline import Pipeline
+from plotting import plot_columns, prepare_series, render_line_chart, result_hash
+from query_profile import format_plan
+from schema_retrieval import SchemaIndex, DEFAULT_TOKEN_BUDGET
 
-# Check for OpenAI API key
-if not os.getenv("OPENAI_API_KEY"):
-    st.error("Please set the OPENAI_API_KEY environment variable")
-    st.stop()
+# LLM_BACKEND=stub swaps in a local canned-response client for testing
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
 
-try:
-    client = OpenAI()
-except Exception as e:
-    st.error(f"Failed to initialize OpenAI client: {str(e)}")
-    st.stop()
+if LLM_BACKEND == "stub":
+    from llm_stub import StubLLM
+    client = StubLLM()
+else:
+    from openai import OpenAI
+
+    # Check for OpenAI API key
+    if not os.getenv("OPENAI_API_KEY"):
+        st.error("Please set the OPENAI_API_KEY environment variable")
+        st.stop()
+
+    try:
+        client = OpenAI()
+    except Exception as e:
+        st.error(f"Failed to initialize OpenAI client: {str(e)}")
+        st.stop()
 
 # MCP and LLM settings
 MCP_SERVER = "http://localhost:8000"
 
+# How often (seconds) the shared schema context is revalidated against the server
+CONTEXT_REFRESH_SECONDS = 30
+
+# Queries running longer than this are handed to the background job API
+INTERACTIVE_TIMEOUT_MS = 15000
+JOB_POLL_SECONDS = 0.5
+JOB_PAGE_ROWS = 10000
+
 # Updated SYSTEM PROMPT
 SYSTEM_PROMPT = """
 You are a SQL expert data analyst tasked with helping users query a public health database via SQL.
@@ -53,11 +73,16 @@ Available Health Metrics:
    - Smoking status
    - Demographics
 
+5. State x year panel (state_year_panel):
+   - PM2.5, population-weighted PLACES prevalence and WONDER death rates
+     already joined per state and year; prefer it for cross-dataset questions
+
 Your goals:
 1. Generate a correct SQL query based ONLY on the provided schema and the user's question.
 2. Do NOT make up table names or column names — only use those provided.
 3. NEVER join tables of different granularity without aggregation.
-4. For state names, use full names like 'California', not abbreviations.
+4. For state names, use full names like 'California', not abbreviations (places_health.state holds abbreviations).
+   To combine states across tables, join on the integer state_key (see state_dim), not on state names.
 5. Respect the year constraints of each dataset.
 6. For numeric values, use appropriate filters and aggregations.
 
@@ -85,22 +110,44 @@ Briefly (2–3 sentences), comment on:
 - Mention any notable trends, anomalies, or known external factors (e.g., policy changes, COVID).
 """
 
-def get_context():
-    response = requests.post(f"{MCP_SERVER}/v1/context")
-    return response.json()
-
-def generate_sql(context, user_question):
-    schema_text = ""
-    for table in context['tables']:
-        schema_text += f"Table {table['name']} (granularity: {table.get('granularity', 'unknown')}):\n"
-        for column in table['columns']:
-            units = f" ({column.get('units')})" if column.get('units') else ""
-            schema_text += f"  - {column['name']} [{column['type']}] {units}\n"
-            if column.get('sample_values'):
-                schema_text += f"    e.g., {column['sample_values']}\n"
-            if 'min' in column and 'max' in column:
-                schema_text += f"    range: {column['min']} - {column['max']}\n"
+@st.cache_resource
+def get_pipeline():
+    """Process-wide async HTTP client (pooled connections) and LLM worker pool."""
+    return Pipeline(MCP_SERVER)
+
+@st.cache_resource
+def get_shared_context():
+    """Process-wide context holder shared by every browser session."""
+    return {
+        "lock": threading.Lock(),
+        "etag": None,
+        "context": None,
+        "schema_index": None,
+        "checked_at": 0.0,
+    }
 
+def get_context():
+    """Return the shared (context, schema_index), refreshed only when the server's version changes."""
+    shared = get_shared_context()
+    with shared["lock"]:
+        stale = time.monotonic() - shared["checked_at"] > CONTEXT_REFRESH_SECONDS
+        if shared["context"] is None or stale:
+            headers = {"If-None-Match": shared["etag"]} if shared["etag"] else {}
+            response = get_pipeline().post("/v1/context", headers=headers)
+
+            # 304 means our copy is current; anything else carries a new context
+            if response.status_code != 304:
+                response.raise_for_status()
+                shared["context"] = response.json()
+                shared["etag"] = response.headers.get("ETag")
+                shared["schema_index"] = SchemaIndex(shared["context"])
+            shared["checked_at"] = time.monotonic()
+
+        return shared["context"], shared["schema_index"]
+
+def generate_sql(schema_index, user_question):
+    # Only the tables and columns relevant to the question go into the prompt
+    schema_text = schema_index.render(user_question, token_budget=DEFAULT_TOKEN_BUDGET)
     prompt = f"{SYSTEM_PROMPT}\n\nDatabase Schema:\n{schema_text}\n\nQuestion:\n{user_question}\n\nSQL:"
 
     response = client.chat.completions.create(
@@ -122,25 +169,67 @@ def generate_sql(context, user_question):
 
     return sql
 
-def query_mcp(sql):
+def run_query_job(sql):
+    """Run sql through the /v1/jobs API: submit, poll until finished, then page in the results."""
+    pipeline = get_pipeline()
+    job = pipeline.post("/v1/jobs", json={"query": sql}).json()
+    if "error" in job:
+        return job
+
+    with st.spinner("Query is taking longer than usual; running it as a background job..."):
+        while job.get("status") in ("queued", "running"):
+            time.sleep(JOB_POLL_SECONDS)
+            job = pipeline.get(f"/v1/jobs/{job['job_id']}").json()
+
+    if job.get("status") != "done":
+        return {"error": job.get("error") or f"Job {job.get('status')}"}
+
+    rows, offset = [], 0
+    while offset is not None:
+        page = pipeline.get(f"/v1/jobs/{job['job_id']}/results", params={"offset": offset, "limit": JOB_PAGE_ROWS}).json()
+        if "error" in page:
+            return page
+        rows.extend(page["rows"])
+        offset = page["next_offset"]
+    return {"columns": job["columns"], "rows": rows}
+
+def query_mcp(sql, profile=False):
     """Query the MCP server with improved error handling"""
     try:
-        response = requests.post(f"{MCP_SERVER}/v1/query", json={"query": sql})
+        response = get_pipeline().post(
+            "/v1/query", json={"query": sql, "timeout_ms": INTERACTIVE_TIMEOUT_MS, "profile": profile}
+        )
         response.raise_for_status()
         data = response.json()
+
+        # Over the interactive budget: rerun transparently as a background job
+        if data.get("timed_out"):
+            data = run_query_job(sql)
         
         if "error" in data:
             st.error(f"Server error: {data['error']}")
             return None
             
         return data
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         st.error(f"Error querying MCP server: {str(e)}")
         return None
     except ValueError as e:
         st.error(f"Error parsing server response: {str(e)}")
         return None
 
+def show_profile(profile):
+    """Plan and timings from /v1/query's profile mode."""
+    with st.expander("Query Profile", expanded=profile["full_scans"] > 0 or profile["temp_btrees"] > 0):
+        cols = st.columns(5)
+        cols[0].metric("Prepare", f"{profile['prepare_ms']:.1f} ms", help="Compile time, from a separate EXPLAIN run")
+        cols[1].metric("First row", f"{profile['first_row_ms']:.1f} ms", help="Compile plus execution up to the first row")
+        cols[2].metric("Execute", f"{profile['execute_ms']:.1f} ms", help="Full execution including fetching every row")
+        cols[3].metric("Serialize", f"{profile['serialize_ms']:.1f} ms")
+        cols[4].metric("VM steps", f"~{profile['vm_steps']:,}")
+        st.write(f"Full scans: **{profile['full_scans']}** · Temp B-trees: **{profile['temp_btrees']}**")
+        st.code(format_plan(profile["plan"]), language="text")
+
 def get_plot_labels(context, sql_query):
     """ Try to guess labels based on selected columns """
     x_label, y_label = "X", "Y"
@@ -155,6 +244,12 @@ def get_plot_labels(context, sql_query):
 
     return x_label.strip(), y_label.strip()
 
+@st.cache_data(max_entries=64)
+def cached_line_chart(key, _df, x_col, y_col, series_col, xlabel, ylabel):
+    """PNG of the result chart; cached on the result hash so reruns skip drawing."""
+    series = prepare_series(_df, x_col, y_col, series_col)
+    return render_line_chart(series, xlabel, ylabel)
+
 def generate_commentary(sql_query, df_sample):
     sample_text = df_sample.to_markdown(index=False)
     prompt = COMMENTARY_PROMPT_TEMPLATE.format(sql=sql_query, sample=sample_text)
@@ -173,9 +268,8 @@ def generate_commentary(sql_query, df_sample):
 # Streamlit UI
 st.title("Public Health Data Explorer")
 
-# Initialize session state for context
-if 'context' not in st.session_state:
-    st.session_state.context = get_context()
+# Schema context is shared across sessions and revalidated with the server
+context, schema_index = get_context()
 
 # Preset questions
 preset_questions = [
@@ -208,61 +302,44 @@ else:
 
 if user_question:
     # Generate SQL
-    generated_sql = generate_sql(st.session_state.context, user_question)
+    generated_sql = generate_sql(schema_index, user_question)
     
     # Show editable SQL
     with st.expander("View or Modify SQL Query", expanded=False):
         st.code(generated_sql, language="sql")
         sql_query = st.text_area("Modify SQL Query:", generated_sql, height=200)
         run_button = st.button("Run Modified Query")
+        profile_query = st.checkbox("Profile query (plan and timings)", key="profile_query")
 
     # Execute query
-    result = query_mcp(sql_query)
+    result = query_mcp(sql_query, profile=profile_query)
+
+    if result and result.get("profile"):
+        show_profile(result["profile"])
 
     if result and result.get('columns') and result.get('rows'):
         df = pd.DataFrame(result['rows'], columns=result['columns'])
-        st.dataframe(df)
 
-        # Plot if possible
-        if 'year' in df.columns and len(df.columns) > 1:
-            x_col = 'year'
-            y_cols = [col for col in df.columns if col != 'year' and col != 'state']
+        # Commentary only needs the first rows: start it now, fill it in last
+        commentary_future = get_pipeline().submit(generate_commentary, sql_query, df.head(5))
 
-            # Sort the entire dataframe by year first
-            df = df.sort_values(by='year')
+        table_slot, chart_slot = st.empty(), st.empty()
+        st.write("### Analysis:")
+        commentary_slot = st.empty()
+        commentary_slot.info("Generating commentary...")
 
-            fig, ax = plt.subplots(figsize=(10, 6))
-            
-            # If we have state column, create a line for each state
-            if 'state' in df.columns:
-                # If query is about PM2.5 levels, only show top 5 states
-                if 'pm25_annual_mean' in df.columns:
-                    # Calculate average PM2.5 for each state
-                    state_means = df.groupby('state')['pm25_annual_mean'].mean().sort_values(ascending=False)
-                    top_states = state_means.head(5).index
-                    df = df[df['state'].isin(top_states)]
-                    
-                for state in sorted(df['state'].unique()):
-                    state_data = df[df['state'] == state].sort_values(by='year')  # Sort each state's data by year
-                    ax.plot(state_data[x_col], state_data[y_cols[0]], marker='o', label=state)
-                ax.legend()
-            else:
-                # Single state or aggregate data
-                df = df.sort_values(by='year')  # Sort by year for single line plots too
-                ax.plot(df[x_col], df[y_cols[0]], marker='o')
-
-            xlabel, ylabel = get_plot_labels(st.session_state.context, sql_query)
-            ax.set_xlabel(xlabel)
-            ax.set_ylabel(ylabel)
-            ax.set_title(f"{ylabel} over {xlabel}")
-            ax.grid(True)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            st.pyplot(fig)
+        table_slot.dataframe(df)
+
+        # Plot if possible (prepared in one groupby pass, cached per result)
+        columns = plot_columns(df)
+        if columns:
+            xlabel, ylabel = get_plot_labels(context, sql_query)
+            chart_slot.image(cached_line_chart(result_hash(df), df, *columns, xlabel, ylabel))
 
         # LLM Commentary
-        st.write("### Analysis:")
-        commentary = generate_commentary(sql_query, df.head(5))
-        st.info(commentary)
+        try:
+            commentary_slot.info(commentary_future.result())
+        except Exception as e:
+            commentary_slot.warning(f"Commentary unavailable: {str(e)}")
     else:
         st.error("No results returned or invalid query. Try rephrasing your question.")
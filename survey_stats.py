@@ -0,0 +1,126 @@
+# survey_stats.py
+#
+# Design-based estimates for NHANES: weighted prevalence/means by group with
+# Taylor-linearized standard errors (stratified, with-replacement PSU design).
+# Everything is computed in one vectorized pass over all groups at once.
+
+import numpy as np
+
+Z_95 = 1.959964
+
+def group_codes(arrays, n):
+    """
+    Encode the rows of several key arrays (length n) as integer group codes.
+    Returns (codes, keys): codes is -1 where any key is missing,
+    keys[g] is the tuple of key values for group g. No arrays means one group.
+    """
+    if not arrays:
+        return np.zeros(n, dtype=np.intp), [()]
+
+    stacked = np.column_stack([np.asarray(a, dtype=np.float64) for a in arrays])
+    valid = ~np.isnan(stacked).any(axis=1)
+
+    codes = np.full(n, -1, dtype=np.intp)
+    if not valid.any():
+        return codes, []
+    keys, inverse = np.unique(stacked[valid], axis=0, return_inverse=True)
+    codes[valid] = inverse.ravel()
+    return codes, [tuple(row) for row in keys.tolist()]
+
+def taylor_estimates(y, weights, strata, psu, groups, n_groups):
+    """
+    Weighted ratio estimates sum(w*y)/sum(w) for every group (domain) with
+    Taylor-linearized standard errors.
+
+    y:        float array, NaN marks rows outside the analysis (missing answer)
+    weights:  sample weights; rows with weight <= 0 or NaN are out of sample
+    strata:   masked variance strata (SDMVSTRA)
+    psu:      masked variance PSUs (SDMVPSU), nested within strata
+    groups:   group code per row (-1 = not in any group), from group_codes()
+
+    Returns dict of arrays indexed by group: estimate, se, n, weighted_n.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    strata = np.asarray(strata, dtype=np.float64)
+    psu = np.asarray(psu, dtype=np.float64)
+
+    # The PSU structure comes from every sampled row, not just the domain,
+    # so domains that miss a PSU still see it as a zero contribution.
+    design = (weights > 0) & ~np.isnan(strata) & ~np.isnan(psu)
+    _, psu_index = np.unique(np.column_stack([strata[design], psu[design]]), axis=0, return_inverse=True)
+    psu_index = psu_index.ravel()
+    n_psu = psu_index.max() + 1 if len(psu_index) else 0
+    psu_strata_keys = np.zeros(n_psu)
+    psu_strata_keys[psu_index] = strata[design]
+    _, psu_stratum = np.unique(psu_strata_keys, return_inverse=True)
+    n_strata = psu_stratum.max() + 1 if n_psu else 0
+    psus_per_stratum = np.bincount(psu_stratum, minlength=n_strata).astype(np.float64)
+
+    # Rows that enter the estimate
+    in_domain = design & (groups >= 0) & ~np.isnan(y)
+    active = in_domain[design]
+    g = groups[design][active]
+    w = weights[design][active]
+    v = y[design][active]
+    p = psu_index[active]
+
+    weighted_n = np.bincount(g, weights=w, minlength=n_groups)
+    weighted_sum = np.bincount(g, weights=w * v, minlength=n_groups)
+    n = np.bincount(g, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        estimate = weighted_sum / weighted_n
+
+        # Linearized values z_i = w_i (y_i - R_g) / W_g, totalled per (group, PSU)
+        z = w * (v - estimate[g]) / weighted_n[g]
+    psu_totals = np.bincount(g * n_psu + p, weights=z, minlength=n_groups * n_psu).reshape(n_groups, n_psu)
+
+    # Between-PSU variance within each stratum, summed over strata
+    stratum_indicator = np.zeros((n_psu, n_strata))
+    stratum_indicator[np.arange(n_psu), psu_stratum] = 1.0
+    stratum_sums = psu_totals @ stratum_indicator
+    stratum_squares = (psu_totals ** 2) @ stratum_indicator
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Strata with a single PSU contribute nothing
+        factor = np.where(psus_per_stratum > 1, psus_per_stratum / (psus_per_stratum - 1), 0.0)
+        within = stratum_squares - stratum_sums ** 2 / psus_per_stratum
+    variance = np.nan_to_num(within) @ factor
+
+    return {
+        "estimate": estimate,
+        "se": np.sqrt(np.maximum(variance, 0.0)),
+        "n": n,
+        "weighted_n": weighted_n,
+    }
+
+def estimate_by_group(values, weights, strata, psu, by=(), statistic="prevalence",
+                      positive=(1,), valid=(1, 2), domain=None):
+    """
+    Weighted prevalence (%) or mean of `values` for each combination of the `by` arrays.
+
+    prevalence: share of rows coded in `positive` among rows coded in `valid`
+    mean:       weighted mean of non-missing values
+    domain:     optional boolean mask restricting the analysed subpopulation
+
+    Returns (keys, result) where result holds estimate, se, ci_low, ci_high, n, weighted_n.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if statistic == "prevalence":
+        y = np.where(np.isin(values, valid), np.isin(values, positive).astype(np.float64), np.nan)
+        scale = 100.0
+    elif statistic == "mean":
+        y = values
+        scale = 1.0
+    else:
+        raise ValueError(f"Unknown statistic: {statistic}")
+
+    groups, keys = group_codes(list(by), len(values))
+    if domain is not None:
+        groups = np.where(domain, groups, -1)
+
+    result = taylor_estimates(y, weights, strata, psu, groups, len(keys))
+    result["estimate"] = result["estimate"] * scale
+    result["se"] = result["se"] * scale
+    result["ci_low"] = result["estimate"] - Z_95 * result["se"]
+    result["ci_high"] = result["estimate"] + Z_95 * result["se"]
+    return keys, result
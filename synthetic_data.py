@@ -0,0 +1,382 @@
+# synthetic_data.py
+#
+# Seeded generator of full-scale synthetic inputs in the formats load_data.py
+# reads, so performance work can be reproduced without the real downloads:
+#
+#   epa_pm25_2010-2024.csv      state x year PM2.5 means
+#   nhanes_2021-2023_copd.csv   wide NHANES respondents, SAS 0 sentinels included
+#   places_2022.csv             long-format PLACES (one row per county x measure x type)
+#   wonder_2018-2023.csv        processed WONDER rows (process_wonder.py output)
+#
+# plus the NHANES label JSON files, and optionally the raw WONDER exports
+# (tab-delimited, Notes column and footer rows) that process_wonder.py reads.
+# Cardinalities follow the real data at --scale 1: ~3,100 counties with
+# log-normal populations, ~12k NHANES respondents, 51 states x 6 years x
+# 2 sexes x 101 ages x 6 races x 7 causes for WONDER (zero-death rows dropped).
+#
+# Usage:
+#   python synthetic_data.py --out synthetic_data --scale 1 --seed 42
+#   COPD_DATA_DIR=synthetic_data python load_data.py
+
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from states import STATES
+
+# SAS transport files encode 0 as this tiny float; pandas keeps it as-is
+SAS_ZERO = 5.397605346934028e-79
+
+# abbr -> (population in millions, counties, centroid lon, centroid lat), approx. 2020
+STATE_PROFILES = {
+    "AL": (5.0, 67, -86.8, 32.8), "AK": (0.73, 30, -152.0, 63.5), "AZ": (7.2, 15, -111.7, 34.3),
+    "AR": (3.0, 75, -92.4, 34.9), "CA": (39.5, 58, -119.5, 37.2), "CO": (5.8, 64, -105.5, 39.0),
+    "CT": (3.6, 8, -72.7, 41.6), "DE": (1.0, 3, -75.5, 39.0), "DC": (0.69, 1, -77.0, 38.9),
+    "FL": (21.5, 67, -81.7, 28.6), "GA": (10.7, 159, -83.4, 32.7), "HI": (1.46, 5, -157.5, 20.8),
+    "ID": (1.84, 44, -114.6, 44.4), "IL": (12.8, 102, -89.2, 40.0), "IN": (6.8, 92, -86.3, 39.9),
+    "IA": (3.2, 99, -93.5, 42.1), "KS": (2.9, 105, -98.4, 38.5), "KY": (4.5, 120, -85.3, 37.5),
+    "LA": (4.66, 64, -92.0, 31.1), "ME": (1.36, 16, -69.2, 45.4), "MD": (6.18, 24, -76.8, 39.0),
+    "MA": (7.0, 14, -71.8, 42.3), "MI": (10.1, 83, -84.7, 44.3), "MN": (5.7, 87, -94.3, 46.3),
+    "MS": (2.96, 82, -89.7, 32.7), "MO": (6.15, 115, -92.5, 38.4), "MT": (1.08, 56, -109.6, 47.0),
+    "NE": (1.96, 93, -99.8, 41.5), "NV": (3.1, 17, -116.6, 39.3), "NH": (1.38, 10, -71.6, 43.7),
+    "NJ": (9.29, 21, -74.7, 40.2), "NM": (2.12, 33, -106.1, 34.4), "NY": (20.2, 62, -75.5, 42.9),
+    "NC": (10.4, 100, -79.4, 35.6), "ND": (0.78, 53, -100.5, 47.4), "OH": (11.8, 88, -82.8, 40.3),
+    "OK": (3.96, 77, -97.5, 35.6), "OR": (4.24, 36, -120.6, 43.9), "PA": (13.0, 67, -77.6, 40.9),
+    "RI": (1.1, 5, -71.5, 41.7), "SC": (5.1, 46, -80.9, 33.9), "SD": (0.89, 66, -100.2, 44.4),
+    "TN": (6.9, 95, -86.4, 35.9), "TX": (29.1, 254, -99.3, 31.5), "UT": (3.27, 29, -111.7, 39.3),
+    "VT": (0.64, 14, -72.7, 44.1), "VA": (8.6, 133, -78.8, 37.5), "WA": (7.7, 39, -120.4, 47.4),
+    "WV": (1.79, 55, -80.6, 38.6), "WI": (5.9, 72, -89.9, 44.6), "WY": (0.58, 23, -107.6, 43.0),
+}
+
+# Western states get a PM2.5 bump in big wildfire years
+WILDFIRE_STATES = {"CA", "OR", "WA", "ID", "MT", "NV", "CO", "UT", "WY", "AZ", "NM"}
+WILDFIRE_YEARS = {2017: 1.5, 2018: 1.8, 2020: 3.0, 2021: 1.5}
+
+COUNTY_NAMES = [
+    "Washington", "Jefferson", "Franklin", "Jackson", "Lincoln", "Madison", "Clay", "Montgomery",
+    "Marion", "Monroe", "Union", "Wayne", "Greene", "Warren", "Grant", "Johnson", "Lawrence",
+    "Adams", "Marshall", "Douglas", "Polk", "Scott", "Clark", "Morgan", "Carroll", "Lee", "Hamilton",
+    "Fayette", "Dale", "Benton", "Calhoun", "Crawford", "Henry", "Perry", "Putnam", "Shelby",
+    "Lake", "Harrison", "Logan", "Mercer",
+]
+
+# (Category, CategoryID, Measure, MeasureId, Short_Question_Text, typical %, spread)
+PLACES_MEASURES = [
+    ("Health Outcomes", "HLTHOUT", "Current asthma among adults", "CASTHMA", "Current Asthma", 10.5, 1.0),
+    ("Health Outcomes", "HLTHOUT", "Arthritis among adults", "ARTHRITIS", "Arthritis", 29.0, 4.0),
+    ("Health Outcomes", "HLTHOUT", "Stroke among adults", "STROKE", "Stroke", 3.8, 0.8),
+    ("Health Outcomes", "HLTHOUT", "Chronic obstructive pulmonary disease among adults", "COPD", "COPD", 8.0, 2.0),
+    ("Health Outcomes", "HLTHOUT", "Obesity among adults", "OBESITY", "Obesity", 36.0, 4.0),
+    ("Health Outcomes", "HLTHOUT", "Diagnosed diabetes among adults", "DIABETES", "Diabetes", 12.0, 2.5),
+    ("Health Outcomes", "HLTHOUT", "High blood pressure among adults", "BPHIGH", "High Blood Pressure", 35.0, 5.0),
+    ("Health Outcomes", "HLTHOUT", "Coronary heart disease among adults", "CHD", "Coronary Heart Disease", 7.5, 1.5),
+    ("Health Outcomes", "HLTHOUT", "Depression among adults", "DEPRESSION", "Depression", 22.0, 3.0),
+    ("Health Outcomes", "HLTHOUT", "Cancer (non-skin) or melanoma among adults", "CANCER", "Cancer (except skin)", 8.0, 1.2),
+    ("Health Outcomes", "HLTHOUT", "Chronic kidney disease among adults", "KIDNEY", "Chronic Kidney Disease", 3.3, 0.5),
+    ("Health Outcomes", "HLTHOUT", "All teeth lost among adults aged >=65 years", "TEETHLOST", "All Teeth Lost", 14.0, 5.0),
+    ("Health Risk Behaviors", "RISKBEH", "Current cigarette smoking among adults", "CSMOKING", "Current Cigarette Smoking", 17.0, 4.0),
+    ("Health Risk Behaviors", "RISKBEH", "Binge drinking among adults", "BINGE", "Binge Drinking", 16.5, 2.5),
+    ("Health Risk Behaviors", "RISKBEH", "No leisure-time physical activity among adults", "LPA", "Physical Inactivity", 26.0, 5.0),
+    ("Health Risk Behaviors", "RISKBEH", "Short sleep duration among adults", "SLEEP", "Sleep <7 hours", 36.0, 3.0),
+    ("Health Status", "HLTHSTAT", "Frequent mental distress among adults", "MHLTH", "Frequent Mental Distress", 17.0, 2.0),
+    ("Health Status", "HLTHSTAT", "Frequent physical distress among adults", "PHLTH", "Frequent Physical Distress", 12.5, 2.0),
+    ("Health Status", "HLTHSTAT", "Fair or poor self-rated health status among adults", "GHLTH", "General Health", 19.0, 4.0),
+    ("Prevention", "PREVENT", "Current lack of health insurance among adults aged 18-64 years", "ACCESS2", "Health Insurance", 12.0, 4.0),
+    ("Prevention", "PREVENT", "Visits to doctor for routine checkup within the past year among adults", "CHECKUP", "Annual Checkup", 76.0, 3.0),
+    ("Prevention", "PREVENT", "Visits to dentist or dental clinic among adults", "DENTAL", "Dental Visit", 62.0, 6.0),
+    ("Disability", "DISABLT", "Any disability among adults", "DISABILITY", "Any Disability", 30.0, 5.0),
+    ("Disability", "DISABLT", "Mobility disability among adults", "MOBILITY", "Mobility Disability", 14.0, 3.5),
+    ("Disability", "DISABLT", "Cognitive disability among adults", "COGNITION", "Cognitive Disability", 14.0, 3.0),
+    ("Disability", "DISABLT", "Hearing disability among adults", "HEARING", "Hearing Disability", 7.5, 1.5),
+    ("Disability", "DISABLT", "Vision disability among adults", "VISION", "Vision Disability", 5.5, 1.5),
+    ("Social Needs", "SOCLNEED", "Food insecurity in the past 12 months among adults", "FOODINSECU", "Food Insecurity", 14.0, 4.0),
+    ("Social Needs", "SOCLNEED", "Feeling socially isolated among adults", "ISOLATION", "Social Isolation", 33.0, 3.0),
+]
+DATA_VALUE_TYPES = [("Crude prevalence", "CrdPrv"), ("Age-adjusted prevalence", "AgeAdjPrv")]
+
+# (ICD-10 113 cause, code, share of the respiratory base rate, age slope)
+WONDER_CAUSES = [
+    ("#Influenza and pneumonia (J09-J18)", "GR113-076", 0.40, 0.075),
+    ("#Chronic lower respiratory diseases (J40-J47)", "GR113-082", 1.00, 0.093),
+    ("Bronchitis, chronic and unspecified (J40-J42)", "GR113-083", 0.01, 0.090),
+    ("Emphysema (J43)", "GR113-084", 0.05, 0.095),
+    ("Asthma (J45-J46)", "GR113-085", 0.03, 0.040),
+    ("Other chronic lower respiratory diseases (J44,J47)", "GR113-086", 0.91, 0.094),
+    ("#Pneumonitis due to solids and liquids (J69)", "GR113-087", 0.04, 0.110),
+]
+
+# (Single Race 6, code, national share, relative mortality)
+WONDER_RACES = [
+    ("American Indian or Alaska Native", "1002-5", 0.013, 1.3),
+    ("Asian", "A", 0.062, 0.45),
+    ("Black or African American", "2054-5", 0.134, 0.85),
+    ("Native Hawaiian or Other Pacific Islander", "NHOPI", 0.003, 0.9),
+    ("White", "2106-3", 0.757, 1.0),
+    ("More than one race", "M", 0.031, 0.6),
+]
+WONDER_YEARS = list(range(2018, 2024))
+WONDER_MAX_AGE = 100
+
+def state_profiles():
+    """[(fips, abbr, name, population, counties, lon, lat)] for the 50 states and DC."""
+    return [(fips, abbr, name, *STATE_PROFILES[abbr]) for fips, abbr, name in STATES if abbr in STATE_PROFILES]
+
+def age_label(age):
+    if age == 0:
+        return "< 1 year"
+    if age >= WONDER_MAX_AGE:
+        return f"{WONDER_MAX_AGE}+ years"
+    return "1 year" if age == 1 else f"{age} years"
+
+def age_distribution():
+    """Share of population at each single year of age 0..100 (flat to ~60, then declining)."""
+    ages = np.arange(WONDER_MAX_AGE + 1)
+    weights = np.where(ages < 60, 1.0, np.exp(-0.045 * np.maximum(ages - 60, 0) ** 1.25))
+    weights[-1] = weights[-2:].sum()
+    return weights / weights.sum()
+
+def generate_epa(rng, states):
+    years = np.arange(2010, 2025)
+    rows = []
+    for _, abbr, name, *_ in states:
+        base = rng.normal(8.5, 1.5)
+        noise = rng.normal(0, 0.4, len(years))
+        for year, e in zip(years, noise):
+            value = base - 0.12 * (year - 2010) + e
+            if abbr in WILDFIRE_STATES:
+                value += WILDFIRE_YEARS.get(int(year), 0.0) * rng.uniform(0.5, 1.5)
+            # EPA's file capitalizes every word ("District Of Columbia")
+            rows.append((name.title(), int(year), max(value, 2.0)))
+    return pd.DataFrame(rows, columns=["state", "year", "pm25_annual_mean"])
+
+# County FIPS codes are state * 1000 + an odd number below 1000, so a state has room for 499
+MAX_COUNTIES_PER_STATE = 499
+
+def generate_places(rng, states, scale):
+    """Long-format PLACES: one row per county x measure x value type."""
+    counties = []
+    for fips, abbr, name, population, n_counties, lon, lat in states:
+        # Large scales cap at MAX_COUNTIES_PER_STATE rather than spill into the next state's codes
+        n = min(max(1, int(round(n_counties * scale))), MAX_COUNTIES_PER_STATE)
+        # Log-normal county sizes, rescaled to the state total: a few big metros, many small counties
+        sizes = rng.lognormal(0.0, 1.3, n)
+        sizes = np.maximum((sizes / sizes.sum() * population * 1e6).astype(int), 60)
+        spread = min(max(0.15 * np.sqrt(n_counties), 0.2), 3.0)
+        for i in range(n):
+            county_name = COUNTY_NAMES[i % len(COUNTY_NAMES)] + ("" if i < len(COUNTY_NAMES) else f" {i // len(COUNTY_NAMES) + 1}")
+            counties.append((
+                abbr, name, county_name, fips * 1000 + 2 * i + 1, int(sizes[i]),
+                lon + rng.normal(0, spread), lat + rng.normal(0, spread * 0.6)
+            ))
+
+    n = len(counties)
+    # County-level latent factors drive correlated measures (smoking -> COPD, etc.)
+    smoking = np.clip(rng.normal(17.0, 4.0, n), 5, 40)
+    deprivation = rng.normal(0, 1, n)
+
+    records = []
+    for category, category_id, measure, measure_id, short, typical, spread in PLACES_MEASURES:
+        if measure_id == "CSMOKING":
+            crude = smoking
+        elif measure_id == "COPD":
+            crude = 1.0 + 0.4 * smoking + rng.normal(0, 0.8, n)
+        else:
+            crude = typical + spread * (0.6 * deprivation + 0.8 * rng.normal(0, 1, n))
+        crude = np.clip(crude, 0.5, 95)
+        for value_type, value_type_id in DATA_VALUE_TYPES:
+            values = np.round(crude * (1.0 if value_type_id == "CrdPrv" else rng.uniform(0.9, 1.05, n)), 1)
+            half = np.round(rng.uniform(0.3, 2.5, n), 1)
+            records.append(pd.DataFrame({
+                "Year": 2022,
+                "StateAbbr": [c[0] for c in counties],
+                "StateDesc": [c[1] for c in counties],
+                "LocationName": [c[2] for c in counties],
+                "DataSource": "BRFSS",
+                "Category": category,
+                "Measure": measure,
+                "Data_Value_Unit": "%",
+                "Data_Value_Type": value_type,
+                "Data_Value": values,
+                "Data_Value_Footnote_Symbol": np.nan,
+                "Data_Value_Footnote": np.nan,
+                "Low_Confidence_Limit": np.round(values - half, 1),
+                "High_Confidence_Limit": np.round(values + half, 1),
+                "TotalPopulation": [c[4] for c in counties],
+                "TotalPop18plus": [int(c[4] * 0.78) for c in counties],
+                "LocationID": [c[3] for c in counties],
+                "CategoryID": category_id,
+                "MeasureId": measure_id,
+                "DataValueTypeID": value_type_id,
+                "Short_Question_Text": short,
+                "Geolocation": [f"POINT ({c[5]:.13f} {c[6]:.13f})" for c in counties],
+            }))
+
+    # The real file is not ordered by county; shuffle so loaders can't rely on it
+    places = pd.concat(records, ignore_index=True)
+    return places.iloc[rng.permutation(len(places))].reset_index(drop=True)
+
+def generate_wonder(rng, states, scale):
+    """Processed WONDER rows: state x year x sex x age x race x cause, zero-death rows dropped."""
+    n_states = max(1, int(round(len(states) * min(scale, 1.0))))
+    # Above scale 1, extend the series back in time rather than inventing states
+    extra_years = max(0, int(round(len(WONDER_YEARS) * (scale - 1.0))))
+    years = np.array(list(range(WONDER_YEARS[0] - extra_years, WONDER_YEARS[0])) + WONDER_YEARS)
+    states = states[:n_states]
+
+    ages = np.arange(WONDER_MAX_AGE + 1)
+    age_share = age_distribution()
+    race_share = np.array([r[2] for r in WONDER_RACES])
+    race_risk = np.array([r[3] for r in WONDER_RACES])
+
+    frames = []
+    for fips, abbr, name, population, *_ in states:
+        state_risk = rng.lognormal(0, 0.2)
+        # Each state's racial mix varies around the national shares
+        shares = rng.dirichlet(race_share * 60)
+        for year in years:
+            growth = 1 + 0.004 * (year - 2018)
+            covid = 1.25 if year in (2020, 2021) else 1.0
+            # population[sex, age, race]
+            pop = (population * 1e6 * growth * 0.5
+                   * age_share[None, :, None] * shares[None, None, :]
+                   * np.array([1.02, 0.98])[:, None, None])
+            pop = np.maximum(rng.poisson(pop), 1)
+            for cause, code, share, slope in WONDER_CAUSES:
+                rate = (0.3e-5 * share * np.exp(slope * ages)[None, :, None]
+                        * race_risk[None, None, :] * np.array([0.95, 1.1])[:, None, None]
+                        * state_risk * (covid if code == "GR113-076" else 1.0))
+                deaths = rng.poisson(pop * rate)
+                s, a, r = np.nonzero(deaths)
+                if not len(s):
+                    continue
+                frames.append(pd.DataFrame({
+                    "State": name,
+                    "State Code": float(fips),
+                    "ICD-10 113 Cause List": cause,
+                    "ICD-10 113 Cause List Code": code,
+                    "Sex": np.where(s == 0, "Female", "Male"),
+                    "Sex Code": np.where(s == 0, "F", "M"),
+                    "Single-Year Ages": [age_label(x) for x in a],
+                    "Single-Year Ages Code": a.astype(float),
+                    "Single Race 6": [WONDER_RACES[x][0] for x in r],
+                    "Single Race 6 Code": [WONDER_RACES[x][1] for x in r],
+                    "Deaths": deaths[s, a, r].astype(float),
+                    "Population": pop[s, a, r],
+                    "Year": int(year),
+                }))
+
+    wonder = pd.concat(frames, ignore_index=True)
+    crude = (wonder["Deaths"] / wonder["Population"] * 1e5).round(1)
+    # WONDER flags rates from fewer than 20 deaths
+    wonder["Crude Rate"] = np.where(wonder["Deaths"] < 20, "Unreliable", crude.astype(str))
+    columns = [
+        "State", "State Code", "ICD-10 113 Cause List", "ICD-10 113 Cause List Code", "Sex", "Sex Code",
+        "Single-Year Ages", "Single-Year Ages Code", "Single Race 6", "Single Race 6 Code",
+        "Deaths", "Population", "Crude Rate", "Year",
+    ]
+    return wonder[columns]
+
+def write_wonder_exports(wonder, raw_dir):
+    """Raw WONDER exports, one per year, as process_wonder.py expects them (TSV saved as .xls)."""
+    os.makedirs(raw_dir, exist_ok=True)
+    for year, rows in wonder.groupby("Year"):
+        export = rows.drop(columns=["Year"]).copy()
+        export.insert(0, "Notes", np.nan)
+        footer = pd.DataFrame({"Notes": [
+            "---",
+            "Dataset: Underlying Cause of Death, 2018-2023, Single Race",
+            "Query Parameters:",
+            f"Year/Month: {year}",
+            "UCD - ICD-10 113 Cause List: Respiratory causes (J00-J98)",
+            "Group By: State; ICD-10 113 Cause List; Sex; Single-Year Ages; Single Race 6",
+            "Show Totals: Disabled",
+            "---",
+            "Rates are marked as unreliable when the death count is less than 20.",
+            "---",
+        ]})
+        export = pd.concat([export, footer], ignore_index=True)
+        export.to_csv(os.path.join(raw_dir, f"{year}-underlying_cause_of_death.xls"), sep="\t", index=False)
+
+def generate_nhanes(rng, scale):
+    """Wide NHANES 2021-2023 respondents with SAS-style 0 sentinels in count columns."""
+    n = max(100, int(round(11933 * scale)))
+    age = np.minimum(rng.gamma(2.2, 18.0, n).astype(int), 80)   # top-coded at 80
+    adult = age >= 18
+    sex = rng.choice([1.0, 2.0], n, p=[0.48, 0.52])
+    race1 = rng.choice([1.0, 2.0, 3.0, 4.0, 5.0], n, p=[0.10, 0.08, 0.55, 0.16, 0.11])
+    strata = rng.integers(173, 188, n).astype(float)
+
+    def answers(p_yes, mask, refuse=0.003, dont_know=0.004):
+        codes = rng.choice([1.0, 2.0, 7.0, 9.0], n, p=[p_yes, 1 - p_yes - refuse - dont_know, refuse, dont_know])
+        return np.where(mask, codes, np.nan)
+
+    smq020 = answers(0.40, adult)
+    smq040 = np.where(smq020 == 1, rng.choice([1.0, 2.0, 3.0], n, p=[0.28, 0.07, 0.65]), np.nan)
+    ever_smoked = smq020 == 1
+    copd_risk = np.clip(0.01 + 0.0015 * np.maximum(age - 40, 0) + 0.05 * ever_smoked, 0, 0.5)
+    mcq160p = np.where(age >= 20, np.where(rng.random(n) < copd_risk, 1.0, 2.0), np.nan)
+    household_smokers = rng.choice([0, 1, 2, 3], n, p=[0.8, 0.13, 0.05, 0.02]).astype(float)
+    weights = rng.lognormal(10.1, 0.7, n)
+
+    nhanes = pd.DataFrame({
+        "SEQN": 130378.0 + np.arange(n),
+        "SDDSRVYR": 12.0,
+        "RIDSTATR": rng.choice([1.0, 2.0], n, p=[0.25, 0.75]),
+        "RIAGENDR": sex,
+        "RIDAGEYR": age.astype(float),
+        "RIDRETH1": race1,
+        "DMDEDUC2": np.where(age >= 20, rng.choice([1.0, 2.0, 3.0, 4.0, 5.0, 9.0], n, p=[0.05, 0.08, 0.25, 0.3, 0.31, 0.01]), np.nan),
+        "WTINT2YR": weights,
+        "WTMEC2YR": np.where(rng.random(n) < 0.75, weights * rng.uniform(1.0, 1.4, n), SAS_ZERO),
+        "SDMVSTRA": strata,
+        "SDMVPSU": rng.choice([1.0, 2.0], n),
+        "INDFMPIR": np.round(np.clip(rng.gamma(2.0, 1.3, n), 0, 5), 2),
+        "SMQ020": smq020,
+        "SMQ040": smq040,
+        # Count of household smokers: zeros come through from the XPT files as the SAS sentinel
+        "SMD460": np.where(household_smokers == 0, SAS_ZERO, household_smokers),
+        "MCQ010": answers(0.15, np.ones(n, dtype=bool)),
+        "MCQ160P": mcq160p,
+        "HIQ011": answers(0.90, np.ones(n, dtype=bool)),
+        "BMXBMI": np.where(age >= 2, np.round(rng.lognormal(3.3, 0.22, n), 1), np.nan),
+        "LBDHRPLC": np.where(rng.random(n) < 0.9, SAS_ZERO, 1.0),
+    })
+    return nhanes
+
+def generate(out_dir, scale=1.0, seed=42, wonder_raw_dir=None, labels_dir="sample_data"):
+    """Write every synthetic input file to out_dir; returns {file name: rows}."""
+    rng = np.random.default_rng(seed)
+    states = state_profiles()
+    os.makedirs(out_dir, exist_ok=True)
+
+    outputs = {
+        "epa_pm25_2010-2024.csv": generate_epa(rng, states),
+        "nhanes_2021-2023_copd.csv": generate_nhanes(rng, scale),
+        "places_2022.csv": generate_places(rng, states, scale),
+        "wonder_2018-2023.csv": generate_wonder(rng, states, scale),
+    }
+    for file_name, df in outputs.items():
+        # Same layout as the real files: pandas index column first
+        df.to_csv(os.path.join(out_dir, file_name))
+
+    if wonder_raw_dir:
+        write_wonder_exports(outputs["wonder_2018-2023.csv"], wonder_raw_dir)
+
+    for file_name in ("nhanes_variable_labels.json", "nhanes_value_labels.json"):
+        shutil.copy(os.path.join(labels_dir, file_name), os.path.join(out_dir, file_name))
+
+    return {file_name: len(df) for file_name, df in outputs.items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic full-scale input data")
+    parser.add_argument('--out', default='synthetic_data', help='Output directory')
+    parser.add_argument('--scale', type=float, default=1.0, help='Scale factor (1.0 = real cardinalities)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--wonder-raw-dir', help='Also write raw WONDER exports here (e.g. data/wonder)')
+    args = parser.parse_args()
+
+    for file_name, rows in generate(args.out, args.scale, args.seed, args.wonder_raw_dir).items():
+        print(f"{file_name}: {rows} rows")
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Tests import the flat modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_database(path, tables):
+    """A small database with each of tables holding one row (id 1, value 2.5)."""
+    conn = sqlite3.connect(path)
+    for table in tables:
+        conn.execute(f"CREATE TABLE {table} (id INTEGER, value REAL)")
+        conn.execute(f"INSERT INTO {table} VALUES (1, 2.5)")
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Starts mcp_server against copd_public_health.db in an empty temporary
+    directory: create the database there, then call server() for a client.
+    """
+    from fastapi.testclient import TestClient
+    import mcp_server
+
+    monkeypatch.chdir(tmp_path)
+
+    def start():
+        mcp_server.read_pool.close()
+        mcp_server.read_pool.check_snapshot(force=True)
+        mcp_server._context_cache["version"] = None
+        return TestClient(mcp_server.app)
+
+    yield start
+    mcp_server.read_pool.close()
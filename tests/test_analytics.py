@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from analytics import METRICS, StateYearArrays, pairwise_correlation
+
+
+def panel(seed=0, states=8, years=range(2015, 2023)):
+    """state_year_panel rows with about a fifth of the metric cells missing."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(states):
+        for year in years:
+            values = [None if rng.random() < 0.2 else float(rng.normal(10 + s, 3)) for _ in METRICS]
+            rows.append((s + 1, f"State {s + 1}", year, *values))
+    return rows
+
+
+def test_pairwise_correlation_matches_a_per_pair_reference():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(60, 4))
+    X[:, 1] += X[:, 0]
+    X[rng.random(X.shape) < 0.25] = np.nan
+
+    corr, counts = pairwise_correlation(X)
+    for i in range(4):
+        for j in range(4):
+            both = ~np.isnan(X[:, i]) & ~np.isnan(X[:, j])
+            assert counts[i, j] == both.sum()
+            assert corr[i, j] == pytest.approx(np.corrcoef(X[both, i], X[both, j])[0, 1])
+
+
+def test_trends_match_per_state_least_squares():
+    rows = panel()
+    arrays = StateYearArrays(rows)
+    trends = {state: (slope, intercept, r2, n) for state, slope, intercept, r2, n in arrays.trends("copd_prevalence")}
+
+    column = 3 + METRICS.index("copd_prevalence")
+    for state in arrays.state_names:
+        points = [(row[2] - 2015, row[column]) for row in rows if row[1] == state and row[column] is not None]
+        t, y = np.array(points, dtype=float).T
+        slope, intercept = np.polyfit(t, y, 1)
+        slope_, intercept_, r2, n = trends[state]
+        assert n == len(points)
+        assert slope_ == pytest.approx(slope)
+        assert intercept_ == pytest.approx(intercept)
+        assert r2 == pytest.approx(np.corrcoef(t, y)[0, 1] ** 2)
+
+
+def test_lag_pairs_year_t_with_year_t_plus_lag():
+    rows = panel()
+    arrays = StateYearArrays(rows)
+    x, y = "pm25_annual_mean", "crude_death_rate"
+    values = {(row[0], row[2]): (row[3 + METRICS.index(x)], row[3 + METRICS.index(y)]) for row in rows}
+
+    for lag, r, n in arrays.lagged_correlation(x, y, max_lag=2):
+        pairs = [
+            (values[state, year][0], values[state, year + lag][1])
+            for state, year in values
+            if (state, year + lag) in values
+            and values[state, year][0] is not None and values[state, year + lag][1] is not None
+        ]
+        assert n == len(pairs)
+        assert r == pytest.approx(np.corrcoef(np.array(pairs).T)[0, 1])
+
+
+def test_unknown_metric_is_a_value_error():
+    with pytest.raises(ValueError, match="Unknown metric"):
+        StateYearArrays(panel()).correlation(["pm25_mean"])
@@ -0,0 +1,64 @@
+import sqlite3
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from approx import DEATHS_BAND, Z_95, ApproximationUnavailable, approximate_query, build_sample_tables
+
+
+def wonder_database(fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE wonder_mortality (state TEXT, year INTEGER, sex TEXT, number_of_deaths INTEGER)")
+    rows = [
+        (state, year, sex, int(rng.pareto(1.5) * 8))
+        for state in ("Alabama", "Alaska", "Arizona")
+        for year in (2020, 2021)
+        for sex in ("F", "M")
+        for _ in range(200)
+    ]
+    conn.executemany("INSERT INTO wonder_mortality VALUES (?, ?, ?, ?)", rows)
+    spec = {"strata": ["state", "year", DEATHS_BAND], "fraction": fraction, "min_rows": 5}
+    build_sample_tables(conn, {"wonder_mortality": spec})
+    return conn
+
+
+def test_full_sample_reproduces_the_exact_answer():
+    conn = wonder_database(fraction=1.0)
+    sql = "SELECT state, SUM(number_of_deaths), COUNT(*), AVG(number_of_deaths) FROM wonder_mortality GROUP BY state"
+    result = approximate_query(conn.cursor(), sql)
+    exact = conn.execute(sql).fetchall()
+
+    assert [row[0] for row in result["rows"]] == [row[0] for row in exact]
+    for row, expected, margins in zip(result["rows"], exact, result["margins"]):
+        assert row[1:] == pytest.approx(list(expected[1:]))
+        assert margins[1:] == pytest.approx([0.0, 0.0, 0.0])
+
+
+def test_sum_matches_the_stratified_estimator():
+    conn = wonder_database(fraction=0.3)
+    sql = "SELECT sex, SUM(number_of_deaths) AS deaths FROM wonder_mortality WHERE year = 2021 GROUP BY sex"
+    result = approximate_query(conn.cursor(), sql, max_relative_error=1.0)
+
+    strata = {h: (N, n) for h, N, n in conn.execute("SELECT * FROM approx_wonder_mortality_strata")}
+    sample = conn.execute("SELECT _stratum, sex, year, number_of_deaths FROM approx_wonder_mortality").fetchall()
+    for sex, total, margin in ((row[0], row[1], margins[1]) for row, margins in zip(result["rows"], result["margins"])):
+        # Rows outside the group or the WHERE filter are zeros in their stratum
+        z = defaultdict(list)
+        for h, row_sex, year, deaths in sample:
+            z[h].append(deaths if row_sex == sex and year == 2021 else 0)
+        expected, variance = 0.0, 0.0
+        for h, values in z.items():
+            N, n = strata[h]
+            expected += N / n * sum(values)
+            if n > 1:
+                variance += N ** 2 * (1 - n / N) * np.var(values, ddof=1) / n
+        assert total == pytest.approx(expected)
+        assert margin == pytest.approx(Z_95 * np.sqrt(variance))
+
+
+def test_joins_are_not_approximated():
+    conn = wonder_database(fraction=0.3)
+    with pytest.raises(ApproximationUnavailable):
+        approximate_query(conn.cursor(), "SELECT COUNT(*) FROM wonder_mortality w JOIN state_dim s ON 1")
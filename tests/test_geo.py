@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from geo import query_nearest, radius_box, radius_boxes
+
+
+def places_database(points):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE places_health (state TEXT, county_name TEXT, fips_code TEXT, year INTEGER,
+            longitude FLOAT, latitude FLOAT, copd_prevalence FLOAT, smoking_prevalence FLOAT, obesity_prevalence FLOAT)
+    """)
+    conn.execute("CREATE VIRTUAL TABLE places_rtree USING rtree(id, min_lon, max_lon, min_lat, max_lat)")
+    for i, (name, lon, lat) in enumerate(points, start=1):
+        conn.execute("INSERT INTO places_health VALUES ('AK', ?, ?, 2022, ?, ?, 8.0, 20.0, 30.0)", (name, str(i), lon, lat))
+        conn.execute("INSERT INTO places_rtree VALUES (last_insert_rowid(), ?, ?, ?, ?)", (lon, lon, lat, lat))
+    return conn
+
+
+@pytest.mark.parametrize("lon, pieces", [(179.9, 2), (-179.9, 2), (-100.0, 1)])
+def test_radius_boxes_split_at_the_antimeridian(lon, pieces):
+    min_lon, min_lat, max_lon, max_lat = radius_box(lon, 53.0, 200.0)
+    boxes = radius_boxes(lon, 53.0, 200.0)
+    assert len(boxes) == pieces
+    assert sum(box[2] - box[0] for box in boxes) == pytest.approx(max_lon - min_lon)
+    for box in boxes:
+        assert -180.0 <= box[0] <= box[2] <= 180.0
+        assert (box[1], box[3]) == (min_lat, max_lat)
+
+
+def test_radius_box_near_the_pole_covers_every_longitude():
+    assert radius_boxes(170.0, 89.5, 200.0) == [(-180.0, radius_box(170.0, 89.5, 200.0)[1], 180.0, 90.0)]
+
+
+def test_nearest_finds_points_across_the_antimeridian():
+    # Aleutian-like centroids either side of 180 degrees, and one far away
+    conn = places_database([("West", 179.8, 52.0), ("East", -179.8, 52.0), ("Far", -150.0, 61.0)])
+    rows = query_nearest(conn.cursor(), 179.95, 52.0, k=2)
+    assert [row[1] for row in rows] == ["West", "East"]
+    assert rows[1][-1] < 20
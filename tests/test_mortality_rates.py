@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from mortality_rates import RATE_PER, US_2000_STANDARD, MortalityData
+
+
+def rows_for(state, deaths_by_age, population=100_000, cause="Chronic lower respiratory diseases"):
+    # (state, year, sex, race, age_years, cause_of_death, deaths, population)
+    return [(state, 2020, "F", "White", age, cause, deaths, population) for age, deaths in deaths_by_age.items()]
+
+
+def band_ages():
+    return [low for low, _, _ in US_2000_STANDARD]
+
+
+def test_missing_band_counts_as_zero_deaths_under_the_shared_standard():
+    ages = band_ages()
+    full = {age: 50 for age in ages}
+    # No WONDER row for the youngest band: it had no deaths
+    partial = {age: 50 for age in ages[1:]}
+    data = MortalityData(rows_for("A", full) + rows_for("B", partial))
+
+    columns, rows = data.rates(group_by=("state",))
+    by_state = {row[0]: dict(zip(columns, row)) for row in rows}
+
+    weights = np.array([weight for _, _, weight in US_2000_STANDARD], dtype=float)
+    weights /= weights.sum()
+    band_rate = 50 / 100_000 * RATE_PER
+    assert by_state["A"]["age_adjusted_rate"] == pytest.approx(band_rate)
+    assert by_state["B"]["age_adjusted_rate"] == pytest.approx(band_rate * (1 - weights[0]))
+    assert by_state["A"]["missing_age_bands"] == 0 and not by_state["A"]["unreliable"]
+    assert by_state["B"]["missing_age_bands"] == 1 and by_state["B"]["unreliable"]
+
+
+def test_age_range_restricts_the_standard():
+    ages = band_ages()
+    data = MortalityData(rows_for("A", {age: (100 if age >= 65 else 1) for age in ages}))
+    columns, rows = data.rates(min_age=65)
+    result = dict(zip(columns, rows[0]))
+    assert result["age_adjusted_rate"] == pytest.approx(100 / 100_000 * RATE_PER)
+    assert result["missing_age_bands"] == 0
+
+
+def test_non_numeric_age_is_rejected(server):
+    response = server().post("/v1/mortality/rates", json={"min_age": "forty"})
+    assert response.status_code == 200
+    assert "min_age" in response.json()["error"]
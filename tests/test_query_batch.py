@@ -0,0 +1,23 @@
+from conftest import make_database
+from query_stats import statement_key
+
+
+def test_statement_key_ignores_comments_and_spacing_but_keeps_literals():
+    assert statement_key("-- count\nSELECT  COUNT(*)\nFROM t;") == statement_key("SELECT COUNT(*) FROM t")
+    assert statement_key("SELECT 'a   b'") != statement_key("SELECT 'a b'")
+
+
+def test_batch_runs_original_text(server):
+    make_database("copd_public_health.db", ["state_dim"])
+    response = server().post("/v1/query/batch", json={"queries": {
+        "commented": "-- count rows\nSELECT COUNT(*) AS n FROM state_dim",
+        "same": "SELECT COUNT(*) AS n FROM state_dim;",
+        "literal": "SELECT 'a   b' AS s",
+    }}).json()
+    results = {item["name"]: item for item in response["results"]}
+
+    assert results["commented"]["columns"] == ["n"]
+    assert results["commented"]["rows"] == [[1]]
+    assert results["same"]["rows"] == [[1]]
+    assert results["literal"]["rows"] == [["a   b"]]
+    assert response["executed"] == 2
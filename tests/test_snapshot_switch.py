@@ -0,0 +1,24 @@
+from conftest import make_database
+from snapshots import DATABASE_LINK, publish_snapshot
+
+
+def table_names(response):
+    return {table["name"] for table in response.json()["tables"]}
+
+
+def test_context_right_after_publish_lists_new_table(server, tmp_path):
+    (tmp_path / "snapshots").mkdir()
+    make_database("snapshots/first.db", ["state_dim"])
+    publish_snapshot("snapshots/first.db", DATABASE_LINK, "snapshots")
+    client = server()
+    first = client.get("/v1/context")
+    assert table_names(first) == {"state_dim"}
+
+    make_database("snapshots/second.db", ["state_dim", "brand_new"])
+    publish_snapshot("snapshots/second.db", DATABASE_LINK, "snapshots")
+
+    # No wait for the pool's periodic snapshot check
+    second = client.get("/v1/context", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert "brand_new" in table_names(second)
+    assert second.headers["ETag"] != first.headers["ETag"]
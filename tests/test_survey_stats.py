@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from survey_stats import estimate_by_group
+
+
+def design(seed=0, n=600):
+    rng = np.random.default_rng(seed)
+    strata = rng.integers(1, 6, n).astype(float)
+    psu = rng.integers(1, 3, n).astype(float)
+    weights = rng.uniform(500, 5000, n)
+    weights[rng.random(n) < 0.05] = 0.0
+    values = rng.choice([1.0, 2.0, 7.0, np.nan], n, p=[0.3, 0.6, 0.05, 0.05])
+    sex = rng.integers(1, 3, n).astype(float)
+    age = rng.uniform(18, 80, n)
+    return values, weights, strata, psu, sex, age
+
+
+def reference_estimate(y, weights, strata, psu, in_group):
+    """Ratio estimate and Taylor SE for one domain, one row at a time."""
+    sampled = [i for i in range(len(y)) if weights[i] > 0]
+    rows = [i for i in sampled if in_group[i] and not np.isnan(y[i])]
+    total_w = sum(weights[i] for i in rows)
+    ratio = sum(weights[i] * y[i] for i in rows) / total_w
+
+    # Every sampled PSU counts, with zero for rows outside the domain
+    totals = {(strata[i], psu[i]): 0.0 for i in sampled}
+    for i in rows:
+        totals[(strata[i], psu[i])] += weights[i] * (y[i] - ratio) / total_w
+    variance = 0.0
+    for h in {h for h, _ in totals}:
+        z = [total for (stratum, _), total in totals.items() if stratum == h]
+        if len(z) > 1:
+            variance += len(z) / (len(z) - 1) * sum((zi - np.mean(z)) ** 2 for zi in z)
+    return ratio, np.sqrt(variance), len(rows)
+
+
+@pytest.mark.parametrize("statistic", ["prevalence", "mean"])
+def test_matches_a_per_group_reference(statistic):
+    values, weights, strata, psu, sex, age = design()
+    domain = age >= 40
+    keys, result = estimate_by_group(values, weights, strata, psu, by=[sex], statistic=statistic, domain=domain)
+
+    if statistic == "prevalence":
+        y = np.where(np.isin(values, (1, 2)), (values == 1).astype(float), np.nan)
+        scale = 100.0
+    else:
+        y, scale = values, 1.0
+
+    assert keys == [(1.0,), (2.0,)]
+    for g, (key,) in enumerate(keys):
+        ratio, se, n = reference_estimate(y, weights, strata, psu, domain & (sex == key))
+        assert result["estimate"][g] == pytest.approx(ratio * scale)
+        assert result["se"][g] == pytest.approx(se * scale)
+        assert result["n"][g] == n
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"variable": "MCQ160P", "filters": {"SMQ020": [1, "x"]}}, "filters.SMQ020"),
+    ({"variable": "MCQ160P", "filters": {"RIDAGEYR": {"min": "40"}}}, "min/max"),
+    ({"variable": "MCQ160P", "positive": [[1]]}, "positive"),
+    ({"variable": "MCQ160P", "valid": {"a": 1}}, "valid"),
+    ({"variable": "MCQ160P", "by": "RIAGENDR"}, "by"),
+])
+def test_malformed_parameters_are_rejected(server, body, message):
+    response = server().post("/v1/nhanes/estimate", json=body)
+    assert response.status_code == 200
+    assert message in response.json()["error"]